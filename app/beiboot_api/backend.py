@@ -0,0 +1,388 @@
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List
+
+import kubernetes as k8s
+from beiboot import api
+from beiboot.configuration import default_configuration
+from beiboot.types import Beiboot, BeibootRequest
+from beiboot.utils import create_beiboot_custom_ressource
+from cluster.store import BEIBOOT_GROUP, BEIBOOT_PLURAL, BEIBOOT_VERSION, StoredBeiboot
+from exceptions import ClusterConflictException, ClusterExistsException
+from executor import KubernetesExecutor, get_k8s_executor
+from kubernetes.client.rest import ApiException
+from settings import Settings, get_settings
+
+try:
+    import kubernetes_asyncio as k8s_asyncio
+except ImportError:  # optional dependency
+    k8s_asyncio = None
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+def label_patch(labels: Dict[str, str | None], resource_version: str | None = None) -> dict:
+    metadata = {"labels": labels}
+    if resource_version:
+        metadata["resourceVersion"] = resource_version
+
+    return {"metadata": metadata}
+
+
+def label_selector(labels: Dict[str, str]) -> str:
+    return ",".join([f"{label}={value}" for label, value in labels.items()])
+
+
+def config_map_body(name: str, labels: Dict[str, str], data: Dict[str, str]) -> dict:
+    return {"metadata": {"name": name, "labels": labels}, "data": data}
+
+
+def heartbeat_patch(heartbeats: Dict[str, datetime]) -> dict:
+    return {"data": {client_id: timestamp.isoformat() for client_id, timestamp in heartbeats.items()}}
+
+
+def heartbeat_error(status: int, reason) -> RuntimeError:
+    if status == 404:
+        return RuntimeError(
+            f"Cannot write heartbeat, the required configmap "
+            f"'{default_configuration.CLIENT_HEARTBEAT_CONFIGMAP_NAME}' does not exist"
+        )
+    return RuntimeError(f"Cannot write heartbeat: {reason}")
+
+
+def patch_error(name: str, status: int, reason) -> RuntimeError:
+    if status == 409:
+        return ClusterConflictException(f"The Beiboot {name} was changed in the meantime.")
+    return RuntimeError(f"Error patching Beiboot object: {reason} ({status})")
+
+
+def create_error(req: BeibootRequest, status: int, reason: str) -> RuntimeError:
+    if status == 404:
+        return RuntimeError("This cluster does probably not support Getdeck Beiboot, or is not ready.")
+    if status == 409:
+        return ClusterExistsException(f"The requested Beiboot cluster '{req.name}' already exists.")
+    return RuntimeError(f"The requested Beiboot cluster {req.name} cannot be created: {reason}")
+
+
+class KubernetesBackend(ABC):
+    """
+    Awaitable Kubernetes calls used by the services.
+
+    Errors are raised the way the beiboot client does it: RuntimeError for API errors, RuntimeWarning if a Beiboot
+    to delete does not exist and kubernetes.client.rest.ApiException for the ConfigMap calls. A create of an existing
+    Beiboot raises ClusterExistsException, a label patch of a changed Beiboot ClusterConflictException (both
+    RuntimeErrors).
+    """
+
+    @abstractmethod
+    async def list_beiboots(self, labels: Dict[str, str]) -> List[Beiboot]:
+        ...
+
+    @abstractmethod
+    async def create_beiboot(self, req: BeibootRequest) -> Beiboot:
+        ...
+
+    @abstractmethod
+    async def delete_beiboot(self, name: str) -> None:
+        ...
+
+    @abstractmethod
+    async def patch_beiboot_labels(
+        self, name: str, labels: Dict[str, str | None], resource_version: str | None = None
+    ) -> Beiboot:
+        # merge patch (None removes a label), the patch fails if the object changed since 'resource_version'
+        ...
+
+    async def write_heartbeat(self, client_id: str, beiboot: Beiboot) -> datetime:
+        timestamp = datetime.utcnow()
+        await self.write_heartbeats(beiboot=beiboot, heartbeats={client_id: timestamp})
+        return timestamp
+
+    @abstractmethod
+    async def write_heartbeats(self, beiboot: Beiboot, heartbeats: Dict[str, datetime]) -> None:
+        # the heartbeats of several clients with a single patch of the heartbeat ConfigMap
+        ...
+
+    @abstractmethod
+    async def read_config_map(self, name: str, namespace: str, timeout: float | None = None):
+        ...
+
+    @abstractmethod
+    async def list_config_maps(self, namespace: str, labels: Dict[str, str]) -> list:
+        ...
+
+    @abstractmethod
+    async def apply_config_map(self, name: str, namespace: str, labels: Dict[str, str], data: Dict[str, str]) -> None:
+        # replaces the ConfigMap, creates it if it does not exist
+        ...
+
+    @abstractmethod
+    async def delete_config_map(self, name: str, namespace: str) -> None:
+        ...
+
+
+class ExecutorBackend(KubernetesBackend):
+    """Sync beiboot/kubernetes client, calls run in the bounded KubernetesExecutor."""
+
+    def __init__(self, executor: KubernetesExecutor):
+        self.executor = executor
+
+    async def list_beiboots(self, labels: Dict[str, str]) -> List[Beiboot]:
+        beiboots = await self.executor.run(api.read_all, labels)
+        # data was just read, reading the state must not fetch each object again
+        return [StoredBeiboot(bbt._data) for bbt in beiboots]
+
+    async def create_beiboot(self, req: BeibootRequest) -> Beiboot:
+        # create without the existence check (GET) of api.create, a conflict is reported by the API server
+        obj = create_beiboot_custom_ressource(req, default_configuration)
+        try:
+            bbt = await self.executor.run(
+                default_configuration.K8S_CUSTOM_OBJECT_API.create_namespaced_custom_object,
+                group=BEIBOOT_GROUP,
+                version=BEIBOOT_VERSION,
+                namespace=default_configuration.NAMESPACE,
+                plural=BEIBOOT_PLURAL,
+                body=obj,
+            )
+        except ApiException as e:
+            raise create_error(req=req, status=e.status, reason=e.reason) from None
+
+        return StoredBeiboot(bbt)
+
+    async def delete_beiboot(self, name: str) -> None:
+        await self.executor.run(api.delete_by_name, name=name)
+
+    async def patch_beiboot_labels(
+        self, name: str, labels: Dict[str, str | None], resource_version: str | None = None
+    ) -> Beiboot:
+        try:
+            bbt = await self.executor.run(
+                default_configuration.K8S_CUSTOM_OBJECT_API.patch_namespaced_custom_object,
+                group=BEIBOOT_GROUP,
+                version=BEIBOOT_VERSION,
+                namespace=default_configuration.NAMESPACE,
+                plural=BEIBOOT_PLURAL,
+                name=name,
+                body=label_patch(labels=labels, resource_version=resource_version),
+            )
+        except ApiException as e:
+            raise patch_error(name=name, status=e.status, reason=e.reason) from None
+
+        return StoredBeiboot(bbt)
+
+    async def write_heartbeats(self, beiboot: Beiboot, heartbeats: Dict[str, datetime]) -> None:
+        try:
+            await self.executor.run(
+                default_configuration.K8S_CORE_API.patch_namespaced_config_map,
+                name=default_configuration.CLIENT_HEARTBEAT_CONFIGMAP_NAME,
+                namespace=beiboot.namespace,
+                body=heartbeat_patch(heartbeats),
+            )
+        except ApiException as e:
+            raise heartbeat_error(status=e.status, reason=e) from None
+
+    async def read_config_map(self, name: str, namespace: str, timeout: float | None = None):
+        client = k8s.client.CoreV1Api()
+        return await self.executor.run(
+            client.read_namespaced_config_map, timeout=timeout, name=name, namespace=namespace
+        )
+
+    async def list_config_maps(self, namespace: str, labels: Dict[str, str]) -> list:
+        client = k8s.client.CoreV1Api()
+        config_maps = await self.executor.run(
+            client.list_namespaced_config_map, namespace=namespace, label_selector=label_selector(labels)
+        )
+        return config_maps.items
+
+    async def apply_config_map(self, name: str, namespace: str, labels: Dict[str, str], data: Dict[str, str]) -> None:
+        client = k8s.client.CoreV1Api()
+        body = config_map_body(name=name, labels=labels, data=data)
+        try:
+            await self.executor.run(client.replace_namespaced_config_map, name=name, namespace=namespace, body=body)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            await self.executor.run(client.create_namespaced_config_map, namespace=namespace, body=body)
+
+    async def delete_config_map(self, name: str, namespace: str) -> None:
+        client = k8s.client.CoreV1Api()
+        await self.executor.run(client.delete_namespaced_config_map, name=name, namespace=namespace)
+
+
+class AsyncioBackend(KubernetesBackend):
+    """
+    Native asyncio client (kubernetes_asyncio, optional dependency).
+
+    All calls share one ApiClient, i.e. one aiohttp connection pool to the API server, and no thread is used per
+    in-flight call.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.namespace = default_configuration.NAMESPACE
+        self._api_client = None
+
+    @property
+    def ready(self) -> bool:
+        return self._api_client is not None
+
+    async def setup(self, config_file: str) -> None:
+        if k8s_asyncio is None:
+            logger.warning("Asyncio Kubernetes client not installed (kubernetes_asyncio), using the executor.")
+            return None
+
+        try:
+            k8s_asyncio.config.load_incluster_config()
+        except k8s_asyncio.config.ConfigException:
+            try:
+                await k8s_asyncio.config.load_kube_config(config_file=config_file)
+            except (k8s_asyncio.config.ConfigException, OSError):
+                logger.error("Asyncio Kubernetes client setup failed, using the executor.")
+                return None
+
+        configuration = k8s_asyncio.client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = self.settings.k8s_asyncio_pool_size
+        self._api_client = k8s_asyncio.client.ApiClient(configuration=configuration)
+        logger.info(f"Asyncio Kubernetes client ready (pool size: {configuration.connection_pool_maxsize}).")
+
+    async def close(self) -> None:
+        if self._api_client:
+            await self._api_client.close()
+            self._api_client = None
+
+    async def list_beiboots(self, labels: Dict[str, str]) -> List[Beiboot]:
+        custom_object_api = k8s_asyncio.client.CustomObjectsApi(self._api_client)
+        try:
+            bbts = await custom_object_api.list_namespaced_custom_object(
+                group=BEIBOOT_GROUP,
+                version=BEIBOOT_VERSION,
+                namespace=self.namespace,
+                plural=BEIBOOT_PLURAL,
+                label_selector=label_selector(labels),
+            )
+        except k8s_asyncio.client.ApiException as e:
+            if e.status == 404:
+                raise RuntimeError("This cluster does probably not support Getdeck Beiboot, or is not ready.") from None
+            raise RuntimeError(str(e)) from None
+
+        return [StoredBeiboot(bbt) for bbt in bbts["items"]]
+
+    async def create_beiboot(self, req: BeibootRequest) -> Beiboot:
+        custom_object_api = k8s_asyncio.client.CustomObjectsApi(self._api_client)
+        obj = create_beiboot_custom_ressource(req, default_configuration)
+        try:
+            bbt = await custom_object_api.create_namespaced_custom_object(
+                group=BEIBOOT_GROUP,
+                version=BEIBOOT_VERSION,
+                namespace=self.namespace,
+                plural=BEIBOOT_PLURAL,
+                body=obj,
+            )
+        except k8s_asyncio.client.ApiException as e:
+            raise create_error(req=req, status=e.status, reason=e.reason) from None
+
+        return StoredBeiboot(bbt)
+
+    async def delete_beiboot(self, name: str) -> None:
+        custom_object_api = k8s_asyncio.client.CustomObjectsApi(self._api_client)
+        try:
+            await custom_object_api.delete_namespaced_custom_object(
+                group=BEIBOOT_GROUP,
+                version=BEIBOOT_VERSION,
+                namespace=self.namespace,
+                plural=BEIBOOT_PLURAL,
+                name=name,
+            )
+        except k8s_asyncio.client.ApiException as e:
+            if e.status == 404:
+                raise RuntimeWarning(f"Beiboot {name} does not exist")
+            raise RuntimeError(f"Error deleting Beiboot object: {e.reason} ({e.status})")
+
+    async def patch_beiboot_labels(
+        self, name: str, labels: Dict[str, str | None], resource_version: str | None = None
+    ) -> Beiboot:
+        custom_object_api = k8s_asyncio.client.CustomObjectsApi(self._api_client)
+        try:
+            bbt = await custom_object_api.patch_namespaced_custom_object(
+                group=BEIBOOT_GROUP,
+                version=BEIBOOT_VERSION,
+                namespace=self.namespace,
+                plural=BEIBOOT_PLURAL,
+                name=name,
+                body=label_patch(labels=labels, resource_version=resource_version),
+                # not the default content type of the client: custom resources do not support strategic merge patches
+                _content_type="application/merge-patch+json",
+            )
+        except k8s_asyncio.client.ApiException as e:
+            raise patch_error(name=name, status=e.status, reason=e.reason) from None
+
+        return StoredBeiboot(bbt)
+
+    async def write_heartbeats(self, beiboot: Beiboot, heartbeats: Dict[str, datetime]) -> None:
+        core_api = k8s_asyncio.client.CoreV1Api(self._api_client)
+        try:
+            await core_api.patch_namespaced_config_map(
+                name=default_configuration.CLIENT_HEARTBEAT_CONFIGMAP_NAME,
+                namespace=beiboot.namespace,
+                body=heartbeat_patch(heartbeats),
+            )
+        except k8s_asyncio.client.ApiException as e:
+            raise heartbeat_error(status=e.status, reason=e) from None
+
+    async def read_config_map(self, name: str, namespace: str, timeout: float | None = None):
+        core_api = k8s_asyncio.client.CoreV1Api(self._api_client)
+        try:
+            return await core_api.read_namespaced_config_map(name=name, namespace=namespace, _request_timeout=timeout)
+        except k8s_asyncio.client.ApiException as e:
+            raise ApiException(status=e.status, reason=e.reason) from None
+
+    async def list_config_maps(self, namespace: str, labels: Dict[str, str]) -> list:
+        core_api = k8s_asyncio.client.CoreV1Api(self._api_client)
+        try:
+            config_maps = await core_api.list_namespaced_config_map(
+                namespace=namespace, label_selector=label_selector(labels)
+            )
+        except k8s_asyncio.client.ApiException as e:
+            raise ApiException(status=e.status, reason=e.reason) from None
+
+        return config_maps.items
+
+    async def apply_config_map(self, name: str, namespace: str, labels: Dict[str, str], data: Dict[str, str]) -> None:
+        core_api = k8s_asyncio.client.CoreV1Api(self._api_client)
+        body = config_map_body(name=name, labels=labels, data=data)
+        try:
+            try:
+                await core_api.replace_namespaced_config_map(name=name, namespace=namespace, body=body)
+            except k8s_asyncio.client.ApiException as e:
+                if e.status != 404:
+                    raise
+                await core_api.create_namespaced_config_map(namespace=namespace, body=body)
+        except k8s_asyncio.client.ApiException as e:
+            raise ApiException(status=e.status, reason=e.reason) from None
+
+    async def delete_config_map(self, name: str, namespace: str) -> None:
+        core_api = k8s_asyncio.client.CoreV1Api(self._api_client)
+        try:
+            await core_api.delete_namespaced_config_map(name=name, namespace=namespace)
+        except k8s_asyncio.client.ApiException as e:
+            raise ApiException(status=e.status, reason=e.reason) from None
+
+
+@lru_cache()
+def get_executor_backend() -> ExecutorBackend:
+    return ExecutorBackend(executor=get_k8s_executor())
+
+
+@lru_cache()
+def get_asyncio_backend() -> AsyncioBackend:
+    return AsyncioBackend(settings=get_settings())
+
+
+def get_kubernetes_backend() -> KubernetesBackend:
+    asyncio_backend = get_asyncio_backend()
+    if asyncio_backend.ready:
+        return asyncio_backend
+
+    return get_executor_backend()
@@ -0,0 +1,95 @@
+"""
+Create validation and list serialization throughput of the API models.
+
+    cd app/beiboot_api && python -m benchmarks.models
+"""
+import asyncio
+import json
+import timeit
+
+import pydantic
+from cluster.plan import ValidationPlan
+from cluster.store import StoredBeiboot
+from cluster.types import ClusterPage, ClusterRequest, ClusterStateResponse
+from config.types import Config
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from fastapi_pagination import Params
+from routers.clusters import cluster_page_adapter
+from settings import get_settings
+
+NUMBER = 200
+CLUSTERS = 100
+
+request_body = json.dumps(
+    {
+        "name": "hello",
+        "parameters": [
+            {"name": "K8S_VERSION", "value": "1.26.0"},
+            {"name": "PORTS", "value": ["80:80", "443:443"]},
+            {"name": "NODE_COUNT", "value": 2},
+            {"name": "LIFETIME", "value": "2h"},
+            {"name": "SERVER_RESOURCES_REQUESTS_CPU", "value": "1"},
+            {"name": "NODE_RESOURCES_REQUESTS_MEMORY", "value": "1Gi"},
+        ],
+    }
+)
+
+plan = ValidationPlan(cluster_config=Config(**get_settings().model_dump()))
+
+beiboots = [
+    StoredBeiboot(
+        {
+            "metadata": {
+                "name": f"cluster-{i}",
+                "uid": f"uid-{i}",
+                "namespace": "getdeck",
+                "labels": {"name": f"c{i}", "user": "john"},
+            },
+            "provider": "k3s",
+            "beibootNamespace": f"getdeck-bbt-{i}",
+            "state": "READY",
+            "sunset": "2023-10-18T12:00:00.000000Z",
+            "parameters": {"nodes": 1, "maxLifetime": "1h", "maxSessionTimeout": "5m", "gefyra": {}, "tunnel": {}},
+        }
+    )
+    for i in range(CLUSTERS)
+]
+page = ClusterPage.create(
+    [ClusterStateResponse.from_beiboot(beiboot) for beiboot in beiboots], Params(size=CLUSTERS), total=CLUSTERS
+)
+response_field = create_response_field(name="response", type_=ClusterPage[ClusterStateResponse])
+loop = asyncio.new_event_loop()
+
+
+def create_validation():
+    cluster_request = ClusterRequest.model_validate_json(request_body)
+    return plan.validate(cluster_request.parameters).to_beiboot_parameters()
+
+
+def list_serialization_fastapi() -> bytes:
+    # the default: validation against the response model + jsonable_encoder + json.dumps
+    content = loop.run_until_complete(serialize_response(field=response_field, response_content=page))
+    return json.dumps(content).encode()
+
+
+def list_serialization() -> bytes:
+    # see routers.clusters.json_response
+    return cluster_page_adapter.dump_json(page, by_alias=True)
+
+
+def main():
+    benchmarks = [
+        ("create validation", create_validation),
+        ("list serialization", list_serialization_fastapi),
+        ("list serialization (TypeAdapter)", list_serialization),
+    ]
+
+    print(f"pydantic {pydantic.VERSION}, {CLUSTERS} clusters per list")
+    for name, func in benchmarks:
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER
+        print(f"{name:>34}: {1 / seconds:10.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Per-request validation cost of cluster parameters: Parameters model vs. compiled validation plan.
+
+    cd app/beiboot_api && python -m benchmarks.validation
+"""
+import timeit
+
+from cluster.plan import ValidationPlan
+from cluster.types import ClusterRequest, Parameters
+from config.types import Config
+from settings import get_settings
+
+NUMBER = 2000
+
+cluster_request = ClusterRequest(
+    name="hello",
+    parameters=[
+        {"name": "K8S_VERSION", "value": "1.26.0"},
+        {"name": "PORTS", "value": ["80:80", "443:443"]},
+        {"name": "NODE_COUNT", "value": 2},
+        {"name": "LIFETIME", "value": "2h"},
+        {"name": "SERVER_RESOURCES_REQUESTS_CPU", "value": "1"},
+        {"name": "NODE_RESOURCES_REQUESTS_MEMORY", "value": "1Gi"},
+    ],
+)
+
+
+def model() -> Parameters:
+    # before: cluster config + Parameters model per request
+    cluster_config = Config(**get_settings().model_dump())
+    tmp = {str(parameter.name.value): parameter.model_dump() for parameter in cluster_request.parameters}
+    return Parameters(cluster_config=cluster_config, **tmp)
+
+
+plan = ValidationPlan(cluster_config=Config(**get_settings().model_dump()))
+
+
+def compiled() -> Parameters:
+    return plan.validate(cluster_request.parameters)
+
+
+if __name__ == "__main__":
+    assert model().to_beiboot_parameters() == compiled().to_beiboot_parameters()
+
+    for name, func in [("model", model), ("plan", compiled)]:
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER
+        print(f"{name:>6}: {seconds * 1e6:8.1f} us/request")
@@ -0,0 +1,120 @@
+import logging
+import sys
+from typing import Dict, Iterable, List, Set, Tuple
+
+from beiboot.types import Beiboot
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+INDEXED_LABELS = ("user", "group", "name", "pool")
+
+
+class ClusterCatalog:
+    """
+    Beiboots keyed by name with secondary indexes on the labels in INDEXED_LABELS.
+
+    The catalog is not thread-safe, the owner (BeibootStore) is responsible for locking.
+    """
+
+    def __init__(self, indexed_labels: Tuple[str, ...] = INDEXED_LABELS):
+        self.indexed_labels = indexed_labels
+        self._beiboots: Dict[str, Beiboot] = {}
+        self._indexes: Dict[str, Dict[str, Set[str]]] = {label: {} for label in indexed_labels}
+
+    def __len__(self) -> int:
+        return len(self._beiboots)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._beiboots
+
+    def get(self, name: str) -> Beiboot | None:
+        return self._beiboots.get(name)
+
+    def put(self, beiboot: Beiboot) -> None:
+        if beiboot.name in self._beiboots:
+            self._unindex(self._beiboots[beiboot.name])
+
+        self._beiboots[beiboot.name] = beiboot
+        self._index(beiboot)
+
+    def remove(self, name: str) -> Beiboot | None:
+        beiboot = self._beiboots.pop(name, None)
+        if beiboot:
+            self._unindex(beiboot)
+
+        return beiboot
+
+    def replace(self, beiboots: Iterable[Beiboot]) -> None:
+        self._beiboots = {}
+        self._indexes = {label: {} for label in self.indexed_labels}
+        for beiboot in beiboots:
+            self.put(beiboot)
+
+    def all(self) -> List[Beiboot]:
+        return list(self._beiboots.values())
+
+    def names(self, labels: Dict[str, str] | None = None) -> Set[str]:
+        if not labels:
+            return set(self._beiboots)
+
+        # narrow down using the smallest matching index, filter the remaining labels
+        candidates = None
+        for label, value in labels.items():
+            if label not in self._indexes:
+                continue
+
+            names = self._indexes[label].get(value, set())
+            if candidates is None or len(names) < len(candidates):
+                candidates = names
+
+        if candidates is None:
+            candidates = set(self._beiboots)
+
+        return {name for name in candidates if self.match(self._beiboots[name], labels)}
+
+    def select(self, labels: Dict[str, str] | None = None) -> List[Beiboot]:
+        if not labels:
+            return self.all()
+
+        return [self._beiboots[name] for name in self.names(labels=labels)]
+
+    def count(self, label: str, value: str) -> int:
+        return len(self._indexes[label].get(value, ()))
+
+    def stats(self) -> dict:
+        index_bytes = 0
+        index_entries = 0
+        for index in self._indexes.values():
+            index_bytes += sys.getsizeof(index)
+            for value, names in index.items():
+                index_bytes += sys.getsizeof(value) + sys.getsizeof(names)
+                index_entries += len(names)
+
+        return {
+            "clusters": len(self._beiboots),
+            "catalog_bytes": sys.getsizeof(self._beiboots),
+            "index_keys": {label: len(index) for label, index in self._indexes.items()},
+            "index_entries": index_entries,
+            "index_bytes": index_bytes,
+        }
+
+    @staticmethod
+    def match(beiboot: Beiboot, labels: Dict[str, str]) -> bool:
+        beiboot_labels = beiboot.labels or {}
+        return all(beiboot_labels.get(key) == value for key, value in labels.items())
+
+    def _index(self, beiboot: Beiboot) -> None:
+        for label, index in self._indexes.items():
+            value = (beiboot.labels or {}).get(label)
+            if value is not None:
+                index.setdefault(value, set()).add(beiboot.name)
+
+    def _unindex(self, beiboot: Beiboot) -> None:
+        for label, index in self._indexes.items():
+            value = (beiboot.labels or {}).get(label)
+            if value is None or value not in index:
+                continue
+
+            index[value].discard(beiboot.name)
+            if not index[value]:
+                del index[value]
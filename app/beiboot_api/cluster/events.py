@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Set
+
+from beiboot.types import Beiboot
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+@dataclass
+class ClusterEvent:
+    type: str  # ADDED, MODIFIED, DELETED
+    beiboot: Beiboot
+    version: str
+    sequence: int
+
+
+class ClusterSubscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int, labels: Dict[str, str], name: str | None):
+        self.loop = loop
+        self.labels = labels
+        self.name = name
+        self.overflowed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize + 1)
+
+    def matches(self, event: ClusterEvent) -> bool:
+        if self.name and event.beiboot.name != self.name:
+            return False
+
+        beiboot_labels = event.beiboot.labels or {}
+        return all(beiboot_labels.get(key) == value for key, value in self.labels.items())
+
+    async def get(self, timeout: float | None = None) -> ClusterEvent | None:
+        """Next event, None if the subscriber was too slow (overflow). Raises asyncio.TimeoutError on timeout."""
+        return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+
+    def _put(self, event: ClusterEvent) -> None:
+        # runs in the event loop of the subscriber
+        if self.overflowed:
+            return None
+
+        if self._queue.qsize() >= self._queue.maxsize - 1:
+            self.overflowed = True
+            self._queue.put_nowait(None)
+            return None
+
+        self._queue.put_nowait(event)
+
+
+class ClusterEventBroker:
+    """Fan-out of cluster events (from the store watch thread) to all subscribers (in the event loop)."""
+
+    def __init__(self, maxsize: int = 100):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscriptions: Set[ClusterSubscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, labels: Dict[str, str] | None = None, name: str | None = None) -> ClusterSubscription:
+        subscription = ClusterSubscription(
+            loop=asyncio.get_running_loop(), maxsize=self.maxsize, labels=labels or {}, name=name
+        )
+        with self._lock:
+            self._subscriptions.add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: ClusterSubscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event: ClusterEvent) -> None:
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.matches(event)]
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # event loop closed
+                self.unsubscribe(subscription)
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Tuple
+
+from backend import KubernetesBackend, get_kubernetes_backend
+from beiboot.types import Beiboot
+from cluster.helpers import convert_to_timedelta
+from cluster.registry import ConnectionRegistry, get_connection_registry
+from cluster.shards import ReplicaSet, get_replica_set
+from cluster.store import BeibootStore, get_cluster_store
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+class HeartbeatAggregator:
+    """
+    Client heartbeats (websockets and HTTP) collected in memory and written to the heartbeat ConfigMap of a cluster
+    with one merged patch per cluster every 'heartbeat_flush_seconds', instead of one write per client and heartbeat.
+    Only the latest timestamp of a client is written. Failed writes are not retried, the clients send heartbeats
+    again within the next interval.
+
+    After a write, further heartbeats of the same client for the same cluster are acknowledged without a write for a
+    fraction ('heartbeat_min_interval_ratio') of the cluster's maxSessionTimeout, e.g. a websocket and HTTP heartbeats
+    of the same client side by side.
+
+    With sharding enabled, only the replica owning a cluster (see ReplicaSet) writes its heartbeats: heartbeats for
+    clusters of other shards are handed over with the replica sync before each flush.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        replicas: ReplicaSet | None = None,
+        store: BeibootStore | None = None,
+        registry: ConnectionRegistry | None = None,
+    ):
+        self.settings = settings
+        self.replicas = replicas
+        self.store = store
+        self.registry = registry
+        self._pending: Dict[str, Tuple[Beiboot, Dict[str, datetime]]] = {}
+        # (cluster, client) -> end of the suppression window of the last written heartbeat
+        self._written: Dict[Tuple[str, str], datetime] = {}
+        self._task: asyncio.Task | None = None
+
+        # metrics
+        self.received = 0
+        self.handed_over = 0
+        self.suppressed = 0
+        self.written = 0
+        self.flushes = 0
+        self.writes = 0
+        self.failed = 0
+        self.batch_size = 0
+        self.batch_size_max = 0
+        self.flush_seconds = 0.0
+
+    def add(self, client_id: str, beiboot: Beiboot, timestamp: datetime | None = None) -> datetime:
+        """
+        Records the heartbeat of a client, it is written with the next flush. Returns the timestamp.
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+
+        self.received += 1
+        return self._add(client_id=client_id, beiboot=beiboot, timestamp=timestamp)
+
+    def min_interval(self, beiboot: Beiboot) -> timedelta:
+        # minimum interval between two written heartbeats of a client
+        try:
+            session_timeout = convert_to_timedelta(beiboot.parameters.maxSessionTimeout)
+        except (AttributeError, TypeError, ValueError):
+            return timedelta(0)
+
+        return session_timeout * self.settings.heartbeat_min_interval_ratio
+
+    async def sync(self) -> None:
+        """
+        Hands over the pending heartbeats of other shards and adds the heartbeats handed over by other replicas for
+        clusters of this shard (requires the cluster store).
+        """
+        for cluster_id in list(self._pending):
+            if not self.replicas.owns(cluster_id):
+                _, heartbeats = self._pending.pop(cluster_id)
+                self.replicas.forward(cluster_id, heartbeats)
+
+        received = await self.replicas.sync(
+            connections=self.registry.cluster_counts() if self.registry else {},
+            users=self.registry.user_counts() if self.registry else {},
+        )
+        for cluster_id, heartbeats in received.items():
+            beiboot = self.store.get(name=cluster_id) if self.store else None
+            if beiboot is None:
+                logger.debug(f"Heartbeats for unknown cluster '{cluster_id}' dropped.")
+                continue
+
+            # received by another replica: counted there, not again in 'received'
+            self.handed_over += len(heartbeats)
+            for client_id, timestamp in heartbeats.items():
+                self._add(client_id=client_id, beiboot=beiboot, timestamp=timestamp)
+
+    async def flush(self, backend: KubernetesBackend) -> None:
+        if self.replicas and self.replicas.enabled:
+            await self.sync()
+
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return None
+
+        start = time.monotonic()
+        semaphore = asyncio.Semaphore(self.settings.heartbeat_flush_concurrency)
+
+        async def write(beiboot: Beiboot, heartbeats: Dict[str, datetime]) -> None:
+            async with semaphore:
+                try:
+                    await backend.write_heartbeats(beiboot=beiboot, heartbeats=heartbeats)
+                    self.writes += 1
+                    self.written += len(heartbeats)
+                except Exception as e:
+                    logger.warning(f"Heartbeat write failed (cluster: '{beiboot.name}'): {e}")
+                    self.failed += 1
+                    return None
+
+            interval = self.min_interval(beiboot)
+            if interval:
+                for client_id, timestamp in heartbeats.items():
+                    self._written[(beiboot.name, client_id)] = timestamp + interval
+
+        await asyncio.gather(*[write(beiboot, heartbeats) for beiboot, heartbeats in pending.values()])
+        self._prune()
+
+        self.flushes += 1
+        self.batch_size = sum(len(heartbeats) for _, heartbeats in pending.values())
+        self.batch_size_max = max(self.batch_size_max, self.batch_size)
+        self.flush_seconds = time.monotonic() - start
+
+    def start(self) -> None:
+        if self._task:
+            return None
+
+        self._task = asyncio.create_task(self._run(), name="heartbeat-aggregator")
+        logger.info("Heartbeat aggregator started.")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+            # write the heartbeats received since the last flush
+            await self.flush(backend=get_kubernetes_backend())
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.settings.heartbeat_flush_seconds,
+            "clusters": len(self._pending),
+            "received": self.received,
+            # heartbeats received by other replicas for clusters of this shard (see ReplicaSet)
+            "handed_over": self.handed_over,
+            # heartbeats acknowledged without a write (see min_interval) and heartbeats written
+            "suppressed": self.suppressed,
+            "written": self.written,
+            "suppression_windows": len(self._written),
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "failed": self.failed,
+            # heartbeats (clients) written with the last flush, the maximum so far and the duration of the last flush
+            "batch_size": self.batch_size,
+            "batch_size_max": self.batch_size_max,
+            "flush_seconds": round(self.flush_seconds, 3),
+        }
+
+    def _add(self, client_id: str, beiboot: Beiboot, timestamp: datetime) -> datetime:
+        suppressed_until = self._written.get((beiboot.name, client_id))
+        if suppressed_until and timestamp < suppressed_until:
+            self.suppressed += 1
+            return timestamp
+
+        _, heartbeats = self._pending.setdefault(beiboot.name, (beiboot, {}))
+        if client_id not in heartbeats or heartbeats[client_id] < timestamp:
+            heartbeats[client_id] = timestamp
+
+        return timestamp
+
+    def _prune(self) -> None:
+        now = datetime.utcnow()
+        for key, suppressed_until in list(self._written.items()):
+            if suppressed_until < now:
+                del self._written[key]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.heartbeat_flush_seconds)
+            try:
+                await self.flush(backend=get_kubernetes_backend())
+            except Exception as e:
+                logger.error(f"Heartbeat flush failed: {e}")
+
+
+@lru_cache()
+def get_heartbeat_aggregator() -> HeartbeatAggregator:
+    return HeartbeatAggregator(
+        settings=get_settings(),
+        replicas=get_replica_set(),
+        store=get_cluster_store(),
+        registry=get_connection_registry(),
+    )
@@ -1,16 +1,23 @@
+import base64
+import binascii
+import bisect
 import logging
 import re
 from datetime import timedelta
+from typing import Iterable, List, Tuple
+
+from pydantic import ValidationError
 
 logger = logging.getLogger("uvicorn.beiboot")
 
+TIMEDELTA_PATTERN = re.compile(
+    r"((?P<days>-?\d+)d)?((?P<hours>-?\d+)h)?((?P<minutes>-?\d+)m)?((?P<seconds>-?\d+)s)?",
+    re.IGNORECASE,
+)
+
 
 def convert_to_timedelta(value: str) -> timedelta:
-    pattern = re.compile(
-        r"((?P<days>-?\d+)d)?((?P<hours>-?\d+)h)?((?P<minutes>-?\d+)m)?((?P<seconds>-?\d+)s)?",
-        re.IGNORECASE,
-    )
-    match = pattern.match(value)
+    match = TIMEDELTA_PATTERN.match(value)
     if not match:
         raise ValueError("Invalid format. Please use the format '1d2h3m4s'")
 
@@ -23,3 +30,41 @@ def convert_to_timedelta(value: str) -> timedelta:
         raise ValueError("Invalid value.")
 
     return td
+
+
+def validation_errors(e: ValidationError) -> List[dict]:
+    # JSON serializable errors (loc, msg, type), without the "Value error, " prefix of pydantic v2 messages
+    return [
+        {"loc": error["loc"], "msg": error["msg"].removeprefix("Value error, "), "type": error["type"]}
+        for error in e.errors(include_url=False)
+    ]
+
+
+def encode_cursor(name: str) -> str:
+    return base64.urlsafe_b64encode(name.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.b64decode(cursor.encode(), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: '{cursor}'.")
+
+
+def paginate_names(
+    names: Iterable[str], offset: int, limit: int, after: str | None = None
+) -> Tuple[List[str], int, str | None]:
+    """
+    Stable pagination over cluster names (sorted). Items start at 'offset' or, if given, right after the cursor
+    name 'after'. Returns the names of the page, the total count and the cursor of the next page (if any).
+    """
+    names = sorted(names)
+    start = bisect.bisect_right(names, after) if after is not None else offset
+    page = names[start : start + limit]
+
+    if page and start + limit < len(names):
+        next_cursor = encode_cursor(page[-1])
+    else:
+        next_cursor = None
+
+    return page, len(names), next_cursor
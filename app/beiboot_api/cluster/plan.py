@@ -0,0 +1,296 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple, get_args
+
+from cluster.helpers import convert_to_timedelta, validation_errors
+from cluster.types import ClusterParameter, NodeCount, Parameter, Parameters
+from config.service import ConfigService
+from config.types import Config
+from pydantic import BaseModel, ValidationError
+from pydantic_core import InitErrorDetails
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+# alias (parameter name) -> (field name, parameter class) of Parameters
+PARAMETER_FIELDS: Dict[str, Tuple[str, type]] = {
+    field.alias: (name, get_args(field.annotation)[0])
+    for name, field in Parameters.model_fields.items()
+    if name != "cluster_config"
+}
+
+FIELD_ORDER: Dict[str, int] = {alias: index for index, alias in enumerate(PARAMETER_FIELDS)}
+
+# parameters validated against <name>_min/<name>_max of the cluster config, see Parameters.min_max_decimal_validator
+BOUNDED_PARAMETERS = (
+    "server_resources_requests_cpu",
+    "server_resources_requests_memory",
+    "server_resources_limits_cpu",
+    "server_resources_limits_memory",
+    "server_storage_requests",
+)
+
+
+@dataclass
+class PlanResult:
+    parameters: List[BaseModel] = field(default_factory=list)
+    defaults: List[ClusterParameter] = field(default_factory=list)
+    errors: List[dict] = field(default_factory=list)
+
+
+class ValidationPlan:
+    """
+    Validation of cluster parameters compiled from a cluster config: the bounds, allowed k8s versions and validated
+    defaults are computed once per config (version), instead of building and validating a complete Parameters model
+    per request. Validation is equivalent to Parameters(cluster_config=..., **parameters), errors are raised as
+    pydantic.ValidationError. One difference: if a default fails validation (e.g. the default lifetime exceeds
+    lifetime_limit), Parameters reports only that error, the plan reports the errors of the given parameters, too.
+    """
+
+    def __init__(self, cluster_config: Config, version: str | None = None, cache_size: int = 0):
+        self.cluster_config = cluster_config
+        self.version = version
+
+        # memoized results of check(...) by normalized parameters
+        self.cache_size = cache_size
+        self._results: "OrderedDict[Tuple, PlanResult]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.k8s_versions = frozenset(cluster_config.k8s_versions or [])
+        self.node_count_min = cluster_config.node_count_min
+        self.node_count_max = cluster_config.node_count_max
+        self.lifetime_limit = cluster_config.lifetime_limit
+        self.session_timeout_limit = cluster_config.session_timeout_limit
+        self.bounds: Dict[str, Tuple[Decimal | None, Decimal | None]] = {
+            name: (getattr(cluster_config, name + "_min"), getattr(cluster_config, name + "_max"))
+            for name in BOUNDED_PARAMETERS
+        }
+
+        # cross-field checks (with the cluster config) per field name
+        self._checks: Dict[str, Callable[[BaseModel], BaseModel]] = {
+            "k8s_version": self._check_k8s_version,
+            "node_count": self._check_node_count,
+            "lifetime": self._check_lifetime,
+            "session_timeout": self._check_session_timeout,
+            **{name: self._check_bounds(name) for name in BOUNDED_PARAMETERS},
+        }
+
+        # validated defaults, shared (read-only) by all requests
+        self.defaults: Dict[str, BaseModel] = {
+            name: Parameters.model_fields[name].default for name, _ in PARAMETER_FIELDS.values()
+        }
+        self.defaults["node_count"] = NodeCount(value=self.node_count_min)
+        for name, (minimum, _) in self.bounds.items():
+            if minimum:
+                # the minimum is already validated (see Config)
+                self.defaults[name] = type(self.defaults[name]).model_construct(
+                    name=self.defaults[name].name, value=minimum
+                )
+
+        # the limits apply to the default lifetime + session timeout, too
+        self._default_errors: Dict[str, InitErrorDetails] = {}
+        for name in ["lifetime", "session_timeout"]:
+            errors = []
+            self._check(name, self.defaults[name], errors)
+            if errors:
+                self._default_errors[name] = errors[0]
+
+    def validate(self, parameters: List[Parameter] | None) -> Parameters:
+        values = dict(self.defaults)
+        errors = list(self._default_errors.values())
+
+        # the last value of a parameter wins
+        for alias, parameter in {parameter.name.value: parameter for parameter in parameters or []}.items():
+            name, _class = PARAMETER_FIELDS[alias]
+            if name in self._default_errors:
+                errors.remove(self._default_errors[name])
+
+            try:
+                value = _class(name=parameter.name, value=parameter.value)
+            except ValidationError as e:
+                errors.extend(
+                    InitErrorDetails(
+                        type=error["type"], loc=(alias, *error["loc"]), input=error["input"], ctx=error.get("ctx", {})
+                    )
+                    for error in e.errors(include_url=False)
+                )
+                continue
+
+            values[name] = self._check(name, value, errors)
+
+        if errors:
+            # same order as the fields of Parameters
+            errors.sort(key=lambda error: FIELD_ORDER[error["loc"][0]])
+            raise ValidationError.from_exception_data(title=Parameters.__name__, line_errors=errors)
+
+        return Parameters.model_construct(cluster_config=self.cluster_config, **values)
+
+    def check(self, parameters: List[Parameter] | None) -> PlanResult:
+        """
+        Dry run of validate(...): the errors or the parameters (incl. the applied defaults), memoized (LRU).
+        """
+        # the last value of a parameter wins
+        key = tuple(
+            sorted(
+                (alias, tuple(parameter.value) if isinstance(parameter.value, list) else parameter.value)
+                for alias, parameter in {parameter.name.value: parameter for parameter in parameters or []}.items()
+            )
+        )
+        result = self._results.get(key)
+        if result:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        requested = {alias for alias, _ in key}
+        try:
+            validated = self.validate(parameters)
+            result = PlanResult(
+                parameters=[getattr(validated, name) for name, _ in PARAMETER_FIELDS.values()],
+                defaults=[ClusterParameter(alias) for alias in PARAMETER_FIELDS if alias not in requested],
+            )
+        except ValidationError as e:
+            result = PlanResult(errors=validation_errors(e))
+
+        if self.cache_size:
+            self._results[key] = result
+            if len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+
+        return result
+
+    def _check(self, name: str, value: BaseModel, errors: List[InitErrorDetails]) -> Any:
+        check = self._checks.get(name)
+        if not check:
+            return value
+
+        try:
+            return check(value)
+        except (ValueError, TypeError, AssertionError) as e:
+            alias = Parameters.model_fields[name].alias
+            errors.append(InitErrorDetails(type="value_error", loc=(alias,), input=value.value, ctx={"error": str(e)}))
+            return value
+
+    def _check_k8s_version(self, v: BaseModel) -> BaseModel:
+        if self.k8s_versions and v.value not in self.k8s_versions:
+            raise ValueError(f"Invalid {ClusterParameter.K8S_VERSION.value}: '{self.cluster_config.k8s_versions}'.")
+        return v
+
+    def _check_node_count(self, v: BaseModel) -> BaseModel:
+        if not self.node_count_min <= v.value <= (self.node_count_max or v.value):
+            raise ValueError(f"Invalid {ClusterParameter.NODE_COUNT.value}.")
+        return v
+
+    def _check_lifetime(self, v: BaseModel) -> BaseModel:
+        if not self.lifetime_limit >= convert_to_timedelta(v.value):
+            raise ValueError(f"Invalid {ClusterParameter.LIFETIME.value}: '{v.value}'. Limit: {self.lifetime_limit}")
+        return v
+
+    def _check_session_timeout(self, v: BaseModel) -> BaseModel:
+        if not self.session_timeout_limit >= convert_to_timedelta(v.value):
+            raise ValueError(
+                f"Invalid {ClusterParameter.SESSION_TIMEOUT.value}: '{v.value}'. Limit: {self.session_timeout_limit}"
+            )
+        return v
+
+    def _check_bounds(self, name: str) -> Callable[[BaseModel], BaseModel]:
+        minimum, maximum = self.bounds[name]
+
+        def check(v: BaseModel) -> BaseModel:
+            if not v.value:
+                return self.defaults[name]
+
+            if not (minimum or v.value) <= v.value <= (maximum or v.value):
+                raise ValueError(
+                    f"Invalid {v.name.value}. Min: {minimum or '-'}. Max: {maximum or '-'}. Value: {v.value or '-'}"
+                )
+            return v
+
+        return check
+
+
+class ValidationPlans:
+    """
+    Validation plans per group, compiled from the cluster config ConfigMap of the group (fallback: the default
+    ConfigMap, then the settings). A plan is recompiled only if the resource version of the ConfigMap changed.
+
+    The plan of a group is looked up again (ConfigMap reads) at most every 'cluster_validation_plan_ttl_seconds',
+    missing ConfigMaps included, i.e. a ConfigMap change applies within that time.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.default = ValidationPlan(
+            cluster_config=Config(**settings.model_dump()), cache_size=settings.cluster_validation_cache_size
+        )
+        self._plans: Dict[str, ValidationPlan] = {}
+        # group -> (expiry, plan) of the last lookup
+        self._lookups: Dict[str, Tuple[float, ValidationPlan]] = {}
+
+        # metrics
+        self.hits = 0
+        self.lookups = 0
+        self.compiled = 0
+
+    async def get(self, group: str | None, config_service: ConfigService) -> ValidationPlan:
+        group = group or self.settings.config_default_name
+        now = time.monotonic()
+        if group in self._lookups:
+            expires, plan = self._lookups[group]
+            if expires > now:
+                self.hits += 1
+                return plan
+
+        plan = await self._lookup(group=group, config_service=config_service)
+        self.lookups += 1
+        if self.settings.cluster_validation_plan_ttl_seconds:
+            self._lookups[group] = (now + self.settings.cluster_validation_plan_ttl_seconds, plan)
+        return plan
+
+    async def _lookup(self, group: str, config_service: ConfigService) -> ValidationPlan:
+        for name in dict.fromkeys([group, self.settings.config_default_name]):
+            try:
+                config_map = await config_service.get_config_map(name=name)
+            except ValueError:
+                continue
+
+            version = config_map.metadata.resource_version
+            plan = self._plans.get(name)
+            if plan and version and plan.version == version:
+                self.hits += 1
+                return plan
+
+            plan = ValidationPlan(
+                cluster_config=config_service.from_config_map(config_map),
+                version=version,
+                cache_size=self.settings.cluster_validation_cache_size,
+            )
+            self._plans[name] = plan
+            self.compiled += 1
+            logger.info(f"Validation plan compiled for config {name} (version: {version}).")
+            return plan
+
+        return self.default
+
+    def stats(self) -> dict:
+        return {
+            "plans": {name: plan.version for name, plan in self._plans.items()},
+            "hits": self.hits,
+            "lookups": self.lookups,
+            "compiled": self.compiled,
+            "results": {
+                "hits": sum(plan.hits for plan in [self.default, *self._plans.values()]),
+                "misses": sum(plan.misses for plan in [self.default, *self._plans.values()]),
+            },
+        }
+
+
+@lru_cache()
+def get_validation_plans() -> ValidationPlans:
+    return ValidationPlans(settings=get_settings())
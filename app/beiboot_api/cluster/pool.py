@@ -0,0 +1,200 @@
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+from functools import lru_cache
+from typing import Dict, List
+from uuid import uuid4
+
+from backend import KubernetesBackend, get_kubernetes_backend
+from beiboot.types import Beiboot, BeibootParameters, BeibootProvider, BeibootRequest, BeibootState
+from cluster.plan import ValidationPlan, get_validation_plans
+from cluster.store import BeibootStore, get_cluster_store
+from config.service import ConfigService
+from exceptions import ClusterConflictException
+from group.service import GroupService
+from group.types import GroupConfig
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+POOL_LABEL = "pool"
+POOL_PROFILE_LABEL = "pool-profile"
+POOL_CLIENT_ID = "beiboot-pool"
+
+
+def pool_profile(parameters: BeibootParameters) -> str:
+    # pooled clusters can only be handed out for requests with exactly the same parameters
+    data = json.dumps(dataclasses.asdict(parameters), sort_keys=True, default=str)
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+
+
+class ClusterPool:
+    """
+    Warm pool of unclaimed clusters per group, created with the default parameters of the group.
+
+    Pooled clusters carry the labels 'pool' (group) and 'pool-profile' (hash of the parameters) instead of user, group
+    and name, i.e. they are neither listed for users nor counted for the cluster limits. A create with matching
+    parameters claims a pooled cluster by relabeling it (the resource version is a precondition of the patch, a
+    cluster is claimed only once). The pool is refilled in the background and heartbeats are written for pooled
+    clusters, so they are not removed after the session timeout. The lifetime of a cluster starts when it is pooled.
+    """
+
+    def __init__(self, settings: Settings, store: BeibootStore):
+        self.settings = settings
+        self.store = store
+
+        self._claiming: set = set()
+        self._creating: Dict[str, int] = {}
+        self._sizes: Dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+        # metrics
+        self.claims = 0
+        self.misses = 0
+        self.conflicts = 0
+        self.errors = 0
+        self.created = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.cluster_pool_enabled
+
+    def request(self, group: str, plan: ValidationPlan) -> BeibootRequest:
+        # the default parameters of the group, i.e. a create without parameters
+        parameters = plan.validate(parameters=None).to_beiboot_parameters()
+        return BeibootRequest(
+            name=str(uuid4()),
+            provider=BeibootProvider.K3S,
+            parameters=parameters,
+            labels={POOL_LABEL: group, POOL_PROFILE_LABEL: pool_profile(parameters)},
+        )
+
+    def pooled(self, group: str, profile: str | None = None) -> List[Beiboot]:
+        labels = {POOL_LABEL: group}
+        if profile:
+            labels[POOL_PROFILE_LABEL] = profile
+
+        return [
+            beiboot
+            for beiboot in self.store.list(labels=labels)
+            if beiboot.state not in [BeibootState.TERMINATING, BeibootState.ERROR]
+        ]
+
+    async def claim(self, req: BeibootRequest, backend: KubernetesBackend) -> Beiboot | None:
+        group = req.labels.get("group")
+        if not self.enabled or not group or not self.store.synced:
+            return None
+
+        candidates = [
+            beiboot
+            for beiboot in self.pooled(group=group, profile=pool_profile(req.parameters))
+            if beiboot.name not in self._claiming
+        ]
+        # ready clusters first
+        candidates.sort(key=lambda beiboot: beiboot.state != BeibootState.READY)
+
+        for candidate in candidates:
+            self._claiming.add(candidate.name)
+            try:
+                beiboot = await backend.patch_beiboot_labels(
+                    name=candidate.name,
+                    labels={**req.labels, POOL_LABEL: None, POOL_PROFILE_LABEL: None},
+                    resource_version=candidate.resource_version,
+                )
+            except ClusterConflictException as e:
+                # claimed by another replica or changed in the meantime
+                logger.debug(f"Cluster pool: claim of {candidate.name} failed: {e}")
+                self.conflicts += 1
+                continue
+            except RuntimeError as e:
+                # API error: the cluster is created instead
+                logger.warning(f"Cluster pool: claim of {candidate.name} failed: {e}")
+                self.errors += 1
+                return None
+            finally:
+                self._claiming.discard(candidate.name)
+
+            self.claims += 1
+            logger.info(f"Cluster pool: claimed {beiboot.name} (group: {group}).")
+            return beiboot
+
+        self.misses += 1
+        return None
+
+    def start(self) -> None:
+        if not self.enabled or self._task:
+            return None
+
+        self._task = asyncio.create_task(self._run(), name="cluster-pool")
+        logger.info("Cluster pool started.")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refill(
+        self, group: str, group_config: GroupConfig, plan: ValidationPlan, backend: KubernetesBackend
+    ) -> None:
+        self._sizes[group] = group_config.pool_size or 0
+        pooled = self.pooled(group=group)
+
+        # keep pooled clusters alive
+        for beiboot in pooled:
+            if beiboot.state == BeibootState.READY:
+                await backend.write_heartbeat(client_id=POOL_CLIENT_ID, beiboot=beiboot)
+
+        missing = self._sizes[group] - len(pooled) - self._creating.get(group, 0)
+        for _ in range(max(missing, 0)):
+            self._creating[group] = self._creating.get(group, 0) + 1
+            try:
+                await backend.create_beiboot(self.request(group=group, plan=plan))
+                self.created += 1
+            except Exception as e:
+                logger.error(f"Cluster pool: create failed (group: {group}): {e}")
+                self.failed += 1
+                break
+            finally:
+                self._creating[group] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "claims": self.claims,
+            "misses": self.misses,
+            "conflicts": self.conflicts,
+            "errors": self.errors,
+            "created": self.created,
+            "failed": self.failed,
+            "groups": {
+                group: {"size": size, "pooled": self.store.count(label=POOL_LABEL, value=group)}
+                for group, size in self._sizes.items()
+            },
+        }
+
+    async def _run(self) -> None:
+        group_service = GroupService(settings=self.settings)
+        config_service = ConfigService(settings=self.settings)
+        while True:
+            await asyncio.sleep(self.settings.cluster_pool_refill_seconds)
+            if not self.store.synced:
+                continue
+
+            for group in group_service.available_groups():
+                try:
+                    group_config = await group_service.get_config(name=group)
+                    plan = await get_validation_plans().get(group=group, config_service=config_service)
+                    await self.refill(
+                        group=group, group_config=group_config, plan=plan, backend=get_kubernetes_backend()
+                    )
+                except Exception as e:
+                    logger.error(f"Cluster pool: refill failed (group: {group}): {e}")
+
+
+@lru_cache()
+def get_cluster_pool() -> ClusterPool:
+    return ClusterPool(settings=get_settings(), store=get_cluster_store())
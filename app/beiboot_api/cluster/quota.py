@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from uuid import uuid4
+
+from cluster.store import BeibootStore, get_cluster_store
+from exceptions import ClusterLimitException
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+@dataclass
+class Reservation:
+    user: str | None
+    group: str | None
+    count: int
+    expires: float
+    names: List[str] = field(default_factory=list)  # created clusters, not yet in the store
+    id: str = field(default_factory=lambda: uuid4().hex)
+
+
+class QuotaTracker:
+    """
+    Admission of new clusters against the user and group cluster limits.
+
+    The usage is the number of clusters in the store (label index, O(1)) plus the reservations of creates which are
+    not yet visible in the store. Check and reserve is atomic, i.e. concurrent creates cannot exceed a limit.
+
+    A reservation (of one or more clusters) is released if the create fails and dropped once the cluster appears in
+    the store. Reservations of lost requests expire after 'cluster_quota_reservation_seconds'.
+    """
+
+    def __init__(self, settings: Settings, store: BeibootStore):
+        self.settings = settings
+        self.store = store
+
+        self._lock = threading.Lock()
+        self._reservations: Dict[str, Reservation] = {}
+        self._pending: Counter[Tuple[str, str | None]] = Counter()
+
+        # metrics
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def usage(self, label: str, value: str | None, count: int | None = None) -> int:
+        if count is None:
+            count = self.store.count(label=label, value=value)
+
+        return count + self._pending[(label, value)]
+
+    def reserve(
+        self,
+        user: str | None,
+        group: str | None,
+        user_limit: int | None,
+        group_limit: int | None,
+        count: int = 1,
+        counts: Dict[str, int] | None = None,
+    ) -> Reservation:
+        """
+        Reserve 'count' clusters for user and group, raises ClusterLimitException if a limit would be exceeded.
+        'counts' are the current numbers of clusters per label ('user', 'group'), taken from the store if not given.
+        """
+        with self._lock:
+            self._prune()
+
+            try:
+                self._check(user, group, user_limit, group_limit, count=count, counts=counts)
+            except ClusterLimitException:
+                self.rejected += 1
+                raise
+
+            reservation = Reservation(
+                user=user,
+                group=group,
+                count=count,
+                expires=time.monotonic() + self.settings.cluster_quota_reservation_seconds,
+            )
+            self._reservations[reservation.id] = reservation
+            self._pending[("user", user)] += count
+            self._pending[("group", group)] += count
+            self.admitted += count
+
+        return reservation
+
+    def check(
+        self,
+        user: str | None,
+        group: str | None,
+        user_limit: int | None,
+        group_limit: int | None,
+        count: int = 1,
+        counts: Dict[str, int] | None = None,
+    ) -> None:
+        """Like reserve(...), without reserving (dry run)."""
+        with self._lock:
+            self._prune()
+            self._check(user, group, user_limit, group_limit, count=count, counts=counts)
+
+    def commit(self, reservation: Reservation, name: str) -> None:
+        """A cluster was created: keep its part of the reservation until the cluster is in the store."""
+        with self._lock:
+            if self.store.synced:
+                reservation.names.append(name)
+            else:
+                # usage is counted from a fresh list of the clusters, which contains the new cluster (the create
+                # invalidated the coalesced lists, see ClusterService.submit)
+                self._reduce(reservation, 1)
+
+    def release(self, reservation: Reservation) -> None:
+        """Release the part of the reservation which was not used by created clusters."""
+        with self._lock:
+            self._reduce(reservation, reservation.count - len(reservation.names))
+
+    def stats(self) -> dict:
+        return {
+            "reservations": len(self._reservations),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+    def _check(
+        self,
+        user: str | None,
+        group: str | None,
+        user_limit: int | None,
+        group_limit: int | None,
+        count: int,
+        counts: Dict[str, int] | None,
+    ) -> None:
+        counts = counts or {}
+
+        if group_limit and self.usage("group", group, count=counts.get("group")) + count > group_limit:
+            raise ClusterLimitException("Group cluster limit reached.")
+
+        if user_limit and self.usage("user", user, count=counts.get("user")) + count > user_limit:
+            raise ClusterLimitException("User cluster limit reached.")
+
+    def _prune(self) -> None:
+        # reservations are only held for creates in flight and clusters not yet in the store, i.e. only a few
+        now = time.monotonic()
+        for reservation in list(self._reservations.values()):
+            if reservation.expires <= now:
+                if reservation.count > len(reservation.names):
+                    self.expired += 1
+                self._reduce(reservation, reservation.count)
+                continue
+
+            stored = [name for name in reservation.names if self.store.get(name=name)]
+            if stored:
+                reservation.names = [name for name in reservation.names if name not in stored]
+                self._reduce(reservation, len(stored))
+
+    def _reduce(self, reservation: Reservation, count: int) -> None:
+        if count <= 0 or reservation.id not in self._reservations:
+            return None
+
+        reservation.count -= count
+        if reservation.count <= 0:
+            del self._reservations[reservation.id]
+
+        for key in [("user", reservation.user), ("group", reservation.group)]:
+            self._pending[key] -= count
+            if self._pending[key] <= 0:
+                del self._pending[key]
+
+
+@lru_cache()
+def get_quota_tracker() -> QuotaTracker:
+    return QuotaTracker(settings=get_settings(), store=get_cluster_store())
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Set
+
+from cluster.shards import ReplicaSet, get_replica_set
+from exceptions import ConnectionLimitException
+from fastapi import WebSocket
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+@dataclass(eq=False)
+class Connection:
+    websocket: WebSocket
+    cluster_id: str
+    user: str | None
+    connected: float = field(default_factory=time.monotonic)
+
+
+class ConnectionRegistry:
+    """
+    Open websocket connections of this replica, indexed by cluster and by user: connect and disconnect are O(1), a
+    broadcast only visits the connections of its cluster. A user can hold at most 'websocket_user_connection_limit'
+    connections, with sharding enabled: across all replicas (as of their last sync, see ReplicaSet). Connections without
+    a user (no X-Forwarded-User) are not counted per user and have no limit.
+    """
+
+    def __init__(self, settings: Settings, replicas: ReplicaSet | None = None):
+        self.settings = settings
+        self.replicas = replicas
+        self._by_cluster: Dict[str, Set[Connection]] = {}
+        self._by_user: Dict[str, Set[Connection]] = {}
+        self._count = 0
+
+        # metrics
+        self.connected = 0
+        self.rejected = 0
+        self.broadcasts = 0
+        self.send_failures = 0
+
+    def connect(self, websocket: WebSocket, cluster_id: str, user: str | None) -> Connection:
+        limit = self.settings.websocket_user_connection_limit
+        if limit and user is not None and self._user_count(user) >= limit:
+            self.rejected += 1
+            raise ConnectionLimitException(f"Connection limit reached ({limit}).")
+
+        connection = Connection(websocket=websocket, cluster_id=cluster_id, user=user)
+        self._by_cluster.setdefault(cluster_id, set()).add(connection)
+        if user is not None:
+            self._by_user.setdefault(user, set()).add(connection)
+        self._count += 1
+        self.connected += 1
+        return connection
+
+    def disconnect(self, connection: Connection) -> None:
+        # idempotent: a connection closed by a broadcast is disconnected again by its endpoint
+        connections = self._by_cluster.get(connection.cluster_id)
+        if connections is None or connection not in connections:
+            return None
+
+        self._discard(self._by_cluster, connection.cluster_id, connection)
+        if connection.user is not None:
+            self._discard(self._by_user, connection.user, connection)
+        self._count -= 1
+
+    def connections(self, cluster_id: str) -> List[Connection]:
+        return list(self._by_cluster.get(cluster_id, ()))
+
+    def count(self, cluster_id: str | None = None, user: str | None = None) -> int:
+        if cluster_id is not None:
+            return len(self._by_cluster.get(cluster_id, ()))
+        if user is not None:
+            return len(self._by_user.get(user, ()))
+        return self._count
+
+    def cluster_counts(self) -> Dict[str, int]:
+        return {cluster_id: len(connections) for cluster_id, connections in self._by_cluster.items()}
+
+    def user_counts(self) -> Dict[str, int]:
+        return {user: len(connections) for user, connections in self._by_user.items()}
+
+    async def broadcast(self, cluster_id: str, message: dict) -> int:
+        """
+        Sends the message to all connections of the cluster, connections that fail are disconnected. Returns the
+        number of connections that received the message.
+        """
+        connections = self.connections(cluster_id)
+        if not connections:
+            return 0
+
+        self.broadcasts += 1
+        results = await asyncio.gather(
+            *[connection.websocket.send_json(message) for connection in connections], return_exceptions=True
+        )
+        sent = 0
+        for connection, result in zip(connections, results):
+            if isinstance(result, BaseException):
+                logger.debug(f"Websocket send failed (cluster: '{cluster_id}', client: '{connection.user}'): {result}")
+                self.send_failures += 1
+                self.disconnect(connection)
+            else:
+                sent += 1
+        return sent
+
+    async def close(self, cluster_id: str, code: int, reason: str = "") -> int:
+        # closes (and disconnects) all connections of the cluster, returns the number of connections
+        connections = self.connections(cluster_id)
+        for connection in connections:
+            self.disconnect(connection)
+
+        await asyncio.gather(
+            *[connection.websocket.close(code=code, reason=reason) for connection in connections],
+            return_exceptions=True,
+        )
+        return len(connections)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self._count,
+            "clusters": len(self._by_cluster),
+            "users": len(self._by_user),
+            "connected": self.connected,
+            "rejected": self.rejected,
+            "broadcasts": self.broadcasts,
+            "send_failures": self.send_failures,
+        }
+
+    def _user_count(self, user: str) -> int:
+        count = len(self._by_user.get(user, ()))
+        if self.replicas and self.replicas.enabled:
+            count += self.replicas.connections(user=user)
+        return count
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[Connection]], key: str, connection: Connection) -> None:
+        connections = index[key]
+        connections.discard(connection)
+        if not connections:
+            del index[key]
+
+
+@lru_cache()
+def get_connection_registry() -> ConnectionRegistry:
+    return ConnectionRegistry(settings=get_settings(), replicas=get_replica_set())
@@ -1,126 +1,269 @@
+import asyncio
 import logging
-from typing import Annotated, List
+import time
+from datetime import datetime
+from typing import Annotated, Dict, List, Tuple
 from uuid import uuid4
 
-from beiboot import api
-from beiboot.types import Beiboot, BeibootParameters, BeibootProvider, BeibootRequest
+from backend import KubernetesBackend, get_kubernetes_backend
+from beiboot.types import Beiboot, BeibootProvider, BeibootRequest, BeibootState
+from cluster.events import ClusterSubscription
+from cluster.heartbeat import HeartbeatAggregator, get_heartbeat_aggregator
+from cluster.helpers import paginate_names
+from cluster.plan import ValidationPlan, ValidationPlans, get_validation_plans
+from cluster.pool import ClusterPool, get_cluster_pool
+from cluster.quota import QuotaTracker, Reservation, get_quota_tracker
+from cluster.store import BeibootStore, get_cluster_store
 from cluster.types import ClusterRequest, Labels, Parameters
-from config.types import Config
+from coalescer import SingleFlight, get_coalescer
+from config.service import ConfigService
+from exceptions import ClusterExistsException
 from fastapi import Depends, Request
+from group.types import GroupConfig
 from settings import Settings, get_settings
 
 logger = logging.getLogger("uvicorn.beiboot")
 
+CLUSTER_ID_ATTEMPTS = 3
+
 
 class ClusterService:
-    def __init__(self, settings: Annotated[Settings, Depends(get_settings)]):
+    def __init__(
+        self,
+        settings: Annotated[Settings, Depends(get_settings)],
+        store: Annotated[BeibootStore, Depends(get_cluster_store)],
+        backend: Annotated[KubernetesBackend, Depends(get_kubernetes_backend)],
+        coalescer: Annotated[SingleFlight, Depends(get_coalescer)],
+        quota: Annotated[QuotaTracker, Depends(get_quota_tracker)],
+        pool: Annotated[ClusterPool, Depends(get_cluster_pool)],
+        plans: Annotated[ValidationPlans, Depends(get_validation_plans)],
+        heartbeats: Annotated[HeartbeatAggregator, Depends(get_heartbeat_aggregator)],
+    ):
         self.settings = settings
+        self.store = store
+        self.backend = backend
+        self.coalescer = coalescer
+        self.quota = quota
+        self.pool = pool
+        self.plans = plans
+        self.heartbeats = heartbeats
 
     def create_new_cluster_id(self) -> str:
-        cluster_id = uuid4()
+        # no API call: known names are checked with the store, a conflict on create is retried (see submit)
+        while True:
+            cluster_id = str(uuid4())
+            if not (self.store.synced and self.store.get(name=cluster_id)):
+                return cluster_id
 
-        beiboot = self.get(cluster_id=cluster_id)
-        if beiboot:
-            raise Exception(detail="Cluster ID collision. Please try again.")
+    async def list(self, labels: Labels = None) -> List[Beiboot]:
+        if not labels:
+            labels = Labels()
 
-        return cluster_id
+        if self.store.synced:
+            return self.store.list(labels=labels.model_dump(exclude_none=True))
+
+        selector = labels.model_dump(exclude_none=True)
+        beiboots = await self.coalescer.do(
+            key=SingleFlight.key(resource="beiboots", labels=selector),
+            func=lambda: self.backend.list_beiboots(labels=selector),
+        )
+        return beiboots
 
-    def list(self, labels: Labels = None) -> List[Beiboot]:
+    def version(self) -> str | None:
+        # collection version, only available if served by the store
+        return self.store.version if self.store.synced else None
+
+    async def page(
+        self, offset: int, limit: int, after: str | None = None, labels: Labels = None
+    ) -> Tuple[List[Beiboot], int, str | None]:
         if not labels:
             labels = Labels()
 
-        beiboots = api.read_all(labels.dict(exclude_none=True))
-        return beiboots
+        if self.store.synced:
+            return self.store.page(labels=labels.model_dump(exclude_none=True), offset=offset, limit=limit, after=after)
+
+        beiboots = {bbt.name: bbt for bbt in await self.list(labels=labels)}
+        names, total, next_cursor = paginate_names(beiboots.keys(), offset=offset, limit=limit, after=after)
+        return [beiboots[name] for name in names], total, next_cursor
+
+    def changes(self, since: str, labels: Labels = None) -> Tuple[List[Beiboot], List[Beiboot]] | None:
+        # changes since a version are only available if served by the store
+        if not self.store.synced:
+            return None
+
+        if not labels:
+            labels = Labels()
+
+        return self.store.changes(since=since, labels=labels.model_dump(exclude_none=True))
+
+    async def reserve(
+        self, user: str | None, group: str | None, group_config: GroupConfig, count: int = 1
+    ) -> Reservation:
+        return self.quota.reserve(
+            user=user,
+            group=group,
+            user_limit=group_config.user_cluster_limit,
+            group_limit=group_config.group_cluster_limit,
+            count=count,
+            counts=await self._counts(user=user, group=group),
+        )
+
+    async def check_quota(self, user: str | None, group: str | None, group_config: GroupConfig, count: int = 1) -> None:
+        # raises ClusterLimitException, nothing is reserved
+        self.quota.check(
+            user=user,
+            group=group,
+            user_limit=group_config.user_cluster_limit,
+            group_limit=group_config.group_cluster_limit,
+            count=count,
+            counts=await self._counts(user=user, group=group),
+        )
+
+    async def _counts(self, user: str | None, group: str | None) -> Dict[str, int] | None:
+        # clusters are counted by the quota tracker (store), if the store is not available: count from a list
+        if self.store.synced:
+            return None
+
+        return {
+            "user": len(await self.list(labels=Labels(user=user))),
+            "group": len(await self.list(labels=Labels(group=group))),
+        }
+
+    def subscribe(self, cluster_id: str | None = None, labels: Labels = None) -> ClusterSubscription | None:
+        # cluster events are only available if served by the store
+        if not self.store.synced:
+            return None
 
-    def get(self, cluster_id: str, labels: Labels = None) -> Beiboot | None:
-        beiboots = self.list(labels=labels)
+        if not labels:
+            labels = Labels()
+
+        return self.store.events.subscribe(labels=labels.model_dump(exclude_none=True), name=cluster_id)
+
+    def unsubscribe(self, subscription: ClusterSubscription) -> None:
+        self.store.events.unsubscribe(subscription)
+
+    async def wait_for_state(
+        self, cluster_id: str, states: List[BeibootState], timeout: float, labels: Labels = None
+    ) -> Beiboot | None:
+        """
+        Wait until the cluster is in one of the states, returns the cluster after at most 'timeout'. A cluster that is
+        not found yet (just created) is waited for, None is returned if it disappears.
+        """
+        deadline = time.monotonic() + timeout
+        seen = False
+
+        # subscribe first, a change between get and subscribe would be missed otherwise
+        subscription = self.subscribe(cluster_id=cluster_id, labels=labels)
+        try:
+            while True:
+                beiboot = await self.get(cluster_id=cluster_id, labels=labels)
+                remaining = deadline - time.monotonic()
+                if (beiboot and beiboot.state in states) or (seen and not beiboot) or remaining <= 0:
+                    return beiboot
+                seen = seen or beiboot is not None
+
+                if subscription:
+                    try:
+                        await subscription.get(timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await asyncio.sleep(min(1, remaining))
+        finally:
+            if subscription:
+                self.unsubscribe(subscription)
+
+    async def get(self, cluster_id: str, labels: Labels = None) -> Beiboot | None:
+        if self.store.synced:
+            return self.store.get(name=str(cluster_id), labels=labels.model_dump(exclude_none=True) if labels else None)
+
+        beiboots = await self.list(labels=labels)
         for bbt in beiboots:
             if bbt.name == cluster_id:
                 return bbt
         else:
             return None
 
-    def create(self, request: Request, cluster_request: ClusterRequest) -> Beiboot:  # noqa: C901
-        # validate labels + parameters
-        labels = Labels(name=cluster_request.name, user=request.state.user)
+    async def plan(self, group: str | None) -> ValidationPlan:
+        config_service = ConfigService(settings=self.settings, backend=self.backend, coalescer=self.coalescer)
+        return await self.plans.get(group=group, config_service=config_service)
 
-        cluster_config = Config(**self.settings.dict())
-        tmp = {str(parameter.name.value): parameter for parameter in cluster_request.parameters}
+    def validate(self, cluster_request: ClusterRequest, plan: ValidationPlan | None = None) -> Parameters:
+        # raises pydantic.ValidationError for invalid parameters
+        return (plan or self.plans.default).validate(cluster_request.parameters)
 
-        try:
-            parameters = Parameters(cluster_config=cluster_config, **tmp)
-        except Exception as e:
-            raise ValueError(detail=e.errors())
-
-        # generate new cluster_id + convert parameters
-        cluster_id = str(self.create_new_cluster_id())
-        ports = [str(port) for port in parameters.ports.value]
-
-        serverResources = {}
-        if parameters.server_resources_requests_cpu.value or parameters.server_resources_requests_memory.value:
-            serverResources["requests"] = {}
-            if parameters.server_resources_requests_cpu.value:
-                serverResources["requests"]["cpu"] = parameters.server_resources_requests_cpu.value
-            if parameters.server_resources_requests_memory.value:
-                serverResources["requests"]["memory"] = parameters.server_resources_requests_memory.value
-
-        if parameters.server_resources_limits_cpu.value or parameters.server_resources_limits_memory.value:
-            serverResources["limits"] = {}
-            if parameters.server_resources_limits_cpu.value:
-                serverResources["limits"]["cpu"] = parameters.server_resources_limits_cpu.value
-            if parameters.server_resources_limits_memory.value:
-                serverResources["limits"]["memory"] = parameters.server_resources_limits_memory.value
-
-        nodeResources = {}
-        if parameters.node_resources_requests_cpu.value or parameters.node_resources_requests_memory.value:
-            nodeResources["requests"] = {}
-            if parameters.node_resources_requests_cpu.value:
-                nodeResources["requests"]["cpu"] = parameters.node_resources_requests_cpu.value
-            if parameters.node_resources_requests_memory.value:
-                nodeResources["requests"]["memory"] = parameters.node_resources_requests_memory.value
-
-        if parameters.node_resources_limits_cpu.value or parameters.node_resources_limits_memory.value:
-            nodeResources["limits"] = {}
-            if parameters.node_resources_limits_cpu.value:
-                nodeResources["limits"]["cpu"] = parameters.node_resources_limits_cpu.value
-            if parameters.node_resources_limits_memory.value:
-                nodeResources["limits"]["memory"] = parameters.node_resources_limits_memory.value
-
-        # cluster creation
-        req = BeibootRequest(
+    async def create(self, request: Request, cluster_request: ClusterRequest) -> Beiboot:
+        plan = await self.plan(group=cluster_request.group)
+        parameters = self.validate(cluster_request=cluster_request, plan=plan)
+        return await self.submit(user=request.state.user, cluster_request=cluster_request, parameters=parameters)
+
+    async def submit(self, user: str | None, cluster_request: ClusterRequest, parameters: Parameters) -> Beiboot:
+        labels = Labels(name=cluster_request.name, user=user, group=cluster_request.group)
+        req = self.build_request(
+            cluster_id=self.create_new_cluster_id(), parameters=parameters, labels=labels.model_dump(exclude_none=True)
+        )
+
+        # hand out a pooled cluster if available
+        beiboot = await self.pool.claim(req, backend=self.backend)
+        if beiboot:
+            self.coalescer.invalidate("beiboots")
+            return beiboot
+
+        for _ in range(CLUSTER_ID_ATTEMPTS):
+            try:
+                beiboot = await self.backend.create_beiboot(req)
+            except ClusterExistsException:
+                logger.warning(f"Cluster ID collision: {req.name}.")
+                req.name = self.create_new_cluster_id()
+            else:
+                # a coalesced list from before the create would not count the new cluster (see QuotaTracker.commit)
+                self.coalescer.invalidate("beiboots")
+                return beiboot
+
+        raise RuntimeError("Cluster ID collision. Please try again.")
+
+    @staticmethod
+    def build_request(cluster_id: str, parameters: Parameters, labels: Dict[str, str]) -> BeibootRequest:
+        return BeibootRequest(
             name=cluster_id,
             provider=BeibootProvider.K3S,
-            parameters=BeibootParameters(
-                k8sVersion=parameters.k8s_version.value,
-                ports=ports,
-                nodes=parameters.node_count.value,
-                maxLifetime=parameters.lifetime.value,
-                maxSessionTimeout=parameters.session_timeout.value,
-                clusterReadyTimeout=parameters.cluster_ready_timeout.value,
-                serverResources=serverResources,
-                nodeResources=nodeResources,
-                serverStorageRequests=parameters.server_storage_requests.value,
-                nodeStorageRequests=parameters.node_storage_requests.value,
-                gefyra={
-                    "enabled": parameters.gefyra_enabled.value,
-                    "endpoint": parameters.gefyra_endpoint.value,
-                },
-                tunnel={
-                    "enabled": parameters.tunnel_enabled.value,
-                    "endpoint": parameters.tunnel_endpoint.value,
-                },
-            ),
-            labels=labels.dict(exclude_none=True),
+            parameters=parameters.to_beiboot_parameters(),
+            labels=labels,
         )
-        beiboot = api.create(req)
-        return beiboot
 
-    def delete(self, cluster_id: str, labels: Labels = None):
-        beiboot = self.get(cluster_id=cluster_id, labels=labels)
+    async def resolve(self, cluster_ids: List[str] | None, labels: Labels = None) -> Dict[str, Beiboot | None]:
+        """
+        The Beiboots by id (None: unknown or not matching the labels), resolved with the store index or a single
+        listing. Without ids: all Beiboots matching the labels.
+        """
+        if cluster_ids is None:
+            return {beiboot.name: beiboot for beiboot in await self.list(labels=labels)}
+
+        cluster_ids = list(dict.fromkeys(cluster_ids))
+        if self.store.synced:
+            selector = labels.model_dump(exclude_none=True) if labels else None
+            return {cluster_id: self.store.get(name=cluster_id, labels=selector) for cluster_id in cluster_ids}
+
+        beiboots = {beiboot.name: beiboot for beiboot in await self.list(labels=labels)}
+        return {cluster_id: beiboots.get(cluster_id) for cluster_id in cluster_ids}
+
+    async def delete(self, cluster_id: str, labels: Labels = None):
+        beiboot = await self.get(cluster_id=cluster_id, labels=labels)
         if not beiboot:
             raise ValueError("Cluster not found")
 
-        api.delete_by_name(name=cluster_id)
+        await self.remove(beiboot)
+
+    async def remove(self, beiboot: Beiboot) -> None:
+        # the Beiboot was resolved before (see get, resolve), raises RuntimeWarning if it is already gone
+        try:
+            await self.backend.delete_beiboot(name=beiboot.name)
+        finally:
+            self.coalescer.invalidate("beiboots")
+
+    def write_heartbeat(self, client_id: str | None, beiboot: Beiboot) -> datetime:
+        # written with the next flush of the heartbeat aggregator, clients without X-Forwarded-User share one entry
+        return self.heartbeats.add(client_id=client_id or "unknown", beiboot=beiboot)
 
 
 def get_cluster_service(service: Annotated[ClusterService, Depends(ClusterService)]) -> ClusterService:
@@ -0,0 +1,314 @@
+import asyncio
+import bisect
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from backend import KubernetesBackend, get_kubernetes_backend
+from kubernetes.client.rest import ApiException
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of cluster ids to replicas with 'vnodes' points per replica: if a replica joins or leaves,
+    only the clusters of its points move to another replica.
+    """
+
+    def __init__(self, replicas: Iterable[str], vnodes: int = 64):
+        self.replicas = frozenset(replicas)
+        points = sorted((ring_hash(f"{replica}#{i}"), replica) for replica in self.replicas for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [replica for _, replica in points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._hashes:
+            return None
+
+        index = bisect.bisect(self._hashes, ring_hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+@dataclass
+class ReplicaState:
+    name: str
+    updated: float = 0.0
+    # open websocket connections per cluster and per user
+    connections: Dict[str, int] = field(default_factory=dict)
+    users: Dict[str, int] = field(default_factory=dict)
+    # heartbeats received for clusters of other shards: cluster -> client -> timestamp (ISO format)
+    heartbeats: Dict[str, Dict[str, str]] = field(default_factory=dict)
+
+
+class ReplicaBackend(ABC):
+    """
+    Shared state of the API replicas, each replica publishes its own ReplicaState.
+    """
+
+    @abstractmethod
+    async def publish(self, state: ReplicaState) -> None:
+        ...
+
+    @abstractmethod
+    async def states(self) -> List[ReplicaState]:
+        ...
+
+    @abstractmethod
+    async def remove(self, name: str) -> None:
+        ...
+
+
+class MemoryReplicaBackend(ReplicaBackend):
+    """In-process backend, e.g. for tests with several ReplicaSets in one process."""
+
+    def __init__(self):
+        self._states: Dict[str, str] = {}
+
+    async def publish(self, state: ReplicaState) -> None:
+        # serialized: a published state is a snapshot, like with the other backends
+        self._states[state.name] = json.dumps(dataclasses.asdict(state))
+
+    async def states(self) -> List[ReplicaState]:
+        return [ReplicaState(**json.loads(data)) for data in self._states.values()]
+
+    async def remove(self, name: str) -> None:
+        self._states.pop(name, None)
+
+
+class FileReplicaBackend(ReplicaBackend):
+    """One JSON file per replica in a directory, e.g. a volume shared by all replicas."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def publish(self, state: ReplicaState) -> None:
+        await asyncio.to_thread(self._write, state)
+
+    async def states(self) -> List[ReplicaState]:
+        return await asyncio.to_thread(self._read)
+
+    async def remove(self, name: str) -> None:
+        await asyncio.to_thread(lambda: (self.path / f"{name}.json").unlink(missing_ok=True))
+
+    def _write(self, state: ReplicaState) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / f".{state.name}.json.tmp"
+        tmp.write_text(json.dumps(dataclasses.asdict(state)))
+        # atomic: readers never see a partial file
+        os.replace(tmp, self.path / f"{state.name}.json")
+
+    def _read(self) -> List[ReplicaState]:
+        states = []
+        for file in self.path.glob("*.json"):
+            try:
+                states.append(ReplicaState(**json.loads(file.read_text())))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Cannot read replica state '{file}': {e}")
+        return states
+
+
+class ConfigMapReplicaBackend(ReplicaBackend):
+    """
+    One ConfigMap per replica in the namespace of the API (labelled app=api-replica), no shared volume required: the
+    replicas publish and read their states through the API server.
+    """
+
+    labels = {"app": "api-replica"}
+
+    def __init__(self, namespace: str, backend: KubernetesBackend | None = None):
+        self.namespace = namespace
+        self._backend = backend
+
+    @property
+    def backend(self) -> KubernetesBackend:
+        # resolved per call: the asyncio client is set up with the startup of the app
+        return self._backend or get_kubernetes_backend()
+
+    async def publish(self, state: ReplicaState) -> None:
+        await self.backend.apply_config_map(
+            name=self._name(state.name),
+            namespace=self.namespace,
+            labels=self.labels,
+            data={"state": json.dumps(dataclasses.asdict(state))},
+        )
+
+    async def states(self) -> List[ReplicaState]:
+        states = []
+        for config_map in await self.backend.list_config_maps(namespace=self.namespace, labels=self.labels):
+            try:
+                states.append(ReplicaState(**json.loads((config_map.data or {})["state"])))
+            except (KeyError, ValueError, TypeError) as e:
+                logger.warning(f"Cannot read replica state '{config_map.metadata.name}': {e}")
+        return states
+
+    async def remove(self, name: str) -> None:
+        try:
+            await self.backend.delete_config_map(name=self._name(name), namespace=self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+
+    @staticmethod
+    def _name(name: str) -> str:
+        return f"api-replica-{name}"
+
+
+class ReplicaSet:
+    """
+    Sharding of clusters across the API replicas: each replica owns the clusters mapped to it by a consistent hash
+    ring of the live replicas (published within 'sharding_replica_ttl_seconds'). Heartbeats received for clusters of
+    other replicas are published and written by the owning replica only, i.e. the number of heartbeat writes does not
+    grow with the number of replicas. The connection counts of all replicas are shared the same way.
+    """
+
+    def __init__(self, settings: Settings, backend: ReplicaBackend):
+        self.settings = settings
+        self.backend = backend
+        self.name = settings.pod_name
+        self._ring = HashRing([self.name], vnodes=settings.sharding_virtual_nodes)
+        self._states: Dict[str, ReplicaState] = {}
+
+        # heartbeats of other shards, published until they are older than the ttl
+        self._outbox: Dict[str, Dict[str, datetime]] = {}
+        # latest heartbeat timestamps received from other replicas per (cluster, client)
+        self._received: Dict[Tuple[str, str], datetime] = {}
+
+        # metrics
+        self.syncs = 0
+        self.forwarded = 0
+        self.received = 0
+        self.rebalances = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.sharding_enabled
+
+    def owns(self, cluster_id: str) -> bool:
+        return not self.enabled or self._ring.owner(cluster_id) == self.name
+
+    def forward(self, cluster_id: str, heartbeats: Dict[str, datetime]) -> None:
+        # heartbeats for a cluster of another shard, published with the next sync
+        outbox = self._outbox.setdefault(cluster_id, {})
+        for client_id, timestamp in heartbeats.items():
+            if client_id not in outbox or outbox[client_id] < timestamp:
+                outbox[client_id] = timestamp
+        self.forwarded += len(heartbeats)
+
+    async def sync(self, connections: Dict[str, int], users: Dict[str, int]) -> Dict[str, Dict[str, datetime]]:
+        """
+        Publishes the state of this replica and reads the states of the other replicas. Returns the new heartbeats of
+        the other replicas for clusters of this shard.
+        """
+        now = time.time()
+        ttl = self.settings.sharding_replica_ttl_seconds
+        self._prune(now=now, ttl=ttl)
+        await self.backend.publish(
+            ReplicaState(
+                name=self.name,
+                updated=now,
+                connections=connections,
+                users=users,
+                heartbeats={
+                    cluster_id: {client_id: timestamp.isoformat() for client_id, timestamp in heartbeats.items()}
+                    for cluster_id, heartbeats in self._outbox.items()
+                },
+            )
+        )
+
+        self._states = {
+            state.name: state
+            for state in await self.backend.states()
+            if state.name != self.name and now - state.updated <= ttl
+        }
+        self.syncs += 1
+
+        replicas = {self.name, *self._states}
+        if replicas != self._ring.replicas:
+            self._ring = HashRing(replicas, vnodes=self.settings.sharding_virtual_nodes)
+            self.rebalances += 1
+            logger.info(f"Replicas changed: {', '.join(sorted(replicas))}.")
+
+        received: Dict[str, Dict[str, datetime]] = {}
+        for state in self._states.values():
+            for cluster_id, heartbeats in state.heartbeats.items():
+                if not self.owns(cluster_id):
+                    continue
+
+                for client_id, value in heartbeats.items():
+                    timestamp = datetime.fromisoformat(value)
+                    key = (cluster_id, client_id)
+                    # published again until it expires: only new heartbeats
+                    if key in self._received and self._received[key] >= timestamp:
+                        continue
+
+                    self._received[key] = timestamp
+                    received.setdefault(cluster_id, {})[client_id] = timestamp
+                    self.received += 1
+
+        return received
+
+    def connections(self, cluster_id: str | None = None, user: str | None = None) -> int:
+        # open websocket connections of the other replicas (as of the last sync)
+        if cluster_id is not None:
+            return sum(state.connections.get(cluster_id, 0) for state in self._states.values())
+        if user is not None:
+            return sum(state.users.get(user, 0) for state in self._states.values())
+        return sum(sum(state.connections.values()) for state in self._states.values())
+
+    async def leave(self) -> None:
+        if self.enabled:
+            await self.backend.remove(self.name)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "name": self.name,
+            "replicas": sorted(self._ring.replicas),
+            "connections": {state.name: sum(state.connections.values()) for state in self._states.values()},
+            "syncs": self.syncs,
+            "forwarded": self.forwarded,
+            "received": self.received,
+            "rebalances": self.rebalances,
+        }
+
+    def _prune(self, now: float, ttl: float) -> None:
+        expired = datetime.utcfromtimestamp(now - ttl)
+        for cluster_id, heartbeats in list(self._outbox.items()):
+            for client_id, timestamp in list(heartbeats.items()):
+                if timestamp < expired:
+                    del heartbeats[client_id]
+            if not heartbeats:
+                del self._outbox[cluster_id]
+
+        for key, timestamp in list(self._received.items()):
+            if timestamp < expired:
+                del self._received[key]
+
+
+def replica_backend(settings: Settings) -> ReplicaBackend:
+    if settings.sharding_backend == "file":
+        return FileReplicaBackend(path=settings.sharding_file_path)
+    if settings.sharding_backend == "configmap":
+        return ConfigMapReplicaBackend(namespace=settings.sharding_namespace)
+    return MemoryReplicaBackend()
+
+
+@lru_cache()
+def get_replica_set() -> ReplicaSet:
+    settings = get_settings()
+    return ReplicaSet(settings=settings, backend=replica_backend(settings))
@@ -0,0 +1,274 @@
+import logging
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, List, Tuple
+from uuid import uuid4
+
+import kubernetes as k8s
+from beiboot.configuration import default_configuration
+from beiboot.types import Beiboot
+from cluster.catalog import ClusterCatalog
+from cluster.events import ClusterEvent, ClusterEventBroker
+from cluster.helpers import paginate_names
+from kubernetes.client.rest import ApiException
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+BEIBOOT_GROUP = "getdeck.dev"
+BEIBOOT_VERSION = "v1"
+BEIBOOT_PLURAL = "beiboots"
+
+
+class StoredBeiboot(Beiboot):
+    @property
+    def resource_version(self) -> str | None:
+        return self._data.get("metadata", {}).get("resourceVersion")
+
+    def fetch_object(self):
+        # the store keeps the object data up to date (watch), no need to read it again from the API
+        pass
+
+
+class BeibootStore:
+    """
+    Informer-style in-memory store of all Beiboot objects.
+
+    A background thread lists all Beiboots once and keeps the store up to date with a watch. The watch is restarted
+    on expiry, a full list (resync) is done periodically and whenever the resource version is gone (410).
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.namespace = default_configuration.NAMESPACE
+
+        self._lock = threading.RLock()
+        self._catalog = ClusterCatalog()
+        self._resource_version: str | None = None
+
+        # collection version: '<epoch>.<sequence>', the sequence is increased on every change of the content
+        self._epoch = uuid4().hex[:8]
+        self._sequence = 0
+        # recent changes (including deleted Beiboots) for delta requests, see changes(...)
+        self._changelog: Deque[ClusterEvent] = deque(maxlen=settings.cluster_store_changelog_size)
+
+        self.events = ClusterEventBroker(maxsize=settings.cluster_events_queue_size)
+
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def synced(self) -> bool:
+        return self._synced.is_set()
+
+    @property
+    def resource_version(self) -> str | None:
+        return self._resource_version
+
+    @property
+    def version(self) -> str:
+        return f"{self._epoch}.{self._sequence}"
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return None
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="beiboot-store", daemon=True)
+        self._thread.start()
+        logger.info("Beiboot store started.")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._synced.clear()
+        logger.info("Beiboot store stopped.")
+
+    def list(self, labels: Dict[str, str] | None = None) -> List[Beiboot]:
+        with self._lock:
+            return self._catalog.select(labels=labels)
+
+    def get(self, name: str, labels: Dict[str, str] | None = None) -> Beiboot | None:
+        with self._lock:
+            beiboot = self._catalog.get(name)
+
+        if not beiboot or (labels and not ClusterCatalog.match(beiboot, labels)):
+            return None
+
+        return beiboot
+
+    def page(
+        self, labels: Dict[str, str] | None, offset: int, limit: int, after: str | None = None
+    ) -> Tuple[List[Beiboot], int, str | None]:
+        with self._lock:
+            names, total, next_cursor = paginate_names(
+                self._catalog.names(labels=labels), offset=offset, limit=limit, after=after
+            )
+            beiboots = [self._catalog.get(name) for name in names]
+
+        return beiboots, total, next_cursor
+
+    def changes(self, since: str, labels: Dict[str, str] | None = None) -> Tuple[List[Beiboot], List[Beiboot]] | None:
+        """
+        Beiboots changed and deleted after version 'since'. None if these changes are unknown: the version belongs to
+        another store (epoch, e.g. after a restart) or is older than the changelog.
+        """
+        epoch, _, sequence = since.partition(".")
+        if epoch != self._epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+
+        with self._lock:
+            if sequence > self._sequence:
+                return None
+            if sequence < self._sequence and (not self._changelog or self._changelog[0].sequence > sequence + 1):
+                return None
+
+            # latest change per Beiboot
+            latest: Dict[str, ClusterEvent] = {}
+            for event in reversed(self._changelog):
+                if event.sequence <= sequence:
+                    break
+                latest.setdefault(event.beiboot.name, event)
+
+        changed, deleted = [], []
+        for name in sorted(latest):
+            event = latest[name]
+            if labels and not ClusterCatalog.match(event.beiboot, labels):
+                continue
+            if event.type == "DELETED":
+                deleted.append(event.beiboot)
+            else:
+                changed.append(event.beiboot)
+
+        return changed, deleted
+
+    def count(self, label: str, value: str) -> int:
+        with self._lock:
+            return self._catalog.count(label=label, value=value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = self._catalog.stats()
+
+        return {
+            "synced": self.synced,
+            "version": self.version,
+            "resource_version": self._resource_version,
+            "subscribers": len(self.events),
+            "changelog": len(self._changelog),
+            **stats,
+        }
+
+    def replace(self, items: List[dict], resource_version: str | None) -> None:
+        beiboots = {beiboot.name: beiboot for beiboot in map(self._convert, items) if beiboot}
+
+        with self._lock:
+            # changes compared to the current content (e.g. events missed while the watch was down)
+            events = []
+            for beiboot in self._catalog.all():
+                if beiboot.name not in beiboots:
+                    events.append(self._record("DELETED", beiboot))
+            for name, beiboot in beiboots.items():
+                current = self._catalog.get(name)
+                if not current:
+                    events.append(self._record("ADDED", beiboot))
+                elif current.resource_version != beiboot.resource_version:
+                    events.append(self._record("MODIFIED", beiboot))
+
+            self._catalog.replace(beiboots.values())
+            self._resource_version = resource_version
+
+        for event in events:
+            self.events.publish(event)
+
+    def apply(self, event_type: str, item: dict) -> None:
+        resource_version = item.get("metadata", {}).get("resourceVersion")
+
+        if event_type == "BOOKMARK":
+            with self._lock:
+                self._resource_version = resource_version
+            return None
+
+        beiboot = self._convert(item)
+        if not beiboot:
+            return None
+
+        with self._lock:
+            if event_type == "DELETED":
+                self._catalog.remove(beiboot.name)
+            else:
+                self._catalog.put(beiboot)
+            event = self._record(event_type, beiboot)
+            self._resource_version = resource_version
+
+        self.events.publish(event)
+
+    def _record(self, event_type: str, beiboot: Beiboot) -> ClusterEvent:
+        self._sequence += 1
+        event = ClusterEvent(type=event_type, beiboot=beiboot, version=self.version, sequence=self._sequence)
+        self._changelog.append(event)
+        return event
+
+    def _convert(self, item: dict) -> StoredBeiboot | None:
+        try:
+            return StoredBeiboot(item)
+        except (KeyError, TypeError, ValueError) as e:
+            name = item.get("metadata", {}).get("name")
+            logger.warning(f"Beiboot store: skipping invalid Beiboot '{name}': {e}")
+            return None
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._list()
+                self._watch()
+            except Exception as e:
+                self._synced.clear()
+                logger.error(f"Beiboot store: {e}")
+                self._stopped.wait(self.settings.cluster_store_retry_seconds)
+
+    def _list(self) -> None:
+        response = default_configuration.K8S_CUSTOM_OBJECT_API.list_namespaced_custom_object(
+            group=BEIBOOT_GROUP,
+            version=BEIBOOT_VERSION,
+            namespace=self.namespace,
+            plural=BEIBOOT_PLURAL,
+        )
+        self.replace(items=response["items"], resource_version=response["metadata"].get("resourceVersion"))
+        self._synced.set()
+        logger.debug(f"Beiboot store: listed {len(response['items'])} Beiboots ({self._resource_version}).")
+
+    def _watch(self) -> None:
+        resync_at = time.monotonic() + self.settings.cluster_store_resync_seconds
+
+        while not self._stopped.is_set() and time.monotonic() < resync_at:
+            watch = k8s.watch.Watch()
+            try:
+                for event in watch.stream(
+                    default_configuration.K8S_CUSTOM_OBJECT_API.list_namespaced_custom_object,
+                    group=BEIBOOT_GROUP,
+                    version=BEIBOOT_VERSION,
+                    namespace=self.namespace,
+                    plural=BEIBOOT_PLURAL,
+                    resource_version=self._resource_version,
+                    allow_watch_bookmarks=True,
+                    timeout_seconds=self.settings.cluster_store_watch_timeout_seconds,
+                ):
+                    self.apply(event_type=event["type"], item=event["object"])
+
+                    if self._stopped.is_set():
+                        watch.stop()
+            except ApiException as e:
+                if e.status == 410:
+                    # resource version too old: relist
+                    logger.debug("Beiboot store: watch expired.")
+                    return None
+                raise
+
+
+@lru_cache()
+def get_cluster_store() -> BeibootStore:
+    return BeibootStore(settings=get_settings())
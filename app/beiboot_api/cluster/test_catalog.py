@@ -0,0 +1,62 @@
+from unittest import TestCase
+
+from beiboot.types import Beiboot
+from cluster.catalog import ClusterCatalog
+from cluster.test_store import beiboot_object
+
+
+def beiboot(name: str, user: str = "john", group: str | None = None) -> Beiboot:
+    obj = beiboot_object(name, user=user)
+    if group:
+        obj["metadata"]["labels"]["group"] = group
+    return Beiboot(obj)
+
+
+class ClusterCatalogTest(TestCase):
+    def setUp(self):
+        self.catalog = ClusterCatalog()
+        self.catalog.replace(
+            [
+                beiboot("a", user="john", group="developer"),
+                beiboot("b", user="john", group="free"),
+                beiboot("c", user="jane", group="developer"),
+            ]
+        )
+
+    def test_get(self):
+        self.assertEqual(self.catalog.get("a").name, "a")
+        self.assertIsNone(self.catalog.get("unknown"))
+        self.assertIn("b", self.catalog)
+
+    def test_select(self):
+        self.assertEqual(self.catalog.names(labels={"user": "john"}), {"a", "b"})
+        self.assertEqual(self.catalog.names(labels={"user": "john", "group": "developer"}), {"a"})
+        self.assertEqual(self.catalog.names(labels={"user": "unknown"}), set())
+        self.assertEqual(len(self.catalog.select()), 3)
+
+    def test_select_unindexed_label(self):
+        self.assertEqual(self.catalog.names(labels={"unknown": "value"}), set())
+
+    def test_count(self):
+        self.assertEqual(self.catalog.count(label="group", value="developer"), 2)
+        self.assertEqual(self.catalog.count(label="user", value="jane"), 1)
+
+    def test_update(self):
+        self.catalog.put(beiboot("b", user="jane", group="free"))
+
+        self.assertEqual(self.catalog.names(labels={"user": "john"}), {"a"})
+        self.assertEqual(self.catalog.names(labels={"user": "jane"}), {"b", "c"})
+        self.assertEqual(len(self.catalog), 3)
+
+    def test_remove(self):
+        self.catalog.remove("c")
+
+        self.assertEqual(self.catalog.count(label="user", value="jane"), 0)
+        self.assertEqual(self.catalog.stats()["index_keys"]["user"], 1)
+        self.assertIsNone(self.catalog.remove("c"))
+
+    def test_stats(self):
+        stats = self.catalog.stats()
+        self.assertEqual(stats["clusters"], 3)
+        self.assertEqual(stats["index_entries"], 9)
+        self.assertGreater(stats["index_bytes"], 0)
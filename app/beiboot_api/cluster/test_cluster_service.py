@@ -0,0 +1,122 @@
+from unittest import IsolatedAsyncioTestCase
+
+from backend import KubernetesBackend
+from cluster.heartbeat import HeartbeatAggregator
+from cluster.plan import ValidationPlans
+from cluster.pool import ClusterPool
+from cluster.quota import QuotaTracker
+from cluster.service import ClusterService
+from cluster.store import BeibootStore, StoredBeiboot
+from cluster.test_store import beiboot_object
+from cluster.types import ClusterRequest, Labels
+from coalescer import SingleFlight
+from exceptions import ClusterExistsException
+from settings import Settings
+from test_backend import FakeKubernetesBackend
+
+
+class FakeBackend(FakeKubernetesBackend):
+    def __init__(self, conflicts: int = 0, beiboots: list | None = None):
+        self.conflicts = conflicts
+        self.names = []
+        self.beiboots = beiboots or []
+        self.lists = 0
+
+    async def list_beiboots(self, labels):
+        self.lists += 1
+        return [StoredBeiboot(obj) for obj in self.beiboots if labels.items() <= obj["metadata"]["labels"].items()]
+
+    async def create_beiboot(self, req):
+        self.names.append(req.name)
+        if len(self.names) <= self.conflicts:
+            raise ClusterExistsException(f"The requested Beiboot cluster '{req.name}' already exists.")
+
+        return StoredBeiboot(beiboot_object(req.name))
+
+    async def delete_beiboot(self, name):
+        pass
+
+
+class ClusterServiceTest(IsolatedAsyncioTestCase):
+    def service(self, backend: KubernetesBackend, items: list | None = None) -> ClusterService:
+        # items: served by the (synced) store, None: by the backend
+        settings = Settings()
+        store = BeibootStore(settings=settings)
+        if items is not None:
+            store.replace(items=items, resource_version="1")
+            store._synced.set()
+        return ClusterService(
+            settings=settings,
+            store=store,
+            backend=backend,
+            coalescer=SingleFlight(),
+            quota=QuotaTracker(settings=settings, store=store),
+            pool=ClusterPool(settings=settings, store=store),
+            plans=ValidationPlans(settings=settings),
+            heartbeats=HeartbeatAggregator(settings=settings),
+        )
+
+    async def submit(self, service: ClusterService) -> StoredBeiboot:
+        cluster_request = ClusterRequest(name="hello", group="free")
+        parameters = service.validate(cluster_request=cluster_request)
+        return await service.submit(user="john", cluster_request=cluster_request, parameters=parameters)
+
+    async def test_submit(self):
+        backend = FakeBackend()
+        beiboot = await self.submit(self.service(backend, items=[]))
+
+        self.assertEqual(backend.names, [beiboot.name])
+
+    async def test_submit_unsynced(self):
+        # without the store, clusters are counted from coalesced lists: a create invalidates them
+        backend = FakeBackend()
+        service = self.service(backend)
+        service.coalescer = SingleFlight(window=60)
+
+        self.assertEqual(await service._counts(user="john", group="free"), {"user": 0, "group": 0})
+        beiboot = await self.submit(service)
+        backend.beiboots.append(beiboot_object(beiboot.name, user="john"))
+        self.assertEqual((await service._counts(user="john", group="free"))["user"], 1)
+
+        await service.remove(beiboot)
+        backend.beiboots.clear()
+        self.assertEqual((await service._counts(user="john", group="free"))["user"], 0)
+        self.assertEqual(backend.lists, 6)
+
+    async def test_submit_conflict(self):
+        backend = FakeBackend(conflicts=1)
+        beiboot = await self.submit(self.service(backend, items=[]))
+
+        self.assertEqual(len(backend.names), 2)
+        self.assertNotEqual(backend.names[0], backend.names[1])
+        self.assertEqual(beiboot.name, backend.names[1])
+
+    async def test_submit_conflicts(self):
+        backend = FakeBackend(conflicts=5)
+
+        with self.assertRaises(RuntimeError):
+            await self.submit(self.service(backend, items=[]))
+        self.assertEqual(len(backend.names), 3)
+
+    async def test_resolve(self):
+        backend = FakeBackend()
+        service = self.service(backend, items=[beiboot_object("c1"), beiboot_object("c2", user="jane")])
+
+        beiboots = await service.resolve(cluster_ids=["c1", "c2", "c3", "c1"], labels=Labels(user="john"))
+        self.assertEqual(list(beiboots), ["c1", "c2", "c3"])
+        self.assertEqual(beiboots["c1"].name, "c1")
+        # c2 belongs to another user
+        self.assertIsNone(beiboots["c2"])
+        self.assertIsNone(beiboots["c3"])
+
+        beiboots = await service.resolve(cluster_ids=None, labels=Labels(name="c1", user="john"))
+        self.assertEqual(list(beiboots), ["c1"])
+        self.assertEqual(backend.lists, 0)
+
+    async def test_resolve_listing(self):
+        backend = FakeBackend(beiboots=[beiboot_object("c1"), beiboot_object("c2"), beiboot_object("c3", user="jane")])
+        service = self.service(backend)
+
+        beiboots = await service.resolve(cluster_ids=["c1", "c2", "c3"], labels=Labels(user="john"))
+        self.assertEqual([name for name, beiboot in beiboots.items() if beiboot], ["c1", "c2"])
+        self.assertEqual(backend.lists, 1)
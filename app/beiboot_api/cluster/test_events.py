@@ -0,0 +1,46 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from cluster.events import ClusterEvent, ClusterEventBroker
+from cluster.store import StoredBeiboot
+from cluster.test_store import beiboot_object
+
+
+def cluster_event(name: str, user: str = "john") -> ClusterEvent:
+    return ClusterEvent(type="ADDED", beiboot=StoredBeiboot(beiboot_object(name, user=user)), version="v.1", sequence=1)
+
+
+class ClusterEventBrokerTest(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.broker = ClusterEventBroker(maxsize=2)
+
+    async def test_publish(self):
+        subscription = self.broker.subscribe(labels={"user": "john"})
+        single = self.broker.subscribe(name="b")
+
+        self.broker.publish(cluster_event("a", user="jane"))
+        self.broker.publish(cluster_event("b", user="john"))
+
+        self.assertEqual((await subscription.get(timeout=1)).beiboot.name, "b")
+        self.assertEqual((await single.get(timeout=1)).beiboot.name, "b")
+        with self.assertRaises(asyncio.TimeoutError):
+            await subscription.get(timeout=0.05)
+
+    async def test_overflow(self):
+        subscription = self.broker.subscribe()
+
+        for name in ["a", "b", "c", "d"]:
+            self.broker.publish(cluster_event(name))
+        await asyncio.sleep(0)
+
+        self.assertEqual((await subscription.get(timeout=1)).beiboot.name, "a")
+        self.assertEqual((await subscription.get(timeout=1)).beiboot.name, "b")
+        self.assertIsNone(await subscription.get(timeout=1))
+        self.assertTrue(subscription.overflowed)
+
+    async def test_unsubscribe(self):
+        subscription = self.broker.subscribe()
+        self.assertEqual(len(self.broker), 1)
+
+        self.broker.unsubscribe(subscription)
+        self.assertEqual(len(self.broker), 0)
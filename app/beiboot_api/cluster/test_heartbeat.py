@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from unittest import IsolatedAsyncioTestCase
+
+from cluster.heartbeat import HeartbeatAggregator
+from cluster.store import StoredBeiboot
+from cluster.test_store import beiboot_object
+from settings import Settings
+from test_backend import FakeKubernetesBackend
+
+
+class FakeBackend(FakeKubernetesBackend):
+    def __init__(self, fail: set | None = None):
+        self.fail = fail or set()
+        self.writes = []
+
+    async def write_heartbeats(self, beiboot, heartbeats):
+        if beiboot.name in self.fail:
+            raise RuntimeError("Cannot write heartbeat")
+        self.writes.append((beiboot.name, heartbeats))
+
+
+class HeartbeatAggregatorTest(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.aggregator = HeartbeatAggregator(settings=Settings(heartbeat_min_interval_ratio=0.1))
+        self.c1 = StoredBeiboot(beiboot_object("c1"))
+        self.c2 = StoredBeiboot(beiboot_object("c2"))
+
+    async def test_flush(self):
+        now = datetime.utcnow()
+        for client_id in ["john", "jane", "john"]:
+            self.aggregator.add(client_id=client_id, beiboot=self.c1, timestamp=now)
+        self.aggregator.add(client_id="john", beiboot=self.c2, timestamp=now)
+        # an older heartbeat does not replace the latest one
+        self.aggregator.add(client_id="jane", beiboot=self.c1, timestamp=now - timedelta(seconds=5))
+
+        backend = FakeBackend()
+        await self.aggregator.flush(backend=backend)
+
+        # one write per cluster
+        self.assertEqual(sorted(backend.writes), [("c1", {"john": now, "jane": now}), ("c2", {"john": now})])
+        self.assertEqual((self.aggregator.received, self.aggregator.writes), (5, 2))
+        self.assertEqual(self.aggregator.batch_size, 3)
+
+        # nothing pending
+        await self.aggregator.flush(backend=backend)
+        self.assertEqual(len(backend.writes), 2)
+        self.assertEqual(self.aggregator.flushes, 1)
+
+    async def test_flush_failed(self):
+        self.aggregator.add(client_id="john", beiboot=self.c1)
+        self.aggregator.add(client_id="john", beiboot=self.c2)
+
+        backend = FakeBackend(fail={"c1"})
+        await self.aggregator.flush(backend=backend)
+
+        self.assertEqual([name for name, _ in backend.writes], ["c2"])
+        self.assertEqual((self.aggregator.writes, self.aggregator.failed), (1, 1))
+        # failed writes are not retried
+        self.assertEqual(self.aggregator.stats()["clusters"], 0)
+
+    async def test_suppressed(self):
+        # maxSessionTimeout: 5m, ratio 0.1: at most one written heartbeat per client and cluster every 30s
+        now = datetime.utcnow()
+        self.aggregator.add(client_id="john", beiboot=self.c1, timestamp=now)
+        backend = FakeBackend()
+        await self.aggregator.flush(backend=backend)
+
+        self.aggregator.add(client_id="john", beiboot=self.c1, timestamp=now + timedelta(seconds=10))
+        self.aggregator.add(client_id="jane", beiboot=self.c1, timestamp=now + timedelta(seconds=10))
+        await self.aggregator.flush(backend=backend)
+        self.assertEqual(backend.writes[1], ("c1", {"jane": now + timedelta(seconds=10)}))
+
+        self.aggregator.add(client_id="john", beiboot=self.c1, timestamp=now + timedelta(seconds=31))
+        await self.aggregator.flush(backend=backend)
+        self.assertEqual(backend.writes[2], ("c1", {"john": now + timedelta(seconds=31)}))
+
+        stats = self.aggregator.stats()
+        self.assertEqual((stats["received"], stats["suppressed"], stats["written"]), (4, 1, 3))
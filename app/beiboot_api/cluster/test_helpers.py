@@ -1,7 +1,7 @@
 from datetime import timedelta
 from unittest import TestCase
 
-from cluster.helpers import convert_to_timedelta
+from cluster.helpers import convert_to_timedelta, decode_cursor, encode_cursor, paginate_names
 
 
 class ConvertToTimedelta(TestCase):
@@ -27,3 +27,27 @@ class ConvertToTimedelta(TestCase):
 
     def test_invalid(self):
         self.assertRaises(ValueError, convert_to_timedelta, "bla")
+
+
+class PaginateNames(TestCase):
+    names = ["c", "a", "e", "b", "d"]
+
+    def test_offset(self):
+        self.assertEqual(paginate_names(self.names, offset=0, limit=2), (["a", "b"], 5, encode_cursor("b")))
+        self.assertEqual(paginate_names(self.names, offset=4, limit=2), (["e"], 5, None))
+        self.assertEqual(paginate_names(self.names, offset=10, limit=2), ([], 5, None))
+
+    def test_cursor(self):
+        page, total, next_cursor = paginate_names(
+            self.names, offset=0, limit=2, after=decode_cursor(encode_cursor("b"))
+        )
+        self.assertEqual(page, ["c", "d"])
+        self.assertEqual(next_cursor, encode_cursor("d"))
+
+    def test_cursor_deleted(self):
+        # the cursor is stable, even if the last item of the previous page is gone
+        page, _, _ = paginate_names(["a", "c", "d"], offset=0, limit=2, after="b")
+        self.assertEqual(page, ["c", "d"])
+
+    def test_invalid_cursor(self):
+        self.assertRaises(ValueError, decode_cursor, "%%%")
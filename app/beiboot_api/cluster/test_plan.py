@@ -0,0 +1,147 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from cluster.helpers import validation_errors
+from cluster.plan import ValidationPlan, ValidationPlans
+from cluster.types import ClusterParameter, Parameter, Parameters
+from config.types import Config
+from pydantic import ValidationError
+from settings import Settings
+
+CONFIGS = [
+    Config(),
+    Config(k8s_versions="1.26.0,1.27.0", node_count_max=None, lifetime_limit="30m"),
+    Config(server_resources_requests_cpu_max="2", server_storage_requests_max="10Gi"),
+]
+
+PARAMETERS = [
+    [],
+    [{"name": "K8S_VERSION", "value": "1.26.0"}, {"name": "NODE_COUNT", "value": 2}],
+    [{"name": "K8S_VERSION", "value": "1.25"}, {"name": "NODE_COUNT", "value": 9}],
+    [{"name": "PORTS", "value": ["8080:80", "6443:6443"]}, {"name": "LIFETIME", "value": "20m"}],
+    [{"name": "PORTS", "value": "x"}, {"name": "SESSION_TIMEOUT", "value": "x"}, {"name": "LIFETIME", "value": "9h"}],
+    [{"name": "SERVER_RESOURCES_REQUESTS_CPU", "value": "1"}, {"name": "SERVER_STORAGE_REQUESTS", "value": "1Gi"}],
+    [{"name": "SERVER_RESOURCES_REQUESTS_CPU", "value": "4"}, {"name": "NODE_RESOURCES_LIMITS_MEMORY", "value": "1"}],
+    [{"name": "NODE_COUNT", "value": 1}, {"name": "NODE_COUNT", "value": 3}, {"name": "GEFYRA_ENABLED", "value": 0}],
+]
+
+
+def validate(cluster_config: Config, parameters: list) -> Parameters:
+    return Parameters(cluster_config=cluster_config, **{parameter["name"]: parameter for parameter in parameters})
+
+
+def errors(e: ValidationError) -> list:
+    # pydantic reports errors of validated defaults by field name instead of the alias
+    return [
+        {
+            **error,
+            "loc": (getattr(Parameters.model_fields.get(error["loc"][0]), "alias", error["loc"][0]), *error["loc"][1:]),
+        }
+        for error in validation_errors(e)
+    ]
+
+
+class ValidationPlanTest(TestCase):
+    def test_equivalent(self):
+        # the plan validates exactly like the Parameters model
+        for cluster_config in CONFIGS:
+            plan = ValidationPlan(cluster_config=cluster_config)
+            for parameters in PARAMETERS:
+                with self.subTest(cluster_config=cluster_config, parameters=parameters):
+                    try:
+                        expected = validate(cluster_config, parameters).to_beiboot_parameters()
+                    except ValidationError as e:
+                        with self.assertRaises(ValidationError) as cm:
+                            plan.validate([Parameter(**parameter) for parameter in parameters])
+                        expected_errors, plan_errors = errors(e), errors(cm.exception)
+                        if expected_errors != plan_errors:
+                            # Parameters reports only the error of a failing default, the plan reports all errors
+                            given = {parameter["name"] for parameter in parameters}
+                            self.assertFalse({error["loc"][0] for error in expected_errors} & given)
+                            self.assertEqual(
+                                [error for error in plan_errors if error in expected_errors], expected_errors
+                            )
+                        continue
+
+                    parameters = plan.validate([Parameter(**parameter) for parameter in parameters])
+                    self.assertEqual(parameters.to_beiboot_parameters(), expected)
+
+    def test_minimum_default(self):
+        plan = ValidationPlan(cluster_config=Config(server_resources_requests_cpu_min="0.5"))
+
+        parameters = plan.validate(None)
+        self.assertEqual(str(parameters.server_resources_requests_cpu.value), "0.5")
+
+    def test_check(self):
+        plan = ValidationPlan(cluster_config=Config(), cache_size=1)
+
+        result = plan.check([Parameter(name="NODE_COUNT", value=2), Parameter(name="PORTS", value=["80:80"])])
+        self.assertFalse(result.errors)
+        self.assertNotIn(ClusterParameter.NODE_COUNT, result.defaults)
+        self.assertIn(ClusterParameter.LIFETIME, result.defaults)
+
+        # same parameters (normalized): memoized
+        self.assertIs(
+            plan.check([Parameter(name="PORTS", value=["80:80"]), Parameter(name="NODE_COUNT", value=2)]), result
+        )
+
+        result = plan.check([Parameter(name="NODE_COUNT", value=9)])
+        self.assertEqual(result.errors[0]["loc"], ("NODE_COUNT",))
+        self.assertEqual((plan.hits, plan.misses), (1, 2))
+
+
+class FakeConfigService:
+    def __init__(self, config_maps: dict):
+        self.config_maps = config_maps
+        self.reads = 0
+
+    async def get_config_map(self, name: str):
+        self.reads += 1
+        if name not in self.config_maps:
+            raise ValueError(f"ConfigMap {name} not found")
+        return self.config_maps[name]
+
+    def from_config_map(self, cm) -> Config:
+        return Config(**cm.data)
+
+
+class ConfigMap:
+    def __init__(self, data: dict, resource_version: str):
+        self.data = data
+        self.metadata = type("Metadata", (), {"resource_version": resource_version})
+
+
+class ValidationPlansTest(IsolatedAsyncioTestCase):
+    async def test_get(self):
+        plans = ValidationPlans(settings=Settings(cluster_validation_plan_ttl_seconds=0))
+        config_service = FakeConfigService({"free": ConfigMap({"node_count_max": "2"}, resource_version="1")})
+
+        plan = await plans.get(group="free", config_service=config_service)
+        self.assertEqual(plan.node_count_max, 2)
+        self.assertIs(await plans.get(group="free", config_service=config_service), plan)
+
+        # changed ConfigMap
+        config_service.config_maps["free"] = ConfigMap({"node_count_max": "5"}, resource_version="2")
+        self.assertEqual((await plans.get(group="free", config_service=config_service)).node_count_max, 5)
+        self.assertEqual(plans.stats()["compiled"], 2)
+
+        # no ConfigMap: settings
+        self.assertIs(await plans.get(group="developer", config_service=config_service), plans.default)
+
+    async def test_get_ttl(self):
+        plans = ValidationPlans(settings=Settings(cluster_validation_plan_ttl_seconds=60))
+        config_service = FakeConfigService({"free": ConfigMap({"node_count_max": "2"}, resource_version="1")})
+
+        plan = await plans.get(group="free", config_service=config_service)
+        self.assertIs(await plans.get(group="free", config_service=config_service), plan)
+        self.assertEqual(config_service.reads, 1)
+
+        # missing ConfigMaps (group + default) are not read again either
+        self.assertIs(await plans.get(group="developer", config_service=config_service), plans.default)
+        self.assertIs(await plans.get(group="developer", config_service=config_service), plans.default)
+        self.assertEqual(config_service.reads, 3)
+
+        # expired: read again
+        plans._lookups = {group: (0, plan) for group, (_, plan) in plans._lookups.items()}
+        config_service.config_maps["free"] = ConfigMap({"node_count_max": "5"}, resource_version="2")
+        self.assertEqual((await plans.get(group="free", config_service=config_service)).node_count_max, 5)
+        self.assertEqual((plans.hits, plans.lookups), (2, 3))
@@ -0,0 +1,130 @@
+from unittest import IsolatedAsyncioTestCase
+
+from cluster.plan import ValidationPlan
+from cluster.pool import POOL_LABEL, POOL_PROFILE_LABEL, ClusterPool
+from cluster.store import BeibootStore, StoredBeiboot
+from cluster.test_store import beiboot_object
+from config.types import Config
+from exceptions import ClusterConflictException
+from group.types import GroupConfig
+from settings import Settings
+from test_backend import FakeKubernetesBackend
+
+
+class FakeBackend(FakeKubernetesBackend):
+    def __init__(self, store: BeibootStore):
+        self.store = store
+        self.heartbeats = []
+
+    async def create_beiboot(self, req):
+        item = beiboot_object(req.name, state="PENDING", resource_version="1")
+        item["metadata"]["labels"] = req.labels
+        self.store.apply(event_type="ADDED", item=item)
+        return StoredBeiboot(item)
+
+    async def patch_beiboot_labels(self, name, labels, resource_version=None):
+        beiboot = self.store.get(name=name)
+        if resource_version != beiboot.resource_version:
+            raise ClusterConflictException("Conflict (409)")
+
+        item = dict(beiboot._data, metadata=dict(beiboot._data["metadata"]))
+        item["metadata"]["labels"] = {
+            k: v for k, v in {**item["metadata"]["labels"], **labels}.items() if v is not None
+        }
+        item["metadata"]["resourceVersion"] = str(int(resource_version) + 1)
+        self.store.apply(event_type="MODIFIED", item=item)
+        return StoredBeiboot(item)
+
+    async def write_heartbeat(self, client_id, beiboot):
+        self.heartbeats.append((client_id, beiboot.name))
+
+
+class ClusterPoolTest(IsolatedAsyncioTestCase):
+    def setUp(self):
+        settings = Settings(cluster_pool_enabled=True)
+        self.store = BeibootStore(settings=settings)
+        self.store.replace(items=[], resource_version="1")
+        self.store._synced.set()
+        self.backend = FakeBackend(store=self.store)
+        self.pool = ClusterPool(settings=settings, store=self.store)
+        self.plan = ValidationPlan(cluster_config=Config())
+
+    def ready(self, name: str) -> None:
+        item = dict(self.store.get(name=name)._data, state="READY")
+        self.store.apply(event_type="MODIFIED", item=item)
+
+    async def test_refill(self):
+        await self.pool.refill(
+            group="free", group_config=GroupConfig(pool_size=2), plan=self.plan, backend=self.backend
+        )
+        pooled = self.pool.pooled(group="free")
+        self.assertEqual(len(pooled), 2)
+        self.assertTrue(all(POOL_PROFILE_LABEL in beiboot.labels for beiboot in pooled))
+        self.assertFalse(any("group" in beiboot.labels for beiboot in pooled))
+
+        self.ready(pooled[0].name)
+        await self.pool.refill(
+            group="free", group_config=GroupConfig(pool_size=2), plan=self.plan, backend=self.backend
+        )
+        self.assertEqual(len(self.pool.pooled(group="free")), 2)
+        self.assertEqual(self.backend.heartbeats, [("beiboot-pool", pooled[0].name)])
+
+    async def test_claim(self):
+        await self.pool.refill(
+            group="free", group_config=GroupConfig(pool_size=1), plan=self.plan, backend=self.backend
+        )
+        name = self.pool.pooled(group="free")[0].name
+
+        req = self.pool.request(group="free", plan=self.plan)
+        req.labels = {"name": "hello", "user": "john", "group": "free"}
+        beiboot = await self.pool.claim(req, backend=self.backend)
+
+        self.assertEqual(beiboot.name, name)
+        self.assertEqual(beiboot.labels, {"name": "hello", "user": "john", "group": "free"})
+        self.assertNotIn(POOL_LABEL, self.store.get(name=name).labels)
+        self.assertEqual(self.store.count(label="user", value="john"), 1)
+
+        # pool empty
+        self.assertIsNone(await self.pool.claim(req, backend=self.backend))
+        self.assertEqual((self.pool.claims, self.pool.misses), (1, 1))
+
+    async def test_claim_parameters(self):
+        await self.pool.refill(
+            group="free", group_config=GroupConfig(pool_size=1), plan=self.plan, backend=self.backend
+        )
+
+        req = self.pool.request(group="free", plan=self.plan)
+        req.labels = {"name": "hello", "user": "john", "group": "free"}
+        req.parameters.nodes = 3
+        self.assertIsNone(await self.pool.claim(req, backend=self.backend))
+
+    async def test_claim_conflict(self):
+        await self.pool.refill(
+            group="free", group_config=GroupConfig(pool_size=1), plan=self.plan, backend=self.backend
+        )
+        pooled = self.pool.pooled(group="free")[0]
+
+        req = self.pool.request(group="free", plan=self.plan)
+        req.labels = {"name": "hello", "user": "john", "group": "free"}
+        stale = StoredBeiboot(dict(pooled._data, metadata=dict(pooled._data["metadata"], resourceVersion="0")))
+        self.pool.pooled = lambda group, profile=None: [stale]
+
+        self.assertIsNone(await self.pool.claim(req, backend=self.backend))
+        self.assertEqual(self.pool.conflicts, 1)
+
+    async def test_claim_error(self):
+        await self.pool.refill(
+            group="free", group_config=GroupConfig(pool_size=2), plan=self.plan, backend=self.backend
+        )
+
+        async def fail(name, labels, resource_version=None):
+            raise RuntimeError("Error patching Beiboot object: Unsupported Media Type (415)")
+
+        self.backend.patch_beiboot_labels = fail
+        req = self.pool.request(group="free", plan=self.plan)
+        req.labels = {"name": "hello", "user": "john", "group": "free"}
+
+        # not a conflict: reported, no further claims
+        with self.assertLogs("uvicorn.beiboot", level="WARNING"):
+            self.assertIsNone(await self.pool.claim(req, backend=self.backend))
+        self.assertEqual((self.pool.errors, self.pool.conflicts), (1, 0))
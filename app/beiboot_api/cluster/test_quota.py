@@ -0,0 +1,88 @@
+from unittest import TestCase
+
+from cluster.quota import QuotaTracker
+from cluster.store import BeibootStore
+from cluster.test_store import beiboot_object
+from exceptions import ClusterLimitException
+from settings import Settings
+
+
+def group_beiboot_object(name: str, user: str, group: str = "free", resource_version: str = "1") -> dict:
+    item = beiboot_object(name, user=user, resource_version=resource_version)
+    item["metadata"]["labels"]["group"] = group
+    return item
+
+
+class QuotaTrackerTest(TestCase):
+    def setUp(self):
+        settings = Settings(cluster_quota_reservation_seconds=60)
+        self.store = BeibootStore(settings=settings)
+        self.store.replace(items=[group_beiboot_object("a", user="john")], resource_version="1")
+        self.store._synced.set()
+        self.tracker = QuotaTracker(settings=settings, store=self.store)
+
+    def test_reserve(self):
+        self.tracker.reserve(user="john", group="free", user_limit=2, group_limit=None)
+        self.assertEqual(self.tracker.usage("user", "john"), 2)
+
+        with self.assertRaises(ClusterLimitException) as e:
+            self.tracker.reserve(user="john", group="free", user_limit=2, group_limit=None)
+        self.assertEqual(e.exception.message, "User cluster limit reached.")
+
+        with self.assertRaises(ClusterLimitException) as e:
+            self.tracker.reserve(user="jane", group="free", user_limit=2, group_limit=2)
+        self.assertEqual(e.exception.message, "Group cluster limit reached.")
+
+        self.assertEqual(self.tracker.stats()["rejected"], 2)
+
+    def test_check(self):
+        self.tracker.check(user="john", group="free", user_limit=2, group_limit=None)
+        self.tracker.check(user="john", group="free", user_limit=2, group_limit=None)
+        self.assertEqual(self.tracker.usage("user", "john"), 1)
+
+        with self.assertRaises(ClusterLimitException):
+            self.tracker.check(user="john", group="free", user_limit=1, group_limit=None)
+        self.assertEqual(self.tracker.stats()["rejected"], 0)
+
+    def test_release(self):
+        reservation = self.tracker.reserve(user="john", group="free", user_limit=2, group_limit=None)
+        self.tracker.release(reservation)
+        self.tracker.release(reservation)
+
+        self.assertEqual(self.tracker.usage("user", "john"), 1)
+        self.assertEqual(self.tracker.usage("group", "free"), 1)
+
+    def test_commit(self):
+        reservation = self.tracker.reserve(user="john", group="free", user_limit=None, group_limit=None)
+        self.tracker.commit(reservation, name="b")
+        self.tracker.release(reservation)
+        self.assertEqual(self.tracker.usage("user", "john"), 2)
+
+        # created cluster in the store: counted once
+        self.store.apply(event_type="ADDED", item=group_beiboot_object("b", user="john", resource_version="2"))
+        self.tracker.reserve(user="jane", group="free", user_limit=None, group_limit=None)
+        self.assertEqual(self.tracker.usage("user", "john"), 2)
+        self.assertEqual(self.tracker.stats()["reservations"], 1)
+
+    def test_expire(self):
+        reservation = self.tracker.reserve(user="john", group="free", user_limit=2, group_limit=None)
+        reservation.expires = 0
+
+        self.tracker.reserve(user="john", group="free", user_limit=2, group_limit=None)
+        self.assertEqual(self.tracker.stats()["expired"], 1)
+
+    def test_counts(self):
+        with self.assertRaises(ClusterLimitException):
+            self.tracker.reserve(user="john", group="free", user_limit=3, group_limit=None, counts={"user": 3})
+
+    def test_reserve_count(self):
+        with self.assertRaises(ClusterLimitException):
+            self.tracker.reserve(user="john", group="free", user_limit=3, group_limit=None, count=3)
+
+        reservation = self.tracker.reserve(user="john", group="free", user_limit=3, group_limit=None, count=2)
+        self.assertEqual(self.tracker.usage("user", "john"), 3)
+
+        # one of two creates failed
+        self.tracker.commit(reservation, name="b")
+        self.tracker.release(reservation)
+        self.assertEqual(self.tracker.usage("user", "john"), 2)
@@ -0,0 +1,74 @@
+from unittest import IsolatedAsyncioTestCase
+
+from cluster.registry import ConnectionRegistry
+from exceptions import ConnectionLimitException
+from settings import Settings
+
+
+class FakeWebSocket:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.messages = []
+        self.closed = None
+
+    async def send_json(self, data):
+        if self.fail:
+            raise RuntimeError("closed")
+        self.messages.append(data)
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        self.closed = code
+
+
+class ConnectionRegistryTest(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.registry = ConnectionRegistry(settings=Settings(websocket_user_connection_limit=2))
+
+    def test_connect(self):
+        c1 = self.registry.connect(websocket=FakeWebSocket(), cluster_id="c1", user="john")
+        self.registry.connect(websocket=FakeWebSocket(), cluster_id="c1", user="jane")
+        self.registry.connect(websocket=FakeWebSocket(), cluster_id="c2", user="john")
+        self.assertEqual(
+            (self.registry.count(), self.registry.count(cluster_id="c1"), self.registry.count(user="john")), (3, 2, 2)
+        )
+
+        # per-user limit
+        with self.assertRaises(ConnectionLimitException):
+            self.registry.connect(websocket=FakeWebSocket(), cluster_id="c3", user="john")
+        self.assertEqual(self.registry.count(), 3)
+
+        self.registry.disconnect(c1)
+        self.registry.disconnect(c1)
+        self.assertEqual((self.registry.count(), self.registry.count(cluster_id="c1")), (2, 1))
+        self.registry.connect(websocket=FakeWebSocket(), cluster_id="c3", user="john")
+
+    def test_connect_anonymous(self):
+        # without a user there is no per-user limit
+        connections = [self.registry.connect(websocket=FakeWebSocket(), cluster_id="c1", user=None) for _ in range(3)]
+        self.assertEqual((self.registry.count(), self.registry.user_counts()), (3, {}))
+
+        for connection in connections:
+            self.registry.disconnect(connection)
+        self.assertEqual(self.registry.stats()["connections"], 0)
+
+    async def test_broadcast(self):
+        ok, failing, other = FakeWebSocket(), FakeWebSocket(fail=True), FakeWebSocket()
+        self.registry.connect(websocket=ok, cluster_id="c1", user="john")
+        self.registry.connect(websocket=failing, cluster_id="c1", user="jane")
+        self.registry.connect(websocket=other, cluster_id="c2", user="john")
+
+        sent = await self.registry.broadcast("c1", message={"event": "terminating"})
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(ok.messages, [{"event": "terminating"}])
+        self.assertEqual(other.messages, [])
+        # failed connections are disconnected
+        self.assertEqual(self.registry.count(cluster_id="c1"), 1)
+
+    async def test_close(self):
+        websocket = FakeWebSocket()
+        self.registry.connect(websocket=websocket, cluster_id="c1", user="john")
+
+        self.assertEqual(await self.registry.close("c1", code=4001), 1)
+        self.assertEqual(websocket.closed, 4001)
+        self.assertEqual(self.registry.stats()["connections"], 0)
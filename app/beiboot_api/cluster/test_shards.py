@@ -0,0 +1,218 @@
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from cluster.heartbeat import HeartbeatAggregator
+from cluster.registry import ConnectionRegistry
+from cluster.shards import (
+    ConfigMapReplicaBackend,
+    FileReplicaBackend,
+    HashRing,
+    MemoryReplicaBackend,
+    ReplicaBackend,
+    ReplicaSet,
+    ReplicaState,
+)
+from cluster.store import BeibootStore, StoredBeiboot
+from cluster.test_heartbeat import FakeBackend
+from cluster.test_store import beiboot_object
+from exceptions import ConnectionLimitException
+from kubernetes.client import V1ConfigMap, V1ObjectMeta
+from kubernetes.client.rest import ApiException
+from settings import Settings
+from test_backend import FakeKubernetesBackend
+
+CLUSTERS = [f"cluster-{i}" for i in range(1000)]
+
+
+def replica_set(name: str, backend, **kwargs) -> ReplicaSet:
+    return ReplicaSet(settings=Settings(pod_name=name, sharding_enabled=True, **kwargs), backend=backend)
+
+
+class FakeConfigMapBackend(FakeKubernetesBackend):
+    def __init__(self):
+        self.config_maps = {}
+
+    async def list_config_maps(self, namespace, labels):
+        return [
+            V1ConfigMap(metadata=V1ObjectMeta(name=name, labels=config_map_labels), data=data)
+            for (config_map_namespace, name), (config_map_labels, data) in self.config_maps.items()
+            if config_map_namespace == namespace and labels.items() <= config_map_labels.items()
+        ]
+
+    async def apply_config_map(self, name, namespace, labels, data):
+        self.config_maps[(namespace, name)] = (labels, data)
+
+    async def delete_config_map(self, name, namespace):
+        if self.config_maps.pop((namespace, name), None) is None:
+            raise ApiException(status=404, reason="Not Found")
+
+
+class HashRingTest(TestCase):
+    def test_owner(self):
+        self.assertIsNone(HashRing([]).owner("c1"))
+        self.assertEqual(HashRing(["api-0"]).owner("c1"), "api-0")
+
+        ring = HashRing(["api-0", "api-1", "api-2"])
+        owners = Counter(ring.owner(cluster_id) for cluster_id in CLUSTERS)
+        self.assertEqual(set(owners), {"api-0", "api-1", "api-2"})
+        # roughly balanced
+        self.assertTrue(all(count > 200 for count in owners.values()), owners)
+
+    def test_rebalance(self):
+        before = HashRing(["api-0", "api-1", "api-2"])
+        after = HashRing(["api-0", "api-1", "api-2", "api-3"])
+
+        # only clusters of the new replica move
+        moved = [cluster_id for cluster_id in CLUSTERS if before.owner(cluster_id) != after.owner(cluster_id)]
+        self.assertTrue(all(after.owner(cluster_id) == "api-3" for cluster_id in moved))
+        self.assertLess(len(moved), len(CLUSTERS) / 2)
+
+
+class ReplicaBackendTest(IsolatedAsyncioTestCase):
+    def test_abstract(self):
+        class IncompleteBackend(ReplicaBackend):
+            async def publish(self, state):
+                pass
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend()
+
+    async def test_memory(self):
+        await self._test_backend(MemoryReplicaBackend())
+
+    async def test_file(self):
+        with tempfile.TemporaryDirectory() as path:
+            await self._test_backend(FileReplicaBackend(path=f"{path}/replicas"))
+
+    async def test_config_map(self):
+        kubernetes = FakeConfigMapBackend()
+        await self._test_backend(ConfigMapReplicaBackend(namespace="getdeck", backend=kubernetes))
+        self.assertEqual(list(kubernetes.config_maps), [("getdeck", "api-replica-api-0")])
+
+        # other ConfigMaps and unreadable states are skipped
+        await kubernetes.apply_config_map(name="api-config-default", namespace="getdeck", labels={}, data={})
+        await kubernetes.apply_config_map(
+            name="api-replica-x", namespace="getdeck", labels={"app": "api-replica"}, data={}
+        )
+        backend = ConfigMapReplicaBackend(namespace="getdeck", backend=kubernetes)
+        self.assertEqual([state.name for state in await backend.states()], ["api-0"])
+
+    async def _test_backend(self, backend):
+        self.assertEqual(await backend.remove("api-0"), None)
+
+        await backend.publish(ReplicaState(name="api-0", updated=1.0, connections={"c1": 2}))
+        await backend.publish(ReplicaState(name="api-1", updated=1.0))
+        await backend.publish(ReplicaState(name="api-0", updated=2.0, connections={"c1": 1}, users={"john": 1}))
+        states = {state.name: state for state in await backend.states()}
+        self.assertEqual(set(states), {"api-0", "api-1"})
+        self.assertEqual(
+            states["api-0"], ReplicaState(name="api-0", updated=2.0, connections={"c1": 1}, users={"john": 1})
+        )
+
+        await backend.remove("api-1")
+        self.assertEqual([state.name for state in await backend.states()], ["api-0"])
+
+
+class ReplicaSetTest(IsolatedAsyncioTestCase):
+    async def test_disabled(self):
+        replicas = ReplicaSet(settings=Settings(pod_name="api-0"), backend=MemoryReplicaBackend())
+        self.assertTrue(all(replicas.owns(cluster_id) for cluster_id in CLUSTERS))
+
+    async def test_sync(self):
+        backend = MemoryReplicaBackend()
+        api0, api1 = replica_set("api-0", backend), replica_set("api-1", backend)
+        await api0.sync(connections={}, users={})
+        await api1.sync(connections={"c1": 2}, users={"john": 2})
+        await api0.sync(connections={"c2": 1}, users={"john": 1})
+
+        self.assertEqual(api0.stats()["replicas"], ["api-0", "api-1"])
+        self.assertEqual(
+            (api0.connections(), api0.connections(cluster_id="c1"), api0.connections(user="john")), (2, 2, 2)
+        )
+        # every cluster has exactly one owner
+        for cluster_id in CLUSTERS:
+            self.assertNotEqual(api0.owns(cluster_id), api1.owns(cluster_id))
+
+    async def test_sync_expired(self):
+        backend = MemoryReplicaBackend()
+        await backend.publish(ReplicaState(name="api-1", updated=0.0, connections={"c1": 1}))
+
+        api0 = replica_set("api-0", backend)
+        await api0.sync(connections={}, users={})
+        self.assertEqual(api0.stats()["replicas"], ["api-0"])
+        self.assertEqual(api0.connections(), 0)
+
+    async def test_handover(self):
+        backend = MemoryReplicaBackend()
+        api0, api1 = replica_set("api-0", backend), replica_set("api-1", backend)
+        await api0.sync(connections={}, users={})
+        await api1.sync(connections={}, users={})
+        await api0.sync(connections={}, users={})
+        cluster_id = next(cluster_id for cluster_id in CLUSTERS if api1.owns(cluster_id))
+
+        now = datetime.utcnow()
+        api0.forward(cluster_id, {"john": now - timedelta(seconds=1)})
+        api0.forward(cluster_id, {"john": now, "jane": now - timedelta(seconds=1)})
+        await api0.sync(connections={}, users={})
+
+        self.assertEqual(
+            await api1.sync(connections={}, users={}), {cluster_id: {"john": now, "jane": now - timedelta(seconds=1)}}
+        )
+        # handed over once
+        self.assertEqual(await api1.sync(connections={}, users={}), {})
+        # the owner does not pick up its own clusters
+        self.assertEqual(await api0.sync(connections={}, users={}), {})
+
+
+class ShardedHeartbeatTest(IsolatedAsyncioTestCase):
+    async def test_flush(self):
+        backend = MemoryReplicaBackend()
+        store = BeibootStore(settings=Settings())
+        store.replace([beiboot_object(cluster_id) for cluster_id in CLUSTERS[:20]], "1")
+
+        aggregators = {}
+        for name in ["api-0", "api-1", "api-2"]:
+            replicas = replica_set(name, backend)
+            await replicas.sync(connections={}, users={})
+            aggregators[name] = HeartbeatAggregator(settings=replicas.settings, replicas=replicas, store=store)
+        for aggregator in aggregators.values():
+            await aggregator.replicas.sync(connections={}, users={})
+
+        # all clients send heartbeats for all clusters to all replicas
+        now = datetime.utcnow()
+        for aggregator in aggregators.values():
+            for cluster_id in CLUSTERS[:20]:
+                aggregator.add(client_id="john", beiboot=StoredBeiboot(beiboot_object(cluster_id)), timestamp=now)
+
+        writes = {}
+        for _ in range(2):
+            for name, aggregator in aggregators.items():
+                writes.setdefault(name, FakeBackend())
+                await aggregator.flush(backend=writes[name])
+
+        # one write per cluster, by its owner
+        written = [cluster_id for name in aggregators for cluster_id, _ in writes[name].writes]
+        self.assertEqual(sorted(written), sorted(CLUSTERS[:20]))
+        for name, aggregator in aggregators.items():
+            self.assertTrue(all(aggregator.replicas.owns(cluster_id) for cluster_id, _ in writes[name].writes))
+        # heartbeats handed over by other replicas are not counted as received again
+        self.assertEqual([aggregator.received for aggregator in aggregators.values()], [20, 20, 20])
+        self.assertEqual(sum(aggregator.handed_over for aggregator in aggregators.values()), 20)
+
+
+class ShardedConnectionLimitTest(IsolatedAsyncioTestCase):
+    async def test_limit(self):
+        backend = MemoryReplicaBackend()
+        api0 = replica_set("api-0", backend, websocket_user_connection_limit=2)
+        api1 = replica_set("api-1", backend, websocket_user_connection_limit=2)
+        await api1.sync(connections={"c1": 1}, users={"john": 1})
+        await api0.sync(connections={}, users={})
+        registry = ConnectionRegistry(settings=api0.settings, replicas=api0)
+
+        # one connection of the user on this replica, one on the other replica
+        registry.connect(websocket=object(), cluster_id="c1", user="john")
+        with self.assertRaises(ConnectionLimitException):
+            registry.connect(websocket=object(), cluster_id="c1", user="john")
+        registry.connect(websocket=object(), cluster_id="c1", user="jane")
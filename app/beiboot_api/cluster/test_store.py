@@ -0,0 +1,107 @@
+from unittest import TestCase
+
+from beiboot.types import BeibootState
+from cluster.store import BeibootStore
+from settings import Settings, get_settings
+
+
+def beiboot_object(name: str, user: str = "john", state: str = "READY", resource_version: str = "1") -> dict:
+    return {
+        "metadata": {
+            "name": name,
+            "uid": f"uid-{name}",
+            "namespace": "getdeck",
+            "labels": {"name": name, "user": user},
+            "resourceVersion": resource_version,
+        },
+        "provider": "k3s",
+        "beibootNamespace": f"getdeck-bbt-{name}",
+        "state": state,
+        "parameters": {
+            "nodes": 1,
+            "maxLifetime": "1h",
+            "maxSessionTimeout": "5m",
+            "serverResources": {},
+            "nodeResources": {},
+            "gefyra": {"enabled": True},
+            "tunnel": {"enabled": True},
+        },
+    }
+
+
+class BeibootStoreTest(TestCase):
+    def setUp(self):
+        self.store = BeibootStore(settings=get_settings())
+        self.store.replace(
+            items=[beiboot_object("a", user="john"), beiboot_object("b", user="jane")],
+            resource_version="2",
+        )
+
+    def test_list(self):
+        self.assertEqual(len(self.store.list()), 2)
+        self.assertEqual([bbt.name for bbt in self.store.list(labels={"user": "jane"})], ["b"])
+
+    def test_get(self):
+        self.assertEqual(self.store.get(name="a").name, "a")
+        self.assertIsNone(self.store.get(name="a", labels={"user": "jane"}))
+        self.assertIsNone(self.store.get(name="unknown"))
+
+    def test_apply(self):
+        self.store.apply(event_type="ADDED", item=beiboot_object("c", resource_version="3"))
+        self.store.apply(event_type="MODIFIED", item=beiboot_object("a", state="TERMINATING", resource_version="4"))
+        self.store.apply(event_type="DELETED", item=beiboot_object("b", resource_version="5"))
+
+        self.assertEqual(sorted(bbt.name for bbt in self.store.list()), ["a", "c"])
+        self.assertEqual(self.store.get(name="a").state, BeibootState.TERMINATING)
+        self.assertEqual(self.store.resource_version, "5")
+
+    def test_apply_bookmark(self):
+        self.store.apply(event_type="BOOKMARK", item={"metadata": {"resourceVersion": "10"}})
+        self.assertEqual(self.store.resource_version, "10")
+        self.assertEqual(len(self.store.list()), 2)
+
+    def test_apply_invalid(self):
+        self.store.apply(event_type="ADDED", item={"metadata": {"name": "invalid"}})
+        self.assertIsNone(self.store.get(name="invalid"))
+
+    def test_version(self):
+        version = self.store.version
+
+        self.store.replace(
+            items=[beiboot_object("a", user="john"), beiboot_object("b", user="jane")], resource_version="3"
+        )
+        self.assertEqual(self.store.version, version)
+
+        self.store.apply(event_type="BOOKMARK", item={"metadata": {"resourceVersion": "10"}})
+        self.assertEqual(self.store.version, version)
+
+        self.store.apply(event_type="MODIFIED", item=beiboot_object("a", resource_version="11"))
+        self.assertNotEqual(self.store.version, version)
+
+    def test_changes(self):
+        version = self.store.version
+
+        self.store.apply(event_type="MODIFIED", item=beiboot_object("a", state="TERMINATING", resource_version="3"))
+        self.store.apply(event_type="ADDED", item=beiboot_object("c", user="jane", resource_version="4"))
+        self.store.apply(event_type="DELETED", item=beiboot_object("b", user="jane", resource_version="5"))
+
+        changed, deleted = self.store.changes(since=version)
+        self.assertEqual([bbt.name for bbt in changed], ["a", "c"])
+        self.assertEqual([bbt.name for bbt in deleted], ["b"])
+
+        changed, deleted = self.store.changes(since=version, labels={"user": "john"})
+        self.assertEqual([bbt.name for bbt in changed], ["a"])
+        self.assertEqual(deleted, [])
+
+        self.assertEqual(self.store.changes(since=self.store.version), ([], []))
+
+    def test_changes_unknown(self):
+        self.assertIsNone(self.store.changes(since="other.1"))
+        self.assertIsNone(self.store.changes(since=f"{self.store._epoch}.999"))
+        self.assertIsNone(self.store.changes(since="invalid"))
+
+        store = BeibootStore(settings=Settings(cluster_store_changelog_size=1))
+        version = store.version
+        store.apply(event_type="ADDED", item=beiboot_object("a", resource_version="1"))
+        store.apply(event_type="ADDED", item=beiboot_object("b", resource_version="2"))
+        self.assertIsNone(store.changes(since=version))
@@ -3,18 +3,23 @@ import re
 from datetime import datetime
 from decimal import Decimal
 from enum import Enum
-from typing import List, Union
+from typing import Generic, List, TypeVar, Union
 
-from beiboot.types import BeibootState
+from beiboot.types import Beiboot, BeibootParameters, BeibootState
 from cluster.helpers import convert_to_timedelta
 from config.types import Config
+from fastapi_pagination import Page
 from kubernetes.utils.quantity import parse_quantity
-from pydantic import BaseModel, Field, PrivateAttr, validator
+from pydantic import BaseModel, Field, PrivateAttr, ValidationInfo, field_serializer, field_validator
 from semver import Version
 from settings import get_settings
 
 logger = logging.getLogger("uvicorn.beiboot")
 
+T = TypeVar("T")
+
+LABEL_PATTERN = re.compile(r"(([A-Za-z0-9][-A-Za-z0-9_.]*)?[A-Za-z0-9])?")
+
 
 class ClusterParameter(Enum):
     K8S_VERSION = "K8S_VERSION"
@@ -41,7 +46,7 @@ class ClusterParameter(Enum):
 
 class Parameter(BaseModel):
     name: ClusterParameter
-    value: Union[str, int, List[str], List[int]] | None
+    value: Union[str, int, List[str], List[int]] | None = None
 
 
 class ComputeParameter(Parameter):
@@ -51,61 +56,65 @@ class ComputeParameter(Parameter):
     #     super().__init__(**data)
     #     self._value_verbose = data.get("value", None)
 
-    @validator("value", pre=True)
-    def value_validator(cls, v, values, field):
-        if not v:
+    @field_validator("value", mode="before")
+    @classmethod
+    def value_validator(cls, v, info: ValidationInfo):
+        if not v or isinstance(v, Decimal):
             return v
 
         if v.endswith(("Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "k", "K", "M", "G", "T", "P", "E")):
-            raise ValueError(f"Invalid {field.name}: '{v}'.")
+            raise ValueError(f"Invalid {info.field_name}: '{v}'.")
 
         try:
             v = parse_quantity(v)
         except ValueError:
-            raise ValueError(f"Invalid {field.name}: '{v}'.")
+            raise ValueError(f"Invalid {info.field_name}: '{v}'.")
 
         return v
 
 
 class MemoryParameter(Parameter):
-    @validator("value", pre=True)
-    def value_validator(cls, v, values, field):
-        if not v:
+    @field_validator("value", mode="before")
+    @classmethod
+    def value_validator(cls, v, info: ValidationInfo):
+        if not v or isinstance(v, Decimal):
             return v
 
         if not v.endswith(("Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "k", "K", "M", "G", "T", "P", "E")):
-            raise ValueError(f"Invalid {field.name}: '{v}'.")
+            raise ValueError(f"Invalid {info.field_name}: '{v}'.")
 
         try:
             v = parse_quantity(v)
         except ValueError:
-            raise ValueError(f"Invalid {field.name}: '{v}'.")
+            raise ValueError(f"Invalid {info.field_name}: '{v}'.")
 
         return v
 
 
 class K8sVersion(Parameter):
     name: ClusterParameter = ClusterParameter.K8S_VERSION
-    value: str | None
+    value: str | None = None
 
-    @validator("value")
+    @field_validator("value")
+    @classmethod
     def value_validator(cls, v):
         if not v:
             return v
 
         try:
             _ = Version.parse(v)
-        except (TypeError, ValueError) as e:
-            raise type(e)(f"Invalid {ClusterParameter.K8S_VERSION.value}.")
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {ClusterParameter.K8S_VERSION.value}.")
 
         return v
 
 
 class Ports(Parameter):
     name: ClusterParameter = ClusterParameter.PORTS
-    value: List[str] | None
+    value: List[str] | None = None
 
-    @validator("value")
+    @field_validator("value")
+    @classmethod
     def value_validator(cls, v):
         if not v:
             return v
@@ -131,18 +140,19 @@ class Ports(Parameter):
 
 class NodeCount(Parameter):
     name: ClusterParameter = ClusterParameter.NODE_COUNT
-    value: int | None
+    value: int | None = None
 
 
 class Lifetime(Parameter):
     name: ClusterParameter = ClusterParameter.LIFETIME
-    value: str | None
+    value: str | None = None
 
-    @validator("value", pre=True)
+    @field_validator("value", mode="before")
+    @classmethod
     def value_validator(cls, v):
         try:
             _ = convert_to_timedelta(v)
-        except ValueError:
+        except (TypeError, ValueError):
             raise ValueError(f"Invalid {ClusterParameter.LIFETIME.value}: '{v}'.")
 
         return v
@@ -150,13 +160,14 @@ class Lifetime(Parameter):
 
 class SessionTimeout(Parameter):
     name: ClusterParameter = ClusterParameter.SESSION_TIMEOUT
-    value: str | None
+    value: str | None = None
 
-    @validator("value", pre=True)
+    @field_validator("value", mode="before")
+    @classmethod
     def value_validator(cls, v):
         try:
             _ = convert_to_timedelta(v)
-        except ValueError:
+        except (TypeError, ValueError):
             raise ValueError(f"Invalid {ClusterParameter.SESSION_TIMEOUT.value}: '{v}'.")
 
         return v
@@ -164,9 +175,10 @@ class SessionTimeout(Parameter):
 
 class ClusterReadyTimeout(Parameter):
     name: ClusterParameter = ClusterParameter.CLUSTER_READY_TIMEOUT
-    value: int | None
+    value: int | None = None
 
-    @validator("value")
+    @field_validator("value")
+    @classmethod
     def value_validator(cls, v):
         if not v:
             return v
@@ -179,76 +191,76 @@ class ClusterReadyTimeout(Parameter):
 
 class ServerResourcesRequestsCpu(ComputeParameter):
     name: ClusterParameter = ClusterParameter.SERVER_RESOURCES_REQUESTS_CPU
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class ServerResourcesRequestsMemory(MemoryParameter):
     name: ClusterParameter = ClusterParameter.SERVER_RESOURCES_REQUESTS_MEMORY
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class ServerResourcesLimitsCpu(ComputeParameter):
     name: ClusterParameter = ClusterParameter.SERVER_RESOURCES_LIMITS_CPU
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class ServerResourcesLimitsMemory(MemoryParameter):
     name: ClusterParameter = ClusterParameter.SERVER_RESOURCES_LIMITS_MEMORY
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class ServerStorageRequests(MemoryParameter):
     name: ClusterParameter = ClusterParameter.SERVER_STORAGE_REQUESTS
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class NodeResourcesRequestsCpu(ComputeParameter):
     name: ClusterParameter = ClusterParameter.NODE_RESOURCES_REQUESTS_CPU
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class NodeResourcesRequestsMemory(MemoryParameter):
     name: ClusterParameter = ClusterParameter.NODE_RESOURCES_REQUESTS_MEMORY
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class NodeResourcesLimitsCpu(ComputeParameter):
     name: ClusterParameter = ClusterParameter.NODE_RESOURCES_LIMITS_CPU
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class NodeResourcesLimitsMemory(MemoryParameter):
     name: ClusterParameter = ClusterParameter.NODE_RESOURCES_LIMITS_MEMORY
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class NodeStorageRequests(MemoryParameter):
     name: ClusterParameter = ClusterParameter.NODE_STORAGE_REQUESTS
-    value: Decimal | None
+    value: Decimal | None = None
 
 
 class GefyraEnabled(Parameter):
     name: ClusterParameter = ClusterParameter.GEFYRA_ENABLED
-    value: bool | None
+    value: bool | None = None
 
 
 class GefyraEndpoint(Parameter):
     name: ClusterParameter = ClusterParameter.GEFYRA_ENDPOINT
-    value: str | None
+    value: str | None = None
 
 
 class TunnelEnabled(Parameter):
     name: ClusterParameter = ClusterParameter.TUNNEL_ENABLED
-    value: bool | None
+    value: bool | None = None
 
 
 class TunnelEndpoint(Parameter):
     name: ClusterParameter = ClusterParameter.TUNNEL_ENDPOINT
-    value: str | None
+    value: str | None = None
 
 
 class Parameters(BaseModel):
-    cluster_config: Config = None
+    cluster_config: Config | None = Field(default=None, validate_default=True)
 
     k8s_version: K8sVersion | None = Field(
         default=K8sVersion(value=None),
@@ -259,15 +271,19 @@ class Parameters(BaseModel):
         alias=ClusterParameter.PORTS.value,
     )
     node_count: NodeCount | None = Field(
+        default=None,
         alias=ClusterParameter.NODE_COUNT.value,
+        validate_default=True,
     )
     lifetime: Lifetime | None = Field(
         default=Lifetime(value="1h"),
         alias=ClusterParameter.LIFETIME.value,
+        validate_default=True,
     )
     session_timeout: SessionTimeout | None = Field(
         default=SessionTimeout(value="5m"),
         alias=ClusterParameter.SESSION_TIMEOUT.value,
+        validate_default=True,
     )
     cluster_ready_timeout: ClusterReadyTimeout | None = Field(
         default=ClusterReadyTimeout(value=180),
@@ -278,22 +294,27 @@ class Parameters(BaseModel):
     server_resources_requests_cpu: ServerResourcesRequestsCpu | None = Field(
         default=ServerResourcesRequestsCpu(value=None),
         alias=ClusterParameter.SERVER_RESOURCES_REQUESTS_CPU.value,
+        validate_default=True,
     )
     server_resources_requests_memory: ServerResourcesRequestsMemory | None = Field(
         default=ServerResourcesRequestsMemory(value=None),
         alias=ClusterParameter.SERVER_RESOURCES_REQUESTS_MEMORY.value,
+        validate_default=True,
     )
     server_resources_limits_cpu: ServerResourcesLimitsCpu | None = Field(
         default=ServerResourcesLimitsCpu(value=None),
         alias=ClusterParameter.SERVER_RESOURCES_LIMITS_CPU.value,
+        validate_default=True,
     )
     server_resources_limits_memory: ServerResourcesLimitsMemory | None = Field(
         default=ServerResourcesLimitsMemory(value=None),
         alias=ClusterParameter.SERVER_RESOURCES_LIMITS_MEMORY.value,
+        validate_default=True,
     )
     server_storage_requests: ServerStorageRequests | None = Field(
         default=ServerStorageRequests(value=None),
         alias=ClusterParameter.SERVER_STORAGE_REQUESTS.value,
+        validate_default=True,
     )
 
     # node resources + storage
@@ -338,19 +359,21 @@ class Parameters(BaseModel):
         alias=ClusterParameter.TUNNEL_ENDPOINT.value,
     )
 
-    @validator("cluster_config", pre=True, always=True)
+    @field_validator("cluster_config", mode="before")
+    @classmethod
     def cluster_config_validator(cls, v):
         if isinstance(v, Config):
             return v
 
         # default cluster config
         settings = get_settings()
-        cluster_config = Config(**settings.dict())
+        cluster_config = Config(**settings.model_dump())
         return cluster_config
 
-    @validator("k8s_version")
-    def k8s_version_validator(cls, v, *, values, **kwargs):
-        cluster_config = values["cluster_config"]
+    @field_validator("k8s_version")
+    @classmethod
+    def k8s_version_validator(cls, v, info: ValidationInfo):
+        cluster_config = info.data["cluster_config"]
 
         if not cluster_config.k8s_versions:
             return v
@@ -360,9 +383,10 @@ class Parameters(BaseModel):
 
         return v
 
-    @validator("node_count", always=True)
-    def node_count_validator(cls, v, *, values, **kwargs):
-        cluster_config = values["cluster_config"]
+    @field_validator("node_count")
+    @classmethod
+    def node_count_validator(cls, v, info: ValidationInfo):
+        cluster_config = info.data["cluster_config"]
 
         if not v:
             return NodeCount(value=cluster_config.node_count_min)
@@ -372,9 +396,10 @@ class Parameters(BaseModel):
 
         return v
 
-    @validator("lifetime", always=True)
-    def lifetime_validator(cls, v, *, values, **kwargs):
-        cluster_config = values["cluster_config"]
+    @field_validator("lifetime")
+    @classmethod
+    def lifetime_validator(cls, v, info: ValidationInfo):
+        cluster_config = info.data["cluster_config"]
 
         if not cluster_config.lifetime_limit >= convert_to_timedelta(v.value):
             raise ValueError(
@@ -383,9 +408,10 @@ class Parameters(BaseModel):
 
         return v
 
-    @validator("session_timeout", always=True)
-    def session_timeout_validator(cls, v, *, values, **kwargs):
-        cluster_config = values["cluster_config"]
+    @field_validator("session_timeout")
+    @classmethod
+    def session_timeout_validator(cls, v, info: ValidationInfo):
+        cluster_config = info.data["cluster_config"]
 
         if not cluster_config.session_timeout_limit >= convert_to_timedelta(v.value):
             raise ValueError(
@@ -405,21 +431,21 @@ class Parameters(BaseModel):
 
     #     return v
 
-    @validator(
+    @field_validator(
         "server_resources_requests_cpu",
         "server_resources_requests_memory",
         "server_resources_limits_cpu",
         "server_resources_limits_memory",
         "server_storage_requests",
-        always=True,
     )
-    def min_max_decimal_validator(cls, v, *, values, field):
-        cluster_config = values["cluster_config"]
+    @classmethod
+    def min_max_decimal_validator(cls, v, info: ValidationInfo):
+        cluster_config = info.data["cluster_config"]
 
         try:
-            minimum = getattr(cluster_config, field.name + "_min")
-            maximum = getattr(cluster_config, field.name + "_max")
-            _class = type(Parameters.__fields__[field.name].default)
+            minimum = getattr(cluster_config, info.field_name + "_min")
+            maximum = getattr(cluster_config, info.field_name + "_max")
+            _class = type(cls.model_fields[info.field_name].default)
         except Exception as e:
             raise Exception(f"Validation error: {str(e)}")
 
@@ -428,7 +454,7 @@ class Parameters(BaseModel):
 
         if not (minimum or v.value) <= v.value <= (maximum or v.value):
             try:
-                field_name = Parameters.__fields__[field.name].default.name.value
+                field_name = cls.model_fields[info.field_name].default.name.value
             except Exception:
                 field_name = "???"
 
@@ -438,48 +464,197 @@ class Parameters(BaseModel):
 
         return v
 
+    def to_beiboot_parameters(self) -> BeibootParameters:  # noqa: C901
+        ports = [str(port) for port in self.ports.value]
+
+        serverResources = {}
+        if self.server_resources_requests_cpu.value or self.server_resources_requests_memory.value:
+            serverResources["requests"] = {}
+            if self.server_resources_requests_cpu.value:
+                serverResources["requests"]["cpu"] = self.server_resources_requests_cpu.value
+            if self.server_resources_requests_memory.value:
+                serverResources["requests"]["memory"] = self.server_resources_requests_memory.value
+
+        if self.server_resources_limits_cpu.value or self.server_resources_limits_memory.value:
+            serverResources["limits"] = {}
+            if self.server_resources_limits_cpu.value:
+                serverResources["limits"]["cpu"] = self.server_resources_limits_cpu.value
+            if self.server_resources_limits_memory.value:
+                serverResources["limits"]["memory"] = self.server_resources_limits_memory.value
+
+        nodeResources = {}
+        if self.node_resources_requests_cpu.value or self.node_resources_requests_memory.value:
+            nodeResources["requests"] = {}
+            if self.node_resources_requests_cpu.value:
+                nodeResources["requests"]["cpu"] = self.node_resources_requests_cpu.value
+            if self.node_resources_requests_memory.value:
+                nodeResources["requests"]["memory"] = self.node_resources_requests_memory.value
+
+        if self.node_resources_limits_cpu.value or self.node_resources_limits_memory.value:
+            nodeResources["limits"] = {}
+            if self.node_resources_limits_cpu.value:
+                nodeResources["limits"]["cpu"] = self.node_resources_limits_cpu.value
+            if self.node_resources_limits_memory.value:
+                nodeResources["limits"]["memory"] = self.node_resources_limits_memory.value
+
+        return BeibootParameters(
+            k8sVersion=self.k8s_version.value,
+            ports=ports,
+            nodes=self.node_count.value,
+            maxLifetime=self.lifetime.value,
+            maxSessionTimeout=self.session_timeout.value,
+            clusterReadyTimeout=self.cluster_ready_timeout.value,
+            serverResources=serverResources,
+            nodeResources=nodeResources,
+            serverStorageRequests=self.server_storage_requests.value,
+            nodeStorageRequests=self.node_storage_requests.value,
+            gefyra={
+                "enabled": self.gefyra_enabled.value,
+                "endpoint": self.gefyra_endpoint.value,
+            },
+            tunnel={
+                "enabled": self.tunnel_enabled.value,
+                "endpoint": self.tunnel_endpoint.value,
+            },
+        )
+
 
 class Labels(BaseModel):
-    name: str | None
-    user: str | None
+    name: str | None = None
+    user: str | None = None
+    group: str | None = None
 
-    @validator("name", "user", always=True)
-    def label_validator(cls, v, *, values, **kwargs):
+    @field_validator("name", "user", "group")
+    @classmethod
+    def label_validator(cls, v):
         if not v:
             return v
 
-        pattern = re.compile(r"(([A-Za-z0-9][-A-Za-z0-9_.]*)?[A-Za-z0-9])?")
-        if not re.fullmatch(pattern, v):
-            raise ValueError(f"Invalid value: '{v}' (regex used for validation is '{pattern.pattern}').")
+        if not LABEL_PATTERN.fullmatch(v):
+            raise ValueError(f"Invalid value: '{v}' (regex used for validation is '{LABEL_PATTERN.pattern}').")
 
         return v
 
 
 class ClusterRequest(BaseModel):
     name: str
-    group: str | None
-    parameters: List[Parameter] | None
-    labels: Labels | None
+    group: str | None = None
+    parameters: List[Parameter] | None = None
+    labels: Labels | None = None
 
 
 class ClusterStateResponse(BaseModel):
     id: str
-    name: str | None
-    state: BeibootState | None
-    sunset: datetime | None
-    max_lifetime: Lifetime | None
-    max_session_timeout: SessionTimeout | None
+    name: str | None = None
+    state: BeibootState | None = None
+    sunset: datetime | None = None
+    max_lifetime: Lifetime | None = None
+    max_session_timeout: SessionTimeout | None = None
+
+    @classmethod
+    def from_beiboot(cls, beiboot: Beiboot) -> "ClusterStateResponse":
+        if beiboot.sunset:
+            sunset = datetime.strptime(beiboot.sunset, "%Y-%m-%dT%H:%M:%S.%fZ")
+        else:
+            sunset = None
+        if beiboot.parameters.maxLifetime:
+            lifetime = Lifetime(value=beiboot.parameters.maxLifetime)
+        else:
+            lifetime = None
+        if beiboot.parameters.maxSessionTimeout:
+            timeout = SessionTimeout(value=beiboot.parameters.maxSessionTimeout)
+        else:
+            timeout = None
+
+        return cls(
+            id=beiboot.name,
+            name=beiboot.labels.get("name"),
+            state=beiboot.state,
+            sunset=sunset,
+            max_lifetime=lifetime,
+            max_session_timeout=timeout,
+        )
+
+
+class ClusterPage(Page[T], Generic[T]):
+    next_cursor: str | None = None
+    version: str | None = None
+
+
+class ClusterDelta(BaseModel):
+    # changes since a given version, all clusters if 'reset' is set (version unknown or too old)
+    version: str | None = None
+    reset: bool = False
+    items: List[ClusterStateResponse]
+    deleted: List[str]
+
+
+class ClusterValidationError(BaseModel):
+    parameter: ClusterParameter | None = None  # group + quota errors: None
+    msg: str
+    type: str
+
+
+class ClusterValidationResponse(BaseModel):
+    valid: bool
+    group: str | None = None
+    errors: List[ClusterValidationError] = []
+    parameters: List[Parameter] = []  # effective parameters, incl. defaults
+    defaults: List[ClusterParameter] = []  # parameters not given, set to their defaults
+
+
+class ClusterBatchRequest(BaseModel):
+    clusters: List[ClusterRequest]
+
+
+class ClusterBatchResult(BaseModel):
+    name: str
+    status_code: int
+    cluster: ClusterStateResponse | None = None
+    error: Union[str, List[dict]] | None = None
+
+
+class ClusterBatchResponse(BaseModel):
+    items: List[ClusterBatchResult]
+
+
+class ClusterBatchDeleteRequest(BaseModel):
+    ids: List[str]
+
+
+class ClusterDeleteResult(BaseModel):
+    id: str
+    status_code: int
+    error: str | None = None
+
+
+class ClusterBatchDeleteResponse(BaseModel):
+    items: List[ClusterDeleteResult]
+
+
+class ClusterHeartbeatRequest(BaseModel):
+    ids: List[str]
+
+
+class ClusterHeartbeatResult(BaseModel):
+    id: str
+    status_code: int
+    cluster: ClusterStateResponse | None = None
+    error: str | None = None
+
+
+class ClusterHeartbeatResponse(BaseModel):
+    items: List[ClusterHeartbeatResult]
 
 
 class ClusterInfoResponse(BaseModel):
     id: str
-    name: str | None
+    name: str | None = None
     namespace: str
-    state: BeibootState | None
-    sunset: datetime | None
-    parameters: List[Parameter] | None
-
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-        }
+    state: BeibootState | None = None
+    sunset: datetime | None = None
+    parameters: List[Parameter] | None = None
+
+    @field_serializer("sunset")
+    def sunset_serializer(self, v: datetime | None) -> str | None:
+        return v.strftime("%Y-%m-%dT%H:%M:%S.%fZ") if v else None
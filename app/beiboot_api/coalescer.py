@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from settings import get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads: the first caller (miss) starts the fetch, concurrent callers with the same
+    key join the in-flight fetch and share its result. Results are reused for 'window' seconds after the fetch
+    completed (hit).
+
+    Keys are (resource, label selector, namespace, name), see SingleFlight.key(...). Writes invalidate the reads of
+    their resource (see invalidate).
+    """
+
+    def __init__(self, window: float = 0):
+        self.window = window
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+
+        # metrics
+        self.hits = 0
+        self.joins = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(
+        resource: str, labels: Dict[str, str] | None = None, namespace: str | None = None, name: str | None = None
+    ) -> Tuple:
+        return resource, tuple(sorted((labels or {}).items())), namespace, name
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        if key in self._results:
+            expires, result = self._results[key]
+            if expires > time.monotonic():
+                self.hits += 1
+                return result
+            del self._results[key]
+
+        if key in self._calls:
+            self.joins += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(func())
+            task.add_done_callback(lambda t: self._done(key, t))
+            self._calls[key] = task
+
+        # a cancelled caller must not cancel the fetch of the other callers
+        return await asyncio.shield(self._calls[key])
+
+    def forget(self, key: Hashable) -> None:
+        self._results.pop(key, None)
+
+    def invalidate(self, resource: str) -> None:
+        """
+        Drops the results of a resource (all selectors), e.g. after a create or delete. Callers after this start a new
+        fetch instead of joining one that may have started before the write.
+        """
+        for index in [self._results, self._calls]:
+            for key in [key for key in index if isinstance(key, tuple) and key[0] == resource]:
+                del index[key]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "joins": self.joins,
+            "misses": self.misses,
+            "in_flight": len(self._calls),
+        }
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is not task:
+            # invalidated while in flight: the result may predate a write
+            return None
+        del self._calls[key]
+
+        if task.cancelled() or task.exception():
+            return None
+
+        if self.window:
+            now = time.monotonic()
+            if len(self._results) > 256:
+                self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            self._results[key] = (now + self.window, task.result())
+
+
+@lru_cache()
+def get_coalescer() -> SingleFlight:
+    return SingleFlight(window=get_settings().k8s_coalesce_window_seconds)
@@ -1,8 +1,8 @@
 import logging
-from typing import Annotated
+from typing import Annotated, Tuple
 
-import kubernetes as k8s
-import timeout_decorator
+from backend import KubernetesBackend, get_kubernetes_backend
+from coalescer import SingleFlight, get_coalescer
 from config.types import Config
 from fastapi import Depends
 from kubernetes.client.rest import ApiException
@@ -12,16 +12,40 @@ logger = logging.getLogger("uvicorn.beiboot")
 
 
 class ConfigService:
-    def __init__(self, settings: Annotated[Settings, Depends(get_settings)]):
+    def __init__(
+        self,
+        settings: Annotated[Settings, Depends(get_settings)],
+        backend: Annotated[KubernetesBackend, Depends(get_kubernetes_backend)] = None,
+        coalescer: Annotated[SingleFlight, Depends(get_coalescer)] = None,
+    ):
         self.settings = settings
+        self.backend = backend or get_kubernetes_backend()
+        self.coalescer = coalescer or get_coalescer()
 
-    @timeout_decorator.timeout(5, timeout_exception=Exception)
-    def get(
+    async def get(
         self,
         prefix: str | None = None,
         name: str | None = None,
         namespace: str | None = None,
     ) -> Config:
+        config, _ = await self.get_with_version(prefix=prefix, name=name, namespace=namespace)
+        return config
+
+    async def get_with_version(
+        self,
+        prefix: str | None = None,
+        name: str | None = None,
+        namespace: str | None = None,
+    ) -> Tuple[Config, str | None]:
+        cm = await self.get_config_map(prefix=prefix, name=name, namespace=namespace)
+        return self.from_config_map(cm), cm.metadata.resource_version
+
+    async def get_config_map(
+        self,
+        prefix: str | None = None,
+        name: str | None = None,
+        namespace: str | None = None,
+    ):
         if not prefix:
             prefix = self.settings.config_prefix
 
@@ -34,14 +58,17 @@ class ConfigService:
         config_map_name = f"{prefix}{name}"
 
         try:
-            client = k8s.client.CoreV1Api()
-            cm = client.read_namespaced_config_map(name=config_map_name, namespace=namespace)
+            return await self.coalescer.do(
+                key=SingleFlight.key(resource="configmaps", namespace=namespace, name=config_map_name),
+                func=lambda: self.backend.read_config_map(name=config_map_name, namespace=namespace, timeout=5),
+            )
         except ApiException as e:
             logger.error(e)
             raise ValueError(f"ConfigMap {name} not found in namespace {namespace}")
 
+    def from_config_map(self, cm) -> Config:
         cc = {}
-        for item in Config.__fields__:
+        for item in Config.model_fields:
             cc[item] = cm.data.get(item.upper(), getattr(self.settings, item, None))
 
         return Config(**cc)
@@ -5,107 +5,120 @@ from typing import List
 
 from cluster.helpers import convert_to_timedelta
 from kubernetes.utils.quantity import parse_quantity
-from pydantic import BaseModel, Field, validator
+from pydantic import AliasChoices, BaseModel, Field, ValidationInfo, field_validator
 from semver import Version
 
 logger = logging.getLogger("uvicorn.beiboot")
 
 
 class Config(BaseModel):
-    k8s_versions: List[str] | None = Field(default=None, env="cd_k8s_versions")
-    node_count_min: int | None = Field(default=1, env="cd_node_count_min")
-    node_count_max: int | None = Field(default=3, env="cd_node_count_max")
-    lifetime_limit: timedelta | None = Field(default=timedelta(hours=4), env="cd_lifetime_limit")
-    session_timeout_limit: timedelta | None = Field(default=timedelta(minutes=30), env="cd_session_timeout_limit")
+    k8s_versions: List[str] | None = Field(
+        default=None, validation_alias=AliasChoices("k8s_versions", "cd_k8s_versions")
+    )
+    node_count_min: int | None = Field(default=1, validation_alias=AliasChoices("node_count_min", "cd_node_count_min"))
+    node_count_max: int | None = Field(default=3, validation_alias=AliasChoices("node_count_max", "cd_node_count_max"))
+    lifetime_limit: timedelta | None = Field(
+        default=timedelta(hours=4), validation_alias=AliasChoices("lifetime_limit", "cd_lifetime_limit")
+    )
+    session_timeout_limit: timedelta | None = Field(
+        default=timedelta(minutes=30),
+        validation_alias=AliasChoices("session_timeout_limit", "cd_session_timeout_limit"),
+    )
     cluster_request_timeout_limit: timedelta | None = Field(
-        default=timedelta(minutes=5), env="cd_cluster_request_timeout_limit"
+        default=timedelta(minutes=5),
+        validation_alias=AliasChoices("cluster_request_timeout_limit", "cd_cluster_request_timeout_limit"),
     )
 
     # server resources + storage
     server_resources_requests_cpu_min: Decimal | None = Field(
         default=None,
-        env="cd_server_resources_requests_cpu_min",
+        validation_alias=AliasChoices("server_resources_requests_cpu_min", "cd_server_resources_requests_cpu_min"),
     )
     server_resources_requests_cpu_max: Decimal | None = Field(
         default=None,
-        env="cd_server_resources_requests_cpu_max",
+        validation_alias=AliasChoices("server_resources_requests_cpu_max", "cd_server_resources_requests_cpu_max"),
     )
     server_resources_requests_memory_min: Decimal | None = Field(
         default=None,
-        env="cd_server_resources_requests_memory_min",
+        validation_alias=AliasChoices(
+            "server_resources_requests_memory_min", "cd_server_resources_requests_memory_min"
+        ),
     )
     server_resources_requests_memory_max: Decimal | None = Field(
         default=None,
-        env="cd_server_resources_requests_memory_max",
+        validation_alias=AliasChoices(
+            "server_resources_requests_memory_max", "cd_server_resources_requests_memory_max"
+        ),
     )
     server_resources_limits_cpu_min: Decimal | None = Field(
         default=None,
-        env="cd_server_resources_limits_cpu_min",
+        validation_alias=AliasChoices("server_resources_limits_cpu_min", "cd_server_resources_limits_cpu_min"),
     )
     server_resources_limits_cpu_max: Decimal | None = Field(
         default=None,
-        env="cd_server_resources_limits_cpu_max",
+        validation_alias=AliasChoices("server_resources_limits_cpu_max", "cd_server_resources_limits_cpu_max"),
     )
     server_resources_limits_memory_min: Decimal | None = Field(
         default=None,
-        env="cd_server_resources_limits_memory_min",
+        validation_alias=AliasChoices("server_resources_limits_memory_min", "cd_server_resources_limits_memory_min"),
     )
     server_resources_limits_memory_max: Decimal | None = Field(
         default=None,
-        env="cd_server_resources_limits_memory_max",
+        validation_alias=AliasChoices("server_resources_limits_memory_max", "cd_server_resources_limits_memory_max"),
     )
     server_storage_requests_min: Decimal | None = Field(
         default=None,
-        env="cd_server_storage_requests_min",
+        validation_alias=AliasChoices("server_storage_requests_min", "cd_server_storage_requests_min"),
     )
     server_storage_requests_max: Decimal | None = Field(
         default=None,
-        env="cd_server_storage_requests_max",
+        validation_alias=AliasChoices("server_storage_requests_max", "cd_server_storage_requests_max"),
     )
 
     # node resources + storage
     node_resources_requests_cpu_min: Decimal | None = Field(
         default=None,
-        env="cd_node_resources_requests_cpu_min",
+        validation_alias=AliasChoices("node_resources_requests_cpu_min", "cd_node_resources_requests_cpu_min"),
     )
     node_resources_requests_cpu_max: Decimal | None = Field(
         default=None,
-        env="cd_node_resources_requests_cpu_max",
+        validation_alias=AliasChoices("node_resources_requests_cpu_max", "cd_node_resources_requests_cpu_max"),
     )
     node_resources_requests_memory_min: Decimal | None = Field(
         default=None,
-        env="cd_node_resources_requests_memory_min",
+        validation_alias=AliasChoices("node_resources_requests_memory_min", "cd_node_resources_requests_memory_min"),
     )
     node_resources_requests_memory_max: Decimal | None = Field(
         default=None,
-        env="cd_node_resources_requests_memory_max",
+        validation_alias=AliasChoices("node_resources_requests_memory_max", "cd_node_resources_requests_memory_max"),
     )
     node_resources_limits_cpu_min: Decimal | None = Field(
         default=None,
-        env="cd_node_resources_limits_cpu_min",
+        validation_alias=AliasChoices("node_resources_limits_cpu_min", "cd_node_resources_limits_cpu_min"),
     )
     node_resources_limits_cpu_max: Decimal | None = Field(
         default=None,
-        env="cd_node_resources_limits_cpu_max",
+        validation_alias=AliasChoices("node_resources_limits_cpu_max", "cd_node_resources_limits_cpu_max"),
     )
     node_resources_limits_memory_min: Decimal | None = Field(
         default=None,
-        env="cd_node_resources_limits_memory_min",
+        validation_alias=AliasChoices("node_resources_limits_memory_min", "cd_node_resources_limits_memory_min"),
     )
     node_resources_limits_memory_max: Decimal | None = Field(
         default=None,
-        env="cd_node_resources_limits_memory_max",
+        validation_alias=AliasChoices("node_resources_limits_memory_max", "cd_node_resources_limits_memory_max"),
     )
     node_storage_requests_min: Decimal | None = Field(
         default=None,
-        env="cd_node_storage_requests_min",
+        validation_alias=AliasChoices("node_storage_requests_min", "cd_node_storage_requests_min"),
     )
     node_storage_requests_max: Decimal | None = Field(
         default=None,
-        env="cd_node_storage_requests_max",
+        validation_alias=AliasChoices("node_storage_requests_max", "cd_node_storage_requests_max"),
     )
 
-    @validator("k8s_versions", pre=True)
+    @field_validator("k8s_versions", mode="before")
+    @classmethod
     def k8s_versions_validator(cls, v):
         if not v:
             return None
@@ -121,25 +134,27 @@ class Config(BaseModel):
 
         return v
 
-    @validator("node_count_min")
+    @field_validator("node_count_min")
+    @classmethod
     def node_count_validator(cls, v):
         if v < 1:
             return 1
         return v
 
-    @validator("lifetime_limit", "session_timeout_limit", "cluster_request_timeout_limit", pre=True)
-    def timedelta_validator(cls, v, values, field):
+    @field_validator("lifetime_limit", "session_timeout_limit", "cluster_request_timeout_limit", mode="before")
+    @classmethod
+    def timedelta_validator(cls, v, info: ValidationInfo):
         if type(v) == timedelta:
             return v
 
         try:
             td = convert_to_timedelta(v)
         except ValueError:
-            raise ValueError(f"Invalid {field.name}: '{v}'.")
+            raise ValueError(f"Invalid {info.field_name}: '{v}'.")
 
         return td
 
-    @validator(
+    @field_validator(
         "server_resources_requests_cpu_min",
         "server_resources_requests_cpu_max",
         "server_resources_limits_cpu_min",
@@ -148,24 +163,28 @@ class Config(BaseModel):
         "node_resources_requests_cpu_max",
         "node_resources_limits_cpu_min",
         "node_resources_limits_cpu_max",
-        pre=True,
+        mode="before",
     )
-    def compute_validator(cls, v, values, field):
+    @classmethod
+    def compute_validator(cls, v, info: ValidationInfo):
         if not v:
             return None
 
+        if isinstance(v, Decimal):
+            return v
+
         if v.endswith(("Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "k", "K", "M", "G", "T", "P", "E")):
-            raise ValueError(f"Invalid {field.name}: '{v}'.")
+            raise ValueError(f"Invalid {info.field_name}: '{v}'.")
 
         try:
             v = parse_quantity(v)
         except ValueError:
-            logger.warning(f"Invalid {field.name}: '{v}'.")
+            logger.warning(f"Invalid {info.field_name}: '{v}'.")
             return None
 
         return v
 
-    @validator(
+    @field_validator(
         "server_resources_requests_memory_min",
         "server_resources_requests_memory_max",
         "server_resources_limits_memory_min",
@@ -178,19 +197,23 @@ class Config(BaseModel):
         "node_resources_limits_memory_max",
         "node_storage_requests_min",
         "node_storage_requests_max",
-        pre=True,
+        mode="before",
     )
-    def memory_validator(cls, v, values, field):
+    @classmethod
+    def memory_validator(cls, v, info: ValidationInfo):
         if not v:
             return None
 
+        if isinstance(v, Decimal):
+            return v
+
         if not v.endswith(("Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "k", "K", "M", "G", "T", "P", "E")):
-            raise ValueError(f"Invalid {field.name}: '{v}'.")
+            raise ValueError(f"Invalid {info.field_name}: '{v}'.")
 
         try:
             v = parse_quantity(v)
         except ValueError:
-            logger.warning(f"Invalid {field.name}: '{v}'.")
+            logger.warning(f"Invalid {info.field_name}: '{v}'.")
             return None
 
         return v
@@ -199,4 +222,4 @@ class Config(BaseModel):
 class ConfigInfoResponse(BaseModel):
     default: bool = True
     name: str = "default"
-    config: Config | None
+    config: Config | None = None
@@ -0,0 +1,28 @@
+import hashlib
+import logging
+
+from fastapi import Request, Response, status
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b("/".join(str(part) for part in parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    # weak comparison (RFC 9110, 8.8.3.2)
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
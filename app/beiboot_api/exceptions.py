@@ -1,4 +1,43 @@
 class BeibootException(Exception):
+    status_code = 500
+
     def __init__(self, message: str, error: str):
         self.message = message
         self.error = error
+
+
+class KubernetesOverloadException(BeibootException):
+    status_code = 503
+
+
+class KubernetesTimeoutException(BeibootException):
+    status_code = 504
+
+
+class OperationsOverloadException(BeibootException):
+    status_code = 503
+
+
+class IdempotencyKeyMismatchException(BeibootException):
+    status_code = 422
+
+
+class ClusterLimitException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class ClusterExistsException(RuntimeError):
+    pass
+
+
+class ClusterConflictException(RuntimeError):
+    # the Beiboot changed since the resource version given as precondition (409)
+    pass
+
+
+class ConnectionLimitException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Callable
+
+from exceptions import KubernetesOverloadException, KubernetesTimeoutException
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+class KubernetesExecutor:
+    """
+    Bounded thread pool for blocking Kubernetes (and beiboot client) calls.
+
+    Calls are awaitable and run off the event loop. Each call has a deadline, calls still waiting in the queue when
+    their deadline passes are cancelled. If more than 'workers + queue_size' calls are pending, new calls are rejected
+    right away (load shedding) instead of piling up.
+    """
+
+    def __init__(self, settings: Settings):
+        self.workers = settings.k8s_executor_workers
+        self.queue_size = settings.k8s_executor_queue_size
+        self.timeout = settings.k8s_executor_timeout_seconds
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="k8s")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # metrics
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, func: Callable[..., Any], *args, timeout: float | None = None, **kwargs) -> Any:
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise KubernetesOverloadException(
+                    message="Kubernetes API overloaded", error=f"{self._pending} calls pending, try again later."
+                )
+            self._pending += 1
+
+        future = self._executor.submit(partial(func, *args, **kwargs))
+        future.add_done_callback(self._done)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise KubernetesTimeoutException(
+                message="Kubernetes API timeout", error=f"'{getattr(func, '__name__', func)}' exceeded its deadline."
+            )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+
+@lru_cache()
+def get_k8s_executor() -> KubernetesExecutor:
+    return KubernetesExecutor(settings=get_settings())
@@ -1,8 +1,8 @@
 import logging
 from typing import Annotated, List, Union
 
-import kubernetes as k8s
-import timeout_decorator
+from backend import KubernetesBackend, get_kubernetes_backend
+from coalescer import SingleFlight, get_coalescer
 from fastapi import Depends
 from group.types import GroupConfig
 from kubernetes.client.rest import ApiException
@@ -12,8 +12,15 @@ logger = logging.getLogger("uvicorn.beiboot")
 
 
 class GroupService:
-    def __init__(self, settings: Annotated[Settings, Depends(get_settings)]):
+    def __init__(
+        self,
+        settings: Annotated[Settings, Depends(get_settings)],
+        backend: Annotated[KubernetesBackend, Depends(get_kubernetes_backend)] = None,
+        coalescer: Annotated[SingleFlight, Depends(get_coalescer)] = None,
+    ):
         self.settings = settings
+        self.backend = backend or get_kubernetes_backend()
+        self.coalescer = coalescer or get_coalescer()
 
     def available_groups(self) -> Union[List[str], str]:
         return ["developer", "free", self.settings.group_default_name]  # TODO: fixed set of groups currently
@@ -48,8 +55,7 @@ class GroupService:
 
         return group_selected
 
-    @timeout_decorator.timeout(5, timeout_exception=Exception)
-    def get_config(
+    async def get_config(
         self,
         prefix: str | None = None,
         name: str | None = None,
@@ -67,14 +73,16 @@ class GroupService:
         group_map_name = f"{prefix}{name}"
 
         try:
-            client = k8s.client.CoreV1Api()
-            cm = client.read_namespaced_config_map(name=group_map_name, namespace=namespace)
+            cm = await self.coalescer.do(
+                key=SingleFlight.key(resource="configmaps", namespace=namespace, name=group_map_name),
+                func=lambda: self.backend.read_config_map(name=group_map_name, namespace=namespace, timeout=5),
+            )
         except ApiException as e:
             logger.error(e)
             raise ValueError(f"ConfigMap {name} not found in namespace {namespace}")
 
         cc = {}
-        for item in GroupConfig.__fields__:
+        for item in GroupConfig.model_fields:
             cc[item] = cm.data.get(item.upper(), getattr(self.settings, item, None))
 
         return GroupConfig(**cc)
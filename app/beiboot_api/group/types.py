@@ -1,6 +1,6 @@
 import logging
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 
 logger = logging.getLogger("uvicorn.beiboot")
 
@@ -8,8 +8,10 @@ logger = logging.getLogger("uvicorn.beiboot")
 class GroupConfig(BaseModel):
     group_cluster_limit: int | None = Field(default=5)
     user_cluster_limit: int | None = Field(default=0)
+    pool_size: int | None = Field(default=0)
 
-    @validator("group_cluster_limit", "user_cluster_limit")
+    @field_validator("group_cluster_limit", "user_cluster_limit", "pool_size")
+    @classmethod
     def positive_integer_validator(cls, v):
         if not v:
             return None
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Tuple
+
+from exceptions import IdempotencyKeyMismatchException
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+IDEMPOTENCY_KEY_HEADER = "idempotency-key"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def fingerprint(data: str) -> str:
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class IdempotentCall:
+    fingerprint: str
+    task: asyncio.Future
+    expires: float | None = None
+
+
+class IdempotencyCache:
+    """
+    Results of requests with an 'Idempotency-Key' header, keyed by (user, key).
+
+    The first request runs the call, a retry of an in-flight request joins the call and a retry of a completed request
+    gets the stored result (replay) for 'idempotency_ttl_seconds'. A retry with a different payload (fingerprint) is
+    rejected. Failed calls are not stored, i.e. a retry runs the call again. The cache keeps at most
+    'idempotency_cache_size' keys, the oldest keys are dropped first. Completed calls are kept in the order of their
+    completion, i.e. of their expiry: a prune stops at the first completed call which has not expired.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._calls: "OrderedDict[Tuple[str | None, str], IdempotentCall]" = OrderedDict()
+
+        # metrics
+        self.misses = 0
+        self.joins = 0
+        self.replays = 0
+        self.mismatches = 0
+
+    async def do(
+        self, user: str | None, key: str, fingerprint: str, func: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Returns the result of the call and whether it was replayed (the call ran for an earlier request).
+        """
+        self._prune()
+
+        cache_key = (user, key)
+        call = self._calls.get(cache_key)
+        if call and call.fingerprint != fingerprint:
+            self.mismatches += 1
+            raise IdempotencyKeyMismatchException(
+                message="Idempotency Error", error="The Idempotency-Key was used with a different request payload."
+            )
+
+        if call:
+            replayed = True
+            if call.task.done():
+                self.replays += 1
+            else:
+                self.joins += 1
+        else:
+            replayed = False
+            self.misses += 1
+            call = IdempotentCall(fingerprint=fingerprint, task=asyncio.ensure_future(func()))
+            call.task.add_done_callback(lambda t: self._done(cache_key, t))
+            self._calls[cache_key] = call
+            while len(self._calls) > self.settings.idempotency_cache_size:
+                self._calls.popitem(last=False)
+
+        # a cancelled (timed out) client must not cancel the call of the other requests
+        return await asyncio.shield(call.task), replayed
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._calls),
+            "in_flight": sum(1 for call in self._calls.values() if not call.task.done()),
+            "misses": self.misses,
+            "joins": self.joins,
+            "replays": self.replays,
+            "mismatches": self.mismatches,
+        }
+
+    def _done(self, cache_key: Tuple[str | None, str], task: asyncio.Future) -> None:
+        call = self._calls.get(cache_key)
+        if not call or call.task is not task:
+            return None
+
+        if task.cancelled() or task.exception():
+            # failures are not replayed
+            del self._calls[cache_key]
+        else:
+            call.expires = time.monotonic() + self.settings.idempotency_ttl_seconds
+            self._calls.move_to_end(cache_key)
+
+    def _prune(self) -> None:
+        # expired calls are at the front, only calls in flight are skipped
+        now = time.monotonic()
+        expired = []
+        for cache_key, call in self._calls.items():
+            if call.expires is None:
+                continue
+            if call.expires >= now:
+                break
+            expired.append(cache_key)
+
+        for cache_key in expired:
+            del self._calls[cache_key]
+
+
+@lru_cache()
+def get_idempotency_cache() -> IdempotencyCache:
+    return IdempotencyCache(settings=get_settings())
@@ -1,10 +1,18 @@
 import logging
 
 import kubernetes as k8s
+import uvicorn
+from backend import get_asyncio_backend
+from cluster.heartbeat import get_heartbeat_aggregator
+from cluster.pool import get_cluster_pool
+from cluster.shards import get_replica_set
+from cluster.store import get_cluster_store
 from exceptions import BeibootException
+from executor import get_k8s_executor
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from routers import clusters, configs, connections, debug
+from operation.service import get_operation_queue
+from routers import clusters, configs, connections, debug, operations
 from sentry import sentry_setup
 from sentry_sdk import capture_exception
 from settings import get_settings
@@ -19,6 +27,10 @@ app = FastAPI()
 async def user_middleware(request: Request, call_next):
     request.state.user = request.headers.get("X-Forwarded-User", None)
 
+    groups = request.headers.get("X-Forwarded-Groups", None) or ""
+    group_role_prefix = get_settings().group_role_prefix
+    request.state.groups = [group.strip().replace(group_role_prefix, "") for group in groups.split(",") if group]
+
     response = await call_next(request)
     return response
 
@@ -55,13 +67,43 @@ async def startup_event():
     # setup kubeconfig
     setup_kubeconfig(config_file=settings.k8s_config_file)
 
+    # setup asyncio kubernetes client (optional)
+    if settings.k8s_asyncio_enabled:
+        await get_asyncio_backend().setup(config_file=settings.k8s_config_file)
+
+    # setup cluster store
+    if settings.cluster_store_enabled:
+        get_cluster_store().start()
+
+        # setup warm pool (requires the cluster store)
+        get_cluster_pool().start()
+
+    # setup operation workers
+    get_operation_queue().start()
+
+    # setup heartbeat writes
+    if settings.sharding_enabled and not settings.cluster_store_enabled:
+        logger.warning("Sharding requires the cluster store, heartbeats of other replicas are dropped.")
+    get_heartbeat_aggregator().start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    get_cluster_store().stop()
+    await get_heartbeat_aggregator().stop()
+    await get_replica_set().leave()
+    get_k8s_executor().shutdown()
+    await get_cluster_pool().stop()
+    await get_operation_queue().stop()
+    await get_asyncio_backend().close()
+
 
 @app.exception_handler(BeibootException)
 async def beiboot_exception_handler(request: Request, exc: BeibootException):
     capture_exception(exc)  # sentry
 
     return JSONResponse(
-        status_code=500,
+        status_code=exc.status_code,
         content={"msg": exc.message},
     )
 
@@ -74,4 +116,17 @@ async def get_root():
 app.include_router(clusters.router)
 app.include_router(connections.router)
 app.include_router(configs.router)
+app.include_router(operations.router)
 app.include_router(debug.router)
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+    # ping/pong frames keep idle heartbeat websockets alive and detect dead clients
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8080,
+        ws_ping_interval=settings.websocket_ping_interval_seconds,
+        ws_ping_timeout=settings.websocket_ping_timeout_seconds,
+    )
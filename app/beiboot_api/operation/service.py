@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List
+
+from beiboot.types import Beiboot
+from exceptions import BeibootException, OperationsOverloadException
+from fastapi import HTTPException
+from operation.types import Operation, OperationState, OperationType
+from settings import Settings, get_settings
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+class OperationQueue:
+    """
+    Bounded queue of long-running operations (e.g. cluster creation) executed by a fixed number of workers.
+
+    Operations are kept for 'operations_ttl_seconds' after they finished, to be read with GET /operations/{id}.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._workers: List[asyncio.Task] = []
+        self._operations: Dict[str, Operation] = {}
+
+        # metrics
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._workers and self._loop is loop:
+            return None
+
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.settings.operations_queue_size)
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"operation-worker-{i}")
+            for i in range(self.settings.operations_workers)
+        ]
+        logger.info(f"Operation queue started ({len(self._workers)} workers).")
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, type: OperationType, user: str | None, func: Callable[[], Awaitable[Beiboot]]) -> Operation:
+        self.start()
+        self._prune()
+
+        operation = Operation(type=type, user=user, func=func)
+        try:
+            self._queue.put_nowait(operation)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise OperationsOverloadException(message="Operation Error", error="Too many pending operations.")
+
+        self._operations[operation.id] = operation
+        self.submitted += 1
+        return operation
+
+    def get(self, operation_id: str, user: str | None = None) -> Operation | None:
+        operation = self._operations.get(operation_id)
+        if not operation or (user and operation.user != user):
+            return None
+
+        return operation
+
+    async def wait(self, operation: Operation, timeout: float) -> bool:
+        if not timeout:
+            return operation.done.is_set()
+
+        try:
+            await asyncio.wait_for(operation.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        return operation.done.is_set()
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "pending": self._queue.qsize() if self._queue else 0,
+            "operations": len(self._operations),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+        }
+
+    async def _work(self) -> None:
+        while True:
+            operation = await self._queue.get()
+            try:
+                await self._run(operation)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, operation: Operation) -> None:
+        operation.update(OperationState.RUNNING)
+        try:
+            operation.beiboot = await operation.func()
+        except BeibootException as e:
+            operation.status_code = e.status_code
+            operation.error = e.error
+        except HTTPException as e:
+            # e.g. a cluster limit reached while the operation was queued
+            operation.status_code = e.status_code
+            operation.error = e.detail
+        except Exception as e:
+            logger.error(f"Operation {operation.id} failed: {e}")
+            operation.status_code = 500
+            operation.error = str(e)
+
+        if operation.beiboot:
+            self.succeeded += 1
+            operation.status_code = 200
+            operation.update(OperationState.SUCCEEDED)
+        else:
+            self.failed += 1
+            operation.update(OperationState.FAILED)
+
+        operation.func = None
+        operation.finished_at = time.monotonic()
+        operation.done.set()
+
+    def _prune(self) -> None:
+        # finished operations are dropped after the ttl
+        expires = time.monotonic() - self.settings.operations_ttl_seconds
+        for operation in list(self._operations.values()):
+            if operation.finished_at is not None and operation.finished_at < expires:
+                del self._operations[operation.id]
+
+
+@lru_cache()
+def get_operation_queue() -> OperationQueue:
+    return OperationQueue(settings=get_settings())
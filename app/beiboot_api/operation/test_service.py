@@ -0,0 +1,57 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from cluster.store import StoredBeiboot
+from cluster.test_store import beiboot_object
+from exceptions import BeibootException, OperationsOverloadException
+from operation.service import OperationQueue
+from operation.types import OperationState, OperationType
+from settings import Settings
+
+
+class OperationQueueTest(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.queue = OperationQueue(settings=Settings(operations_workers=1, operations_queue_size=1))
+        self.release = asyncio.Event()
+
+    async def asyncTearDown(self):
+        self.release.set()
+        await self.queue.stop()
+
+    async def create(self, name: str) -> StoredBeiboot:
+        await self.release.wait()
+        return StoredBeiboot(beiboot_object(name))
+
+    async def fail(self) -> StoredBeiboot:
+        raise BeibootException(message="Beiboot Error", error="api down")
+
+    async def test_submit(self):
+        operation = self.queue.submit(type=OperationType.CLUSTER_CREATE, user="john", func=lambda: self.create("a"))
+        self.assertEqual(operation.state, OperationState.PENDING)
+        self.assertFalse(await self.queue.wait(operation, timeout=0.05))
+        self.assertEqual(operation.state, OperationState.RUNNING)
+
+        self.release.set()
+        self.assertTrue(await self.queue.wait(operation, timeout=1))
+        self.assertEqual(operation.state, OperationState.SUCCEEDED)
+        self.assertEqual(operation.beiboot.name, "a")
+
+        self.assertIs(self.queue.get(operation.id, user="john"), operation)
+        self.assertIsNone(self.queue.get(operation.id, user="jane"))
+
+    async def test_failed(self):
+        operation = self.queue.submit(type=OperationType.CLUSTER_CREATE, user="john", func=self.fail)
+
+        self.assertTrue(await self.queue.wait(operation, timeout=1))
+        self.assertEqual(operation.state, OperationState.FAILED)
+        self.assertEqual(operation.status_code, 500)
+        self.assertEqual(operation.error, "api down")
+
+    async def test_overload(self):
+        self.queue.submit(type=OperationType.CLUSTER_CREATE, user="john", func=lambda: self.create("a"))
+        await asyncio.sleep(0)  # picked up by the worker
+        self.queue.submit(type=OperationType.CLUSTER_CREATE, user="john", func=lambda: self.create("b"))
+
+        with self.assertRaises(OperationsOverloadException):
+            self.queue.submit(type=OperationType.CLUSTER_CREATE, user="john", func=lambda: self.create("c"))
+        self.assertEqual(self.queue.stats()["rejected"], 1)
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Awaitable, Callable, List, Union
+from uuid import uuid4
+
+from beiboot.types import Beiboot
+from cluster.types import ClusterStateResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+
+class OperationType(Enum):
+    CLUSTER_CREATE = "CLUSTER_CREATE"
+
+
+class OperationState(Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+
+@dataclass
+class Operation:
+    type: OperationType
+    user: str | None
+    func: Callable[[], Awaitable[Beiboot]] | None
+    state: OperationState = OperationState.PENDING
+    created: datetime = field(default_factory=datetime.utcnow)
+    updated: datetime = field(default_factory=datetime.utcnow)
+    beiboot: Beiboot | None = None
+    status_code: int | None = None
+    error: str | List[dict] | None = None
+    id: str = field(default_factory=lambda: uuid4().hex)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    finished_at: float | None = None
+
+    def update(self, state: OperationState) -> None:
+        self.state = state
+        self.updated = datetime.utcnow()
+
+
+class OperationResponse(BaseModel):
+    id: str
+    type: OperationType
+    state: OperationState
+    created: datetime
+    updated: datetime
+    cluster: ClusterStateResponse | None = None
+    status_code: int | None = None
+    error: Union[str, List[dict]] | None = None
+
+    @classmethod
+    def from_operation(cls, operation: Operation, cluster: ClusterStateResponse | None = None) -> "OperationResponse":
+        return cls(
+            id=operation.id,
+            type=operation.type,
+            state=operation.state,
+            created=operation.created,
+            updated=operation.updated,
+            cluster=cluster,
+            status_code=operation.status_code,
+            error=operation.error,
+        )
@@ -1,17 +1,36 @@
 import asyncio
+import json
 import logging
 from datetime import datetime
 from io import BytesIO
-from typing import Annotated, List
-
-from beiboot import api
+from typing import Annotated, Any, AsyncIterator, Dict, List, Tuple, Union
+
+from beiboot.types import Beiboot, BeibootState
+from cluster.events import ClusterSubscription
+from cluster.helpers import decode_cursor, validation_errors
+from cluster.plan import ValidationPlan
+from cluster.quota import Reservation
+from cluster.registry import ConnectionRegistry, get_connection_registry
 from cluster.service import ClusterService, get_cluster_service
 from cluster.types import (
+    ClusterBatchDeleteRequest,
+    ClusterBatchDeleteResponse,
+    ClusterBatchRequest,
+    ClusterBatchResponse,
+    ClusterBatchResult,
+    ClusterDeleteResult,
+    ClusterDelta,
+    ClusterHeartbeatRequest,
+    ClusterHeartbeatResponse,
+    ClusterHeartbeatResult,
     ClusterInfoResponse,
+    ClusterPage,
     ClusterParameter,
     ClusterReadyTimeout,
     ClusterRequest,
     ClusterStateResponse,
+    ClusterValidationError,
+    ClusterValidationResponse,
     GefyraEnabled,
     GefyraEndpoint,
     K8sVersion,
@@ -23,6 +42,7 @@ from cluster.types import (
     NodeResourcesRequestsCpu,
     NodeResourcesRequestsMemory,
     NodeStorageRequests,
+    Parameters,
     Ports,
     ServerResourcesLimitsCpu,
     ServerResourcesLimitsMemory,
@@ -33,86 +53,182 @@ from cluster.types import (
     TunnelEnabled,
     TunnelEndpoint,
 )
-from exceptions import BeibootException
+from etag import etag_matches, make_etag, not_modified
+from exceptions import BeibootException, ClusterLimitException, ConnectionLimitException
 from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, status
-from fastapi.responses import HTMLResponse, StreamingResponse
-from fastapi_pagination import Page, Params, paginate
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi.websockets import WebSocketState
+from fastapi_pagination import Params
 from group.service import GroupService, get_group_service
+from group.types import GroupConfig
 from headers import user_headers
+from idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    IDEMPOTENCY_KEY_MAX_LENGTH,
+    IdempotencyCache,
+    fingerprint,
+    get_idempotency_cache,
+)
+from operation.service import OperationQueue, get_operation_queue
+from operation.types import OperationResponse, OperationType
+from pydantic import TypeAdapter, ValidationError
 
 logger = logging.getLogger("uvicorn.beiboot")
 
 router = APIRouter(prefix="/clusters", tags=["clusters"], dependencies=[Depends(user_headers)])
 
+# close codes of heartbeat websockets
+WS_CLOSE_CLUSTER_NOT_FOUND = 4404
+WS_CLOSE_CLUSTER_TERMINATING = 4410
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# compiled (pydantic-core) serializers of the list responses, see json_response
+cluster_page_adapter = TypeAdapter(ClusterPage[ClusterStateResponse])
+cluster_delta_adapter = TypeAdapter(ClusterDelta)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
 
+def json_response(adapter: TypeAdapter, content: Any, response: Response) -> Response:
+    # serializes the content directly to JSON, instead of validating it against the response model first
+    headers = {"ETag": response.headers["ETag"]} if "ETag" in response.headers else None
+    return Response(content=adapter.dump_json(content, by_alias=True), media_type="application/json", headers=headers)
 
-manager = ConnectionManager()
 
-
-@router.get("/", response_model=Page[ClusterStateResponse])
+@router.get("/", response_model=Union[ClusterDelta, ClusterPage[ClusterStateResponse]])
 async def cluster_list(
     request: Request,
     cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    response: Response,
     params: Params = Depends(),
-) -> List[ClusterStateResponse]:
+    cursor: str | None = None,
+    since: str | None = None,
+) -> Response:
+    # read before the content: a change in between is returned again with the next delta, but never lost
+    version = cluster_service.version()
+    if version:
+        etag = make_etag(version, request.state.user, params.page, params.size, cursor, since)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+
+    if since is not None:
+        delta = await cluster_delta(request=request, cluster_service=cluster_service, version=version, since=since)
+        return json_response(cluster_delta_adapter, delta, response)
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
     try:
         labels = Labels(user=request.state.user)
-        beiboots = cluster_service.list(labels=labels)
+        raw_params = params.to_raw_params()
+        beiboots, total, next_cursor = await cluster_service.page(
+            offset=raw_params.offset, limit=raw_params.limit, after=after, labels=labels
+        )
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
-    response = []
-    for beiboot in beiboots:
-        if beiboot.sunset:
-            sunset = datetime.strptime(beiboot.sunset, "%Y-%m-%dT%H:%M:%S.%fZ")
-        else:
-            sunset = None
-        if beiboot.parameters.maxLifetime:
-            lifetime = Lifetime(value=beiboot.parameters.maxLifetime)
-        else:
-            lifetime = None
-        if beiboot.parameters.maxSessionTimeout:
-            timeout = SessionTimeout(value=beiboot.parameters.maxSessionTimeout)
-        else:
-            timeout = None
-        response.append(
-            ClusterStateResponse(
-                id=beiboot.name,
-                name=beiboot.labels.get("name"),
-                state=beiboot.state,
-                sunset=sunset,
-                max_lifetime=lifetime,
-                max_session_timeout=timeout,
-            )
+    # only the requested page is converted
+    items = [ClusterStateResponse.from_beiboot(beiboot) for beiboot in beiboots]
+    page = ClusterPage.create(items, params, total=total, next_cursor=next_cursor, version=version)
+    return json_response(cluster_page_adapter, page, response)
+
+
+async def cluster_delta(
+    request: Request, cluster_service: ClusterService, version: str | None, since: str
+) -> ClusterDelta:
+    labels = Labels(user=request.state.user)
+
+    changes = cluster_service.changes(since=since, labels=labels)
+    if changes is not None:
+        changed, deleted = changes
+        return ClusterDelta(
+            version=version,
+            items=[ClusterStateResponse.from_beiboot(beiboot) for beiboot in changed],
+            deleted=[beiboot.name for beiboot in deleted],
         )
 
-    return paginate(response, params)
+    # version unknown or too old: full list, the client replaces its snapshot
+    try:
+        beiboots = await cluster_service.list(labels=labels)
+    except BeibootException:
+        raise
+    except Exception as e:
+        raise BeibootException(message="Beiboot Error", error=str(e))
+
+    return ClusterDelta(
+        version=version,
+        reset=True,
+        items=[ClusterStateResponse.from_beiboot(beiboot) for beiboot in sorted(beiboots, key=lambda b: b.name)],
+        deleted=[],
+    )
+
+
+async def cluster_event_stream(
+    request: Request, cluster_service: ClusterService, subscription: ClusterSubscription
+) -> AsyncIterator[str]:
+    keepalive = cluster_service.settings.cluster_events_keepalive_seconds
+    try:
+        yield f"retry: {keepalive * 1000}\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await subscription.get(timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if event is None:
+                # subscriber too slow, the client has to reconnect (and resync)
+                yield "event: overflow\ndata: {}\n\n"
+                break
+
+            data = ClusterStateResponse.from_beiboot(event.beiboot).model_dump_json()
+            yield f"id: {event.version}\nevent: {event.type.lower()}\ndata: {data}\n\n"
+    finally:
+        cluster_service.unsubscribe(subscription)
+
+
+@router.get("/events")
+async def cluster_events(
+    request: Request, cluster_service: Annotated[ClusterService, Depends(get_cluster_service)]
+) -> StreamingResponse:
+    subscription = cluster_service.subscribe(labels=Labels(user=request.state.user))
+    if not subscription:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Cluster events not available.")
+
+    return StreamingResponse(
+        cluster_event_stream(request=request, cluster_service=cluster_service, subscription=subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{cluster_id}", response_model=ClusterInfoResponse)
 async def cluster_info(
-    request: Request, cluster_id: str, cluster_service: Annotated[ClusterService, Depends(get_cluster_service)]
+    request: Request,
+    response: Response,
+    cluster_id: str,
+    cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
 ) -> ClusterInfoResponse:
     try:
         labels = Labels(user=request.state.user)
-        beiboot = cluster_service.get(cluster_id=cluster_id, labels=labels)
+        beiboot = await cluster_service.get(cluster_id=cluster_id, labels=labels)
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
     if not beiboot:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cluster not found.")
 
+    etag = make_etag(beiboot.name, beiboot.resource_version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
     # parameters
     parameters = [
         K8sVersion(value=beiboot.parameters.k8sVersion),
@@ -145,7 +261,7 @@ async def cluster_info(
     else:
         sunset = None
 
-    response = ClusterInfoResponse(
+    return ClusterInfoResponse(
         id=beiboot.name,
         name=beiboot.labels.get("name"),
         namespace=beiboot.namespace,
@@ -153,42 +269,280 @@ async def cluster_info(
         sunset=sunset,
         parameters=parameters_filtered,
     )
-    return response
 
 
-@router.post("/", response_model=ClusterStateResponse)
+@router.get("/{cluster_id}/events")
+async def cluster_events_single(
+    request: Request, cluster_id: str, cluster_service: Annotated[ClusterService, Depends(get_cluster_service)]
+) -> StreamingResponse:
+    labels = Labels(user=request.state.user)
+    beiboot = await cluster_service.get(cluster_id=cluster_id, labels=labels)
+    if not beiboot:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cluster not found.")
+
+    subscription = cluster_service.subscribe(cluster_id=cluster_id, labels=labels)
+    if not subscription:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Cluster events not available.")
+
+    return StreamingResponse(
+        cluster_event_stream(request=request, cluster_service=cluster_service, subscription=subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/",
+    response_model=ClusterStateResponse,
+    responses={status.HTTP_202_ACCEPTED: {"model": OperationResponse, "description": "Prefer: respond-async"}},
+)
 async def cluster_create(  # noqa: C901
     request: Request,
     group_service: Annotated[GroupService, Depends(get_group_service)],
     cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    operations: Annotated[OperationQueue, Depends(get_operation_queue)],
+    idempotency: Annotated[IdempotencyCache, Depends(get_idempotency_cache)],
     cluster_request: ClusterRequest = Body(
-        example={
-            "name": "hello",
-            "parameters": [
-                {
-                    "name": ClusterParameter.K8S_VERSION.value,
-                    "value": "1.26.0",
-                },
-                {
-                    "name": ClusterParameter.PORTS.value,
-                    "value": ["80:80", "443:443"],
-                },
-                {
-                    "name": ClusterParameter.NODE_COUNT.value,
-                    "value": 1,
-                },
-                {
-                    "name": ClusterParameter.LIFETIME.value,
-                    "value": "1h",
-                },
-                {
-                    "name": ClusterParameter.SESSION_TIMEOUT.value,
-                    "value": "5m",
-                },
-            ],
-        },
+        examples=[
+            {
+                "name": "hello",
+                "parameters": [
+                    {
+                        "name": ClusterParameter.K8S_VERSION.value,
+                        "value": "1.26.0",
+                    },
+                    {
+                        "name": ClusterParameter.PORTS.value,
+                        "value": ["80:80", "443:443"],
+                    },
+                    {
+                        "name": ClusterParameter.NODE_COUNT.value,
+                        "value": 1,
+                    },
+                    {
+                        "name": ClusterParameter.LIFETIME.value,
+                        "value": "1h",
+                    },
+                    {
+                        "name": ClusterParameter.SESSION_TIMEOUT.value,
+                        "value": "5m",
+                    },
+                ],
+            }
+        ],
     ),
 ) -> ClusterStateResponse:
+    async def respond() -> ClusterStateResponse | JSONResponse:
+        group = cluster_group(request=request, group_service=group_service, cluster_request=cluster_request)
+        plan = await cluster_service.plan(group=group)
+        parameters = cluster_parameters(cluster_service=cluster_service, cluster_request=cluster_request, plan=plan)
+
+        # validate group + user cluster limit
+        group_config = await group_service.get_config(name=group)
+
+        # create cluster
+        async def create() -> Beiboot:
+            # reserved when the create starts: a queued operation holds no reservation which could expire meanwhile
+            reservation = await cluster_reserve(
+                cluster_service=cluster_service, user=request.state.user, group=group, group_config=group_config
+            )
+            try:
+                return await cluster_submit(
+                    cluster_service=cluster_service,
+                    user=request.state.user,
+                    cluster_request=cluster_request,
+                    parameters=parameters,
+                    reservation=reservation,
+                )
+            finally:
+                # no-op if the cluster was created
+                cluster_service.quota.release(reservation)
+
+        # asynchronous creation (opt-in): the create runs in the operation queue, see GET /operations/{operation_id}
+        if "respond-async" in request.headers.get("prefer", ""):
+            # limits reached already: rejected right away, the operation checks them again when it runs
+            await cluster_check_quota(
+                cluster_service=cluster_service, user=request.state.user, group=group, group_config=group_config
+            )
+            operation = operations.submit(type=OperationType.CLUSTER_CREATE, user=request.state.user, func=create)
+
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content=jsonable_encoder(OperationResponse.from_operation(operation)),
+                headers={"Location": f"/operations/{operation.id}", "Preference-Applied": "respond-async"},
+            )
+
+        beiboot = await create()
+        response = ClusterStateResponse(id=beiboot.name, name=beiboot.labels.get("name"), state=beiboot.state)
+        return response
+
+    # idempotent creation (opt-in): retries with the same key join or replay the first request
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if not key:
+        return await respond()
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key too long. Maximum length: {IDEMPOTENCY_KEY_MAX_LENGTH}.",
+        )
+
+    response, replayed = await idempotency.do(
+        user=request.state.user,
+        key=key,
+        fingerprint=fingerprint(json.dumps(jsonable_encoder(cluster_request), sort_keys=True)),
+        func=respond,
+    )
+    if not replayed:
+        return response
+    if isinstance(response, ClusterStateResponse):
+        return JSONResponse(content=jsonable_encoder(response), headers={"Idempotent-Replayed": "true"})
+    return JSONResponse(
+        status_code=response.status_code,
+        content=json.loads(response.body),
+        headers={**{k: v for k, v in response.headers.items() if k != "content-length"}, "Idempotent-Replayed": "true"},
+    )
+
+
+@router.post("/validate", response_model=ClusterValidationResponse)
+async def cluster_validate(
+    request: Request,
+    group_service: Annotated[GroupService, Depends(get_group_service)],
+    cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    cluster_request: ClusterRequest,
+) -> ClusterValidationResponse:
+    # dry run of POST /clusters/: group, parameters and cluster limits are validated, nothing is reserved or created
+    try:
+        group = cluster_group(request=request, group_service=group_service, cluster_request=cluster_request)
+    except HTTPException as e:
+        return ClusterValidationResponse(
+            valid=False,
+            group=cluster_request.group,
+            errors=[ClusterValidationError(msg=e.detail, type="group")],
+        )
+
+    plan = await cluster_service.plan(group=group)
+    result = plan.check(cluster_request.parameters)
+    errors = [
+        ClusterValidationError(parameter=error["loc"][0], msg=error["msg"], type=error["type"])
+        for error in result.errors
+    ]
+
+    try:
+        group_config = await group_service.get_config(name=group)
+    except ValueError as e:
+        # a create would fail, too: no cluster limits without the group config
+        errors.append(ClusterValidationError(msg=str(e), type="group"))
+    else:
+        try:
+            await cluster_service.check_quota(user=request.state.user, group=group, group_config=group_config)
+        except ClusterLimitException as e:
+            errors.append(ClusterValidationError(msg=e.message, type="quota"))
+
+    return ClusterValidationResponse(
+        valid=not errors,
+        group=group,
+        errors=errors,
+        parameters=result.parameters,
+        defaults=result.defaults,
+    )
+
+
+@router.post("/batch", response_model=ClusterBatchResponse)
+async def cluster_create_batch(  # noqa: C901
+    request: Request,
+    group_service: Annotated[GroupService, Depends(get_group_service)],
+    cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    batch_request: ClusterBatchRequest,
+) -> ClusterBatchResponse:
+    settings = cluster_service.settings
+    if len(batch_request.clusters) > settings.cluster_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many clusters: {len(batch_request.clusters)}. Maximum: {settings.cluster_batch_max_size}.",
+        )
+
+    results: List[ClusterBatchResult | None] = [None] * len(batch_request.clusters)
+
+    def result_error(index: int, status_code: int, error) -> None:
+        name = batch_request.clusters[index].name
+        results[index] = ClusterBatchResult(name=name, status_code=status_code, error=error)
+
+    # validate all requests against the validation plan of their group, valid requests by group
+    plans: Dict[str, ValidationPlan] = {}
+    valid: Dict[str, List[Tuple[int, ClusterRequest, Parameters]]] = {}
+    for index, cluster_request in enumerate(batch_request.clusters):
+        try:
+            group = cluster_group(request=request, group_service=group_service, cluster_request=cluster_request)
+            if group not in plans:
+                plans[group] = await cluster_service.plan(group=group)
+            parameters = cluster_parameters(
+                cluster_service=cluster_service, cluster_request=cluster_request, plan=plans[group]
+            )
+        except HTTPException as e:
+            result_error(index, e.status_code, e.detail)
+            continue
+
+        valid.setdefault(group, []).append((index, cluster_request, parameters))
+
+    semaphore = asyncio.Semaphore(settings.cluster_batch_concurrency)
+
+    async def create(index: int, cluster_request: ClusterRequest, parameters: Parameters, reservation: Reservation):
+        async with semaphore:
+            try:
+                beiboot = await cluster_submit(
+                    cluster_service=cluster_service,
+                    user=request.state.user,
+                    cluster_request=cluster_request,
+                    parameters=parameters,
+                    reservation=reservation,
+                )
+            except BeibootException as e:
+                result_error(index, e.status_code, e.error)
+                return None
+            except Exception as e:
+                # reported for this item, the other creates of the batch go on
+                result_error(index, status.HTTP_500_INTERNAL_SERVER_ERROR, str(e))
+                return None
+
+        results[index] = ClusterBatchResult(
+            name=cluster_request.name,
+            status_code=status.HTTP_200_OK,
+            cluster=ClusterStateResponse(id=beiboot.name, name=beiboot.labels.get("name"), state=beiboot.state),
+        )
+
+    # one config read per group, before anything is created: a missing group config fails the items of its group
+    group_configs: Dict[str, GroupConfig] = {}
+    for group in list(valid):
+        try:
+            group_configs[group] = await group_service.get_config(name=group)
+        except ValueError as e:
+            for index, _, _ in valid.pop(group):
+                result_error(index, status.HTTP_500_INTERNAL_SERVER_ERROR, str(e))
+
+    # one quota reservation per group, concurrent creates
+    for group, items in valid.items():
+        try:
+            reservation = await cluster_reserve(
+                cluster_service=cluster_service,
+                user=request.state.user,
+                group=group,
+                group_config=group_configs[group],
+                count=len(items),
+            )
+        except HTTPException as e:
+            for index, _, _ in items:
+                result_error(index, e.status_code, e.detail)
+            continue
+
+        try:
+            await asyncio.gather(*[create(*item, reservation=reservation) for item in items])
+        finally:
+            cluster_service.quota.release(reservation)
+
+    return ClusterBatchResponse(items=results)
+
+
+def cluster_group(request: Request, group_service: GroupService, cluster_request: ClusterRequest) -> str:
     # validate group: TODO: move to ClusterRequest validator?
     if not cluster_request.group:
         group_selected = group_service.select(x_forwarded_groups=request.headers.get("x-forwarded-groups"))
@@ -198,127 +552,277 @@ async def cluster_create(  # noqa: C901
     if cluster_request.group not in available_groups:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid group: {cluster_request.group}. Available groups: {available_groups.join(', ')}.",
+            detail=f"Invalid group: {cluster_request.group}. Available groups: {', '.join(available_groups)}.",
         )
 
-    # validate group cluster limit
+    return cluster_request.group
+
+
+def cluster_parameters(
+    cluster_service: ClusterService, cluster_request: ClusterRequest, plan: ValidationPlan | None = None
+) -> Parameters:
     try:
-        labels = Labels(group=cluster_request.group)
-        beiboots = cluster_service.list(labels=labels)
-        beiboot_group_count = len(beiboots)
+        return cluster_service.validate(cluster_request=cluster_request, plan=plan)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=validation_errors(e))
+
+
+async def cluster_reserve(
+    cluster_service: ClusterService, user: str | None, group: str, group_config: GroupConfig, count: int = 1
+) -> Reservation:
+    try:
+        return await cluster_service.reserve(user=user, group=group, group_config=group_config, count=count)
+    except ClusterLimitException as e:
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=e.message)
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
-    group_config = group_service.get_config(name=cluster_request.group)
-    if not group_config.group_cluster_limit:
-        pass  # no group limit -> skip validation
-    else:
-        if beiboot_group_count >= group_config.group_cluster_limit:
-            raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="Group cluster limit reached.")
 
-    # validate user cluster limit
+async def cluster_check_quota(
+    cluster_service: ClusterService, user: str | None, group: str, group_config: GroupConfig
+) -> None:
     try:
-        labels = Labels(user=request.state.user)
-        beiboots = cluster_service.list(labels=labels)
-        beiboot_user_count = len(beiboots)
+        await cluster_service.check_quota(user=user, group=group, group_config=group_config)
+    except ClusterLimitException as e:
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=e.message)
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
-    if not group_config.user_cluster_limit:
-        pass  # no user limit -> skip validation
-    else:
-        if beiboot_user_count >= group_config.user_cluster_limit:
-            raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="User cluster limit reached.")
 
-    # create cluster
+async def cluster_submit(
+    cluster_service: ClusterService,
+    user: str | None,
+    cluster_request: ClusterRequest,
+    parameters: Parameters,
+    reservation: Reservation,
+) -> Beiboot:
     try:
-        beiboot = cluster_service.create(request=request, cluster_request=cluster_request)
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.errors())
+        beiboot = await cluster_service.submit(user=user, cluster_request=cluster_request, parameters=parameters)
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
-    response = ClusterStateResponse(id=beiboot.name, name=beiboot.labels.get("name"), state=beiboot.state)
-    return response
+    cluster_service.quota.commit(reservation, name=beiboot.name)
+    return beiboot
+
+
+def terminating_message(cluster_id: str) -> dict:
+    return {"event": "terminating", "id": cluster_id}
+
+
+@router.delete("/", response_model=ClusterBatchDeleteResponse)
+async def cluster_delete_batch(
+    request: Request,
+    cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    registry: Annotated[ConnectionRegistry, Depends(get_connection_registry)],
+    name: str | None = None,
+    delete_request: ClusterBatchDeleteRequest | None = None,
+) -> ClusterBatchDeleteResponse:
+    settings = cluster_service.settings
+    if name is None and delete_request is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Select the clusters to delete: 'name' or a list of ids."
+        )
+
+    cluster_ids = delete_request.ids if delete_request else None
+    if cluster_ids and len(cluster_ids) > settings.cluster_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many clusters: {len(cluster_ids)}. Maximum: {settings.cluster_batch_max_size}.",
+        )
+
+    # all targets at once, only clusters of the user
+    try:
+        labels = Labels(name=name, user=request.state.user)
+        beiboots = await cluster_service.resolve(cluster_ids=cluster_ids, labels=labels)
+    except BeibootException:
+        raise
+    except Exception as e:
+        raise BeibootException(message="Beiboot Error", error=str(e))
+
+    semaphore = asyncio.Semaphore(settings.cluster_batch_concurrency)
+
+    async def delete(cluster_id: str, beiboot: Beiboot | None) -> ClusterDeleteResult:
+        if not beiboot:
+            return ClusterDeleteResult(id=cluster_id, status_code=status.HTTP_404_NOT_FOUND, error="Cluster not found.")
+
+        async with semaphore:
+            try:
+                await cluster_service.remove(beiboot)
+            except RuntimeWarning as e:
+                return ClusterDeleteResult(id=cluster_id, status_code=status.HTTP_404_NOT_FOUND, error=str(e))
+            except BeibootException as e:
+                return ClusterDeleteResult(id=cluster_id, status_code=e.status_code, error=e.error)
+            except Exception as e:
+                return ClusterDeleteResult(
+                    id=cluster_id, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, error=str(e)
+                )
+
+        await registry.broadcast(cluster_id, message=terminating_message(cluster_id))
+        return ClusterDeleteResult(id=cluster_id, status_code=status.HTTP_202_ACCEPTED)
+
+    items = await asyncio.gather(*[delete(cluster_id, beiboot) for cluster_id, beiboot in beiboots.items()])
+    return ClusterBatchDeleteResponse(items=items)
 
 
 @router.delete("/{cluster_id}")
 async def cluster_delete(
-    request: Request, cluster_id: str, cluster_service: Annotated[ClusterService, Depends(get_cluster_service)]
+    request: Request,
+    cluster_id: str,
+    cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    registry: Annotated[ConnectionRegistry, Depends(get_connection_registry)],
 ) -> None:
     try:
         labels = Labels(user=request.state.user)
-        cluster_service.delete(cluster_id=cluster_id, labels=labels)
+        await cluster_service.delete(cluster_id=cluster_id, labels=labels)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cluster id unknown")
     except RuntimeWarning as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
+    # push to the heartbeat websockets of the cluster
+    await registry.broadcast(cluster_id, message=terminating_message(cluster_id))
     return Response(status_code=status.HTTP_202_ACCEPTED)
 
 
+@router.post("/heartbeat", response_model=ClusterHeartbeatResponse)
+async def cluster_heartbeat_batch(
+    request: Request,
+    cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    heartbeat_request: ClusterHeartbeatRequest,
+) -> ClusterHeartbeatResponse:
+    settings = cluster_service.settings
+    if len(heartbeat_request.ids) > settings.cluster_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many clusters: {len(heartbeat_request.ids)}. Maximum: {settings.cluster_batch_max_size}.",
+        )
+
+    # all clusters at once, only clusters of the user
+    try:
+        labels = Labels(user=request.state.user)
+        beiboots = await cluster_service.resolve(cluster_ids=heartbeat_request.ids, labels=labels)
+    except BeibootException:
+        raise
+    except Exception as e:
+        raise BeibootException(message="Beiboot Error", error=str(e))
+
+    items = []
+    for cluster_id, beiboot in beiboots.items():
+        if not beiboot:
+            items.append(
+                ClusterHeartbeatResult(id=cluster_id, status_code=status.HTTP_404_NOT_FOUND, error="Cluster not found.")
+            )
+            continue
+
+        # merged with the heartbeats of the other clients of the cluster, see HeartbeatAggregator
+        _ = cluster_service.write_heartbeat(client_id=request.state.user, beiboot=beiboot)
+        items.append(
+            ClusterHeartbeatResult(
+                id=cluster_id,
+                status_code=status.HTTP_200_OK,
+                cluster=ClusterStateResponse(id=beiboot.name, name=beiboot.labels.get("name"), state=beiboot.state),
+            )
+        )
+
+    return ClusterHeartbeatResponse(items=items)
+
+
 @router.post("/{cluster_id}/heartbeat", response_model=ClusterStateResponse)
 async def cluster_heartbeat(
     request: Request, cluster_id: str, cluster_service: Annotated[ClusterService, Depends(get_cluster_service)]
 ) -> ClusterStateResponse:
     try:
-        beiboot = cluster_service.get(cluster_id=cluster_id)
+        beiboot = await cluster_service.get(cluster_id=cluster_id)
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
     if not beiboot:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cluster not found.")
 
-    _ = api.write_heartbeat(
-        client_id=request.state.user,
-        bbt=beiboot,
-    )
+    _ = cluster_service.write_heartbeat(client_id=request.state.user, beiboot=beiboot)
 
     response = ClusterStateResponse(id=beiboot.name, name=beiboot.labels.get("name"), state=beiboot.state)
     return response
 
 
 @router.websocket("/{cluster_id}/heartbeat")
-async def websocket_endpoint(
-    websocket: WebSocket, cluster_id: str, cluster_service: Annotated[ClusterService, Depends(get_cluster_service)]
+async def websocket_endpoint(  # noqa: C901
+    websocket: WebSocket,
+    cluster_id: str,
+    cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    registry: Annotated[ConnectionRegistry, Depends(get_connection_registry)],
 ):
-    x_forwarded_user = websocket.headers.get("X-Forwarded-User") or "unknown"
-
-    await manager.connect(websocket)
-    logger.info(
-        f"{datetime.now().isoformat()} - Websocket connection opened (cluster: '{cluster_id}', client: '{x_forwarded_user}')."
-    )
+    user = websocket.headers.get("X-Forwarded-User")
+    x_forwarded_user = user or "unknown"
 
     try:
-        labels = Labels(user=websocket.state.user)
-        beiboot = cluster_service.get(cluster_id=cluster_id, labels=labels)
-    except RuntimeError:
-        manager.disconnect(websocket)
-        raise Exception("Invalid 'cluster_id'.")
+        labels = Labels(user=user)
+        beiboot = await cluster_service.get(cluster_id=cluster_id, labels=labels)
+    except Exception as e:
+        logger.error(f"Websocket: cannot read cluster '{cluster_id}': {e}")
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        return None
 
     if not beiboot:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cluster not found.")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Cluster not found.")
+        return None
+
+    try:
+        connection = registry.connect(websocket=websocket, cluster_id=cluster_id, user=user)
+    except ConnectionLimitException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.message)
+        return None
 
+    probe_seconds = cluster_service.settings.websocket_probe_seconds
     try:
-        while True:
-            # probe websocket connection
+        # registered before the accept (the limit is checked before the handshake), a failed accept disconnects, too
+        await websocket.accept()
+        logger.info(
+            f"{datetime.now().isoformat()} - Websocket connection opened (cluster: '{cluster_id}', client: '{x_forwarded_user}')."
+        )
+
+        while websocket.application_state == WebSocketState.CONNECTED:
+            # probe websocket connection (ping/pong frames: websocket_ping_interval_seconds)
             try:
-                _ = await asyncio.wait_for(websocket.receive_text(), 5)
+                _ = await asyncio.wait_for(websocket.receive_text(), probe_seconds)
             except asyncio.TimeoutError:
                 pass
 
-            # write heartbeat
-            _ = api.write_heartbeat(
-                client_id=x_forwarded_user,
-                bbt=beiboot,
-            )
+            # current state of the cluster from the store (or the coalesced listing)
+            try:
+                beiboot = await cluster_service.get(cluster_id=cluster_id, labels=labels)
+            except Exception as e:
+                # keep the last known state, the heartbeat of the client must not get lost
+                logger.warning(f"Websocket: cannot refresh cluster '{cluster_id}': {e}")
+            else:
+                if not beiboot:
+                    await websocket.close(code=WS_CLOSE_CLUSTER_NOT_FOUND, reason="Cluster not found.")
+                    break
+                if beiboot.state == BeibootState.TERMINATING:
+                    await websocket.close(code=WS_CLOSE_CLUSTER_TERMINATING, reason="Cluster terminating.")
+                    break
+
+            # write heartbeat (with the next flush of the heartbeat aggregator)
+            _ = cluster_service.write_heartbeat(client_id=user, beiboot=beiboot)
             logger.debug(
                 f"{datetime.now().isoformat()} - Websocket <3 (cluster: '{cluster_id}', client: '{x_forwarded_user}')."
             )
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        registry.disconnect(connection)
         logger.info(
             f"{datetime.now().isoformat()} - Websocket connection closed (cluster: '{cluster_id}', client: '{x_forwarded_user}')."
         )
@@ -330,7 +834,9 @@ async def cluster_kubeconfig(
 ):
     try:
         labels = Labels(user=request.state.user)
-        beiboot = cluster_service.get(cluster_id=cluster_id, labels=labels)
+        beiboot = await cluster_service.get(cluster_id=cluster_id, labels=labels)
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
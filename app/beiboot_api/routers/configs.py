@@ -3,7 +3,9 @@ from typing import Annotated
 
 from config.service import ConfigService, get_cluster_config_service
 from config.types import ConfigInfoResponse
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from etag import etag_matches, make_etag, not_modified
+from exceptions import BeibootException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from group.service import GroupService, get_group_service
 from headers import user_headers
 from settings import Settings, get_settings
@@ -16,6 +18,7 @@ router = APIRouter(prefix="/configs", tags=["configs"], dependencies=[Depends(us
 @router.get("/selected/")
 async def config_selected(
     request: Request,
+    response: Response,
     settings: Annotated[Settings, Depends(get_settings)],
     group_service: Annotated[GroupService, Depends(get_group_service)],
     config_service: Annotated[ConfigService, Depends(get_cluster_config_service)],
@@ -24,8 +27,9 @@ async def config_selected(
 
     for name in [group_selected, settings.config_default_name]:
         try:
-            response = await config_custom(request=request, name=name, settings=settings, config_service=config_service)
-            return response
+            return await config_custom(
+                request=request, response=response, name=name, settings=settings, config_service=config_service
+            )
         except Exception:
             pass
     else:
@@ -35,18 +39,23 @@ async def config_selected(
 @router.get("/default/")
 async def config_default(
     request: Request,
+    response: Response,
     settings: Annotated[Settings, Depends(get_settings)],
     config_service: Annotated[ConfigService, Depends(get_cluster_config_service)],
 ) -> ConfigInfoResponse:
-    response = await config_custom(
-        request=request, name=settings.config_default_name, settings=settings, config_service=config_service
+    return await config_custom(
+        request=request,
+        response=response,
+        name=settings.config_default_name,
+        settings=settings,
+        config_service=config_service,
     )
-    return response
 
 
 @router.get("/{name}/")
 async def config_custom(
     request: Request,
+    response: Response,
     name: str,
     settings: Annotated[Settings, Depends(get_settings)],
     config_service: Annotated[ConfigService, Depends(get_cluster_config_service)],
@@ -55,15 +64,23 @@ async def config_custom(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
     try:
-        cc = config_service.get(prefix=settings.config_prefix, name=name, namespace=settings.config_default_namespace)
+        cc, resource_version = await config_service.get_with_version(
+            prefix=settings.config_prefix, name=name, namespace=settings.config_default_namespace
+        )
     except ValueError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    except BeibootException:
+        raise
     except Exception:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    response = ConfigInfoResponse(
+    etag = make_etag(name, resource_version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    return ConfigInfoResponse(
         default=False,
         name=name,
         config=cc,
     )
-    return response
@@ -20,7 +20,7 @@ class GhostunnelPort(BaseModel):
 
 class GhostunnelResponse(BaseModel):
     mtls: dict
-    ports: List[GhostunnelPort] | None
+    ports: List[GhostunnelPort] | None = None
 
 
 @router.get("/{cluster_id}/ghostunnel/", response_model=GhostunnelResponse)
@@ -29,7 +29,9 @@ async def ghostunnel(
 ):
     try:
         labels = Labels(user=request.state.user)
-        beiboot = handler.get(cluster_id=cluster_id, labels=labels)
+        beiboot = await handler.get(cluster_id=cluster_id, labels=labels)
+    except BeibootException:
+        raise
     except Exception as e:
         raise BeibootException(message="Beiboot Error", error=str(e))
 
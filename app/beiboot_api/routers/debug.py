@@ -1,7 +1,18 @@
 import logging
 
+from cluster.heartbeat import get_heartbeat_aggregator
+from cluster.plan import get_validation_plans
+from cluster.pool import get_cluster_pool
+from cluster.quota import get_quota_tracker
+from cluster.registry import get_connection_registry
+from cluster.shards import get_replica_set
+from cluster.store import get_cluster_store
+from coalescer import get_coalescer
+from executor import get_k8s_executor
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
+from idempotency import get_idempotency_cache
+from operation.service import get_operation_queue
 
 logger = logging.getLogger("uvicorn.beiboot")
 
@@ -33,3 +44,23 @@ async def get_headers(request: Request) -> JSONResponse:
 @router.get("/sentry")
 async def trigger_error():
     _ = 1 / 0
+
+
+@router.get("/stats")
+async def get_stats() -> JSONResponse:
+    response = JSONResponse(
+        content={
+            "cluster_store": get_cluster_store().stats(),
+            "cluster_quota": get_quota_tracker().stats(),
+            "cluster_pool": get_cluster_pool().stats(),
+            "validation_plans": get_validation_plans().stats(),
+            "k8s_executor": get_k8s_executor().stats(),
+            "k8s_coalescer": get_coalescer().stats(),
+            "operations": get_operation_queue().stats(),
+            "idempotency": get_idempotency_cache().stats(),
+            "heartbeats": get_heartbeat_aggregator().stats(),
+            "websockets": get_connection_registry().stats(),
+            "replicas": get_replica_set().stats(),
+        }
+    )
+    return response
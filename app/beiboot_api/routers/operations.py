@@ -0,0 +1,62 @@
+import logging
+import time
+from typing import Annotated
+
+from beiboot.types import BeibootState
+from cluster.service import ClusterService, get_cluster_service
+from cluster.types import ClusterStateResponse, Labels
+from exceptions import BeibootException
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from headers import user_headers
+from operation.service import OperationQueue, get_operation_queue
+from operation.types import OperationResponse
+
+logger = logging.getLogger("uvicorn.beiboot")
+
+router = APIRouter(prefix="/operations", tags=["operations"], dependencies=[Depends(user_headers)])
+
+
+@router.get("/{operation_id}", response_model=OperationResponse)
+async def operation_info(
+    request: Request,
+    operation_id: str,
+    operations: Annotated[OperationQueue, Depends(get_operation_queue)],
+    cluster_service: Annotated[ClusterService, Depends(get_cluster_service)],
+    wait: float = 0,
+    state: BeibootState | None = None,
+) -> OperationResponse:
+    """
+    State of an operation. With 'wait' (seconds) the request is held until the operation finished and, with 'state',
+    until the created cluster reached this state (or ERROR/TERMINATING).
+    """
+    operation = operations.get(operation_id=operation_id, user=request.state.user)
+    if not operation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Operation not found.")
+
+    timeout = min(max(wait, 0), operations.settings.operations_wait_max_seconds)
+    deadline = time.monotonic() + timeout
+    await operations.wait(operation, timeout=timeout)
+
+    beiboot = operation.beiboot
+    if beiboot:
+        # progress: current state of the created cluster (the state at creation until it is listed)
+        labels = Labels(user=request.state.user)
+        try:
+            if state:
+                beiboot = await cluster_service.wait_for_state(
+                    cluster_id=operation.beiboot.name,
+                    states=[state, BeibootState.ERROR, BeibootState.TERMINATING],
+                    timeout=max(deadline - time.monotonic(), 0),
+                    labels=labels,
+                )
+            else:
+                beiboot = await cluster_service.get(cluster_id=operation.beiboot.name, labels=labels)
+        except BeibootException:
+            raise
+        except Exception as e:
+            raise BeibootException(message="Beiboot Error", error=str(e))
+        beiboot = beiboot or operation.beiboot
+
+    return OperationResponse.from_operation(
+        operation, cluster=ClusterStateResponse.from_beiboot(beiboot) if beiboot else None
+    )
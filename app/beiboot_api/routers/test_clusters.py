@@ -0,0 +1,279 @@
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from cluster.heartbeat import HeartbeatAggregator
+from cluster.plan import ValidationPlans
+from cluster.pool import ClusterPool
+from cluster.quota import QuotaTracker
+from cluster.registry import ConnectionRegistry, get_connection_registry
+from cluster.service import ClusterService, get_cluster_service
+from cluster.store import BeibootStore
+from cluster.test_cluster_service import FakeBackend
+from cluster.test_store import beiboot_object
+from coalescer import SingleFlight
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+from group.service import GroupService, get_group_service
+from group.types import GroupConfig
+from kubernetes.client.rest import ApiException
+from main import app
+from operation.service import OperationQueue, get_operation_queue
+from operation.types import OperationState
+from routers.clusters import websocket_endpoint
+from settings import Settings
+
+
+class FakeConfigBackend(FakeBackend):
+    def __init__(self, fail: set | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = fail or set()
+        self.reads = 0
+
+    async def create_beiboot(self, req):
+        if req.labels.get("name") in self.fail:
+            raise RuntimeError("Cannot create Beiboot")
+        return await super().create_beiboot(req)
+
+    async def read_config_map(self, name, namespace, timeout=None):
+        self.reads += 1
+        raise ApiException(status=404, reason="Not Found")
+
+
+class FakeGroupService(GroupService):
+    def __init__(self, settings: Settings, configs: dict):
+        super().__init__(settings=settings, backend=FakeConfigBackend(), coalescer=SingleFlight())
+        self.configs = configs
+
+    async def get_config(self, prefix=None, name=None, namespace=None) -> GroupConfig:
+        if name not in self.configs:
+            raise ValueError(f"ConfigMap {name} not found in namespace getdeck")
+        return self.configs[name]
+
+
+def cluster_service(
+    backend: FakeBackend, items: list | None = None, settings: Settings | None = None
+) -> ClusterService:
+    settings = settings or Settings()
+    store = BeibootStore(settings=settings)
+    store.replace(items=items or [], resource_version="1")
+    store._synced.set()
+    return ClusterService(
+        settings=settings,
+        store=store,
+        backend=backend,
+        coalescer=SingleFlight(),
+        quota=QuotaTracker(settings=settings, store=store),
+        pool=ClusterPool(settings=settings, store=store),
+        plans=ValidationPlans(settings=settings),
+        heartbeats=HeartbeatAggregator(settings=settings),
+    )
+
+
+class ClusterRouterTest(TestCase):
+    def setUp(self):
+        self.backend = FakeConfigBackend()
+        self.service = cluster_service(self.backend)
+        self.groups = FakeGroupService(settings=self.service.settings, configs={"free": GroupConfig()})
+        app.dependency_overrides[get_cluster_service] = lambda: self.service
+        app.dependency_overrides[get_group_service] = lambda: self.groups
+        self.addCleanup(app.dependency_overrides.clear)
+        self.client = TestClient(app, headers={"X-Forwarded-User": "john"})
+
+    def test_create_batch(self):
+        self.backend.fail = {"c"}
+        response = self.client.post(
+            "/clusters/batch",
+            json={
+                "clusters": [
+                    {"name": "a", "group": "free"},
+                    {"name": "b", "group": "developer"},
+                    {"name": "c", "group": "free"},
+                    {"name": "d", "group": "free"},
+                ]
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        items = response.json()["items"]
+        self.assertEqual([item["status_code"] for item in items], [200, 500, 500, 200])
+        # the missing config of a group fails its items only, nothing is orphaned
+        self.assertIn("ConfigMap developer not found", items[1]["error"])
+        self.assertEqual(sorted(self.backend.names), sorted([items[0]["cluster"]["id"], items[3]["cluster"]["id"]]))
+
+    def test_create_async(self):
+        self.groups.configs["free"] = GroupConfig(user_cluster_limit=1)
+        # no workers: the operations stay queued until they are run by the test
+        operations = OperationQueue(settings=Settings(operations_workers=0))
+        app.dependency_overrides[get_operation_queue] = lambda: operations
+        headers = {"Prefer": "respond-async"}
+
+        responses = [
+            self.client.post("/clusters/", json={"name": name, "group": "free"}, headers=headers) for name in "ab"
+        ]
+        self.assertEqual([response.status_code for response in responses], [202, 202])
+        # queued operations hold no reservation (which could expire before they run)
+        self.assertEqual(self.service.quota.stats()["reservations"], 0)
+
+        queued = [operations.get(response.json()["id"]) for response in responses]
+        for operation in queued:
+            asyncio.run(operations._run(operation))
+        self.assertEqual([operation.state for operation in queued], [OperationState.SUCCEEDED, OperationState.FAILED])
+        self.assertEqual((queued[1].status_code, queued[1].error), (402, "User cluster limit reached."))
+
+        # limit reached: rejected without an operation
+        response = self.client.post("/clusters/", json={"name": "c", "group": "free"}, headers=headers)
+        self.assertEqual(response.status_code, 402)
+
+    def test_validate(self):
+        parameters = [{"name": "NODE_COUNT", "value": 2}]
+        for _ in range(3):
+            response = self.client.post(
+                "/clusters/validate", json={"name": "a", "group": "free", "parameters": parameters}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()["valid"])
+        # the validation plan of the group is looked up once (group + default ConfigMap)
+        self.assertEqual(self.backend.reads, 2)
+
+    def test_validate_group_config(self):
+        response = self.client.post("/clusters/validate", json={"name": "a", "group": "developer"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["valid"])
+        self.assertEqual([error["type"] for error in response.json()["errors"]], ["group"])
+
+    def test_heartbeat_batch(self):
+        self.service.store.replace(
+            items=[beiboot_object("c1"), beiboot_object("c2", user="jane")], resource_version="2"
+        )
+
+        response = self.client.post("/clusters/heartbeat", json={"ids": ["c1", "c2", "c3"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["status_code"] for item in response.json()["items"]], [200, 404, 404])
+        # only the cluster of the user got a heartbeat
+        self.assertEqual(
+            {name: set(heartbeats) for name, (_, heartbeats) in self.service.heartbeats._pending.items()},
+            {"c1": {"john"}},
+        )
+
+    def test_heartbeat_anonymous(self):
+        self.service.store.replace(items=[beiboot_object("c1")], resource_version="2")
+        client = TestClient(app)
+
+        self.assertEqual(client.post("/clusters/heartbeat", json={"ids": ["c1"]}).status_code, 200)
+        self.assertEqual(client.post("/clusters/c1/heartbeat").status_code, 200)
+        # both endpoints record the same client id
+        _, heartbeats = self.service.heartbeats._pending["c1"]
+        self.assertEqual((list(heartbeats), self.service.heartbeats.received), (["unknown"], 2))
+
+
+def wait_for(predicate, timeout: float = 2) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class WebsocketRouterTest(TestCase):
+    def setUp(self):
+        self.service = cluster_service(
+            FakeBackend(), items=[beiboot_object("c1")], settings=Settings(websocket_probe_seconds=0.01)
+        )
+        self.registry = ConnectionRegistry(settings=self.service.settings)
+        app.dependency_overrides[get_cluster_service] = lambda: self.service
+        app.dependency_overrides[get_connection_registry] = lambda: self.registry
+        self.addCleanup(app.dependency_overrides.clear)
+        self.client = TestClient(app, headers={"X-Forwarded-User": "john"})
+
+    def heartbeats(self) -> int:
+        return self.service.heartbeats.received
+
+    def test_not_found(self):
+        with self.assertRaises(WebSocketDisconnect) as cm:
+            with self.client.websocket_connect("/clusters/c2/heartbeat"):
+                pass
+        self.assertEqual(cm.exception.code, 1008)
+
+        # clusters of other users are not found either
+        self.service.store.replace(items=[beiboot_object("c1", user="jane")], resource_version="2")
+        with self.assertRaises(WebSocketDisconnect) as cm:
+            with self.client.websocket_connect("/clusters/c1/heartbeat"):
+                pass
+        self.assertEqual(cm.exception.code, 1008)
+
+    def test_deleted(self):
+        with self.client.websocket_connect("/clusters/c1/heartbeat") as websocket:
+            self.assertTrue(wait_for(lambda: self.heartbeats() > 0))
+            self.service.store.replace(items=[], resource_version="2")
+            self.assertEqual(websocket.receive()["code"], 4404)
+
+        self.assertEqual(self.registry.count(), 0)
+
+    def test_terminating(self):
+        with self.client.websocket_connect("/clusters/c1/heartbeat") as websocket:
+            self.service.store.replace(items=[beiboot_object("c1", state="TERMINATING")], resource_version="2")
+            self.assertEqual(websocket.receive()["code"], 4410)
+
+        self.assertEqual(self.registry.count(), 0)
+
+    def test_refresh_failure(self):
+        get = self.service.get
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError("API error")
+
+        with self.client.websocket_connect("/clusters/c1/heartbeat") as websocket:
+            self.service.get = fail
+            received = self.heartbeats()
+            # the heartbeats are written with the last known state of the cluster
+            self.assertTrue(wait_for(lambda: self.heartbeats() > received + 2))
+            self.assertEqual(self.registry.count(), 1)
+
+            self.service.get = get
+            self.service.store.replace(items=[], resource_version="2")
+            self.assertEqual(websocket.receive()["code"], 4404)
+
+    def test_closed_by_server(self):
+        with self.assertLogs("uvicorn.beiboot", level="INFO") as cm:
+            with self.client.websocket_connect("/clusters/c1/heartbeat") as websocket:
+                self.assertTrue(wait_for(lambda: self.heartbeats() > 0))
+                websocket.portal.call(self.registry.close, "c1", 4410)
+                self.assertEqual(websocket.receive()["code"], 4410)
+
+                # the endpoint leaves its loop without a message or disconnect of the client
+                self.assertTrue(wait_for(lambda: any("connection closed" in line for line in cm.output)))
+                received = self.heartbeats()
+                time.sleep(0.05)
+                self.assertEqual(self.heartbeats(), received)
+
+
+class FakeWebSocket:
+    def __init__(self, headers: dict):
+        self.headers = headers
+        self.closed = None
+
+    async def accept(self):
+        raise RuntimeError("handshake failed")
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        self.closed = code
+
+
+class WebsocketEndpointTest(IsolatedAsyncioTestCase):
+    async def test_accept_failure(self):
+        service = cluster_service(FakeBackend(), items=[beiboot_object("c1")])
+        registry = ConnectionRegistry(settings=service.settings)
+
+        with self.assertRaises(RuntimeError):
+            await websocket_endpoint(
+                websocket=FakeWebSocket(headers={"X-Forwarded-User": "john"}),
+                cluster_id="c1",
+                cluster_service=service,
+                registry=registry,
+            )
+        # a failed handshake does not leak its registration
+        self.assertEqual(registry.stats()["connections"], 0)
@@ -1,15 +1,19 @@
+import socket
 from functools import lru_cache
 
 from config.types import Config
-from pydantic import BaseSettings
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings, Config):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
     k8s_config_file: str = "./kubeconfig.yaml"
 
     # sentry
-    sentry_dsn: str | None
-    sentry_environment: str | None
+    sentry_dsn: str | None = None
+    sentry_environment: str | None = None
 
     # config
     config_prefix: str = "api-config-"
@@ -25,8 +29,77 @@ class Settings(BaseSettings, Config):
     # user
     user_cluster_limit: int = 1
 
-    class Config:
-        env_file = ".env"
+    # kubernetes executor
+    k8s_executor_workers: int = 16
+    k8s_executor_queue_size: int = 64
+    k8s_executor_timeout_seconds: float = 10
+
+    # coalescing of identical kubernetes reads
+    k8s_coalesce_window_seconds: float = 1
+
+    # asyncio kubernetes client (requires kubernetes_asyncio)
+    k8s_asyncio_enabled: bool = False
+    k8s_asyncio_pool_size: int = 100
+
+    # cluster store
+    cluster_store_enabled: bool = True
+    cluster_store_resync_seconds: int = 300
+    cluster_store_watch_timeout_seconds: int = 60
+    cluster_store_retry_seconds: int = 5
+    cluster_store_changelog_size: int = 1000
+
+    # cluster quota: reservations of creates not yet visible in the store
+    cluster_quota_reservation_seconds: int = 60
+
+    # memoized dry-run validations (POST /clusters/validate) per validation plan
+    cluster_validation_cache_size: int = 1024
+    # validation plan of a group: ConfigMaps are read again after this time (0: on every request)
+    cluster_validation_plan_ttl_seconds: float = 30
+
+    # batch cluster creation
+    cluster_batch_max_size: int = 50
+    cluster_batch_concurrency: int = 8
+
+    # warm pool of clusters (pool size per group: POOL_SIZE in the group ConfigMap)
+    cluster_pool_enabled: bool = False
+    cluster_pool_refill_seconds: int = 30
+
+    # operations (asynchronous cluster creation)
+    operations_workers: int = 4
+    operations_queue_size: int = 100
+    operations_ttl_seconds: int = 3600
+    operations_wait_max_seconds: int = 60
+
+    # idempotent cluster creation (Idempotency-Key header)
+    idempotency_cache_size: int = 10000
+    idempotency_ttl_seconds: int = 86400
+
+    # cluster events (server-sent events)
+    cluster_events_queue_size: int = 100
+    cluster_events_keepalive_seconds: int = 15
+
+    # websocket connections (heartbeats), 0: no limit
+    websocket_user_connection_limit: int = 100
+    websocket_probe_seconds: float = 5
+    # ping/pong frames of the server (python main.py), keep idle websockets alive and detect dead clients
+    websocket_ping_interval_seconds: float = 20
+    websocket_ping_timeout_seconds: float = 20
+
+    # client heartbeats: one merged write per cluster and flush interval
+    heartbeat_flush_seconds: float = 5
+    heartbeat_flush_concurrency: int = 8
+    # minimum interval between written heartbeats of a client: fraction of maxSessionTimeout of the cluster (0: off)
+    heartbeat_min_interval_ratio: float = 0.1
+
+    # sharding of heartbeat writes across API replicas (requires the cluster store), replica state backend:
+    # "memory" (single replica), "file" (a directory shared by all replicas) or "configmap" (one ConfigMap per replica)
+    pod_name: str = Field(default_factory=socket.gethostname)
+    sharding_enabled: bool = False
+    sharding_backend: str = "memory"
+    sharding_file_path: str = "/var/run/beiboot/replicas"
+    sharding_namespace: str = "getdeck"
+    sharding_replica_ttl_seconds: float = 30
+    sharding_virtual_nodes: int = 64
 
 
 @lru_cache()
@@ -0,0 +1,243 @@
+import json
+from datetime import datetime
+from unittest import IsolatedAsyncioTestCase, TestCase, skipIf
+
+from backend import (
+    AsyncioBackend,
+    ExecutorBackend,
+    KubernetesBackend,
+    create_error,
+    get_asyncio_backend,
+    get_kubernetes_backend,
+    k8s_asyncio,
+    patch_error,
+)
+from beiboot.types import BeibootRequest, BeibootState
+from cluster.store import StoredBeiboot
+from cluster.test_store import beiboot_object
+from exceptions import ClusterConflictException, ClusterExistsException
+from kubernetes.client.rest import ApiException
+from settings import Settings
+
+
+class FakeKubernetesBackend(KubernetesBackend):
+    """Every call fails like an unreachable API server, the fakes of the tests override the calls they use."""
+
+    async def list_beiboots(self, labels):
+        raise RuntimeError("Kubernetes API not available")
+
+    async def create_beiboot(self, req):
+        raise RuntimeError("Kubernetes API not available")
+
+    async def delete_beiboot(self, name):
+        raise RuntimeError("Kubernetes API not available")
+
+    async def patch_beiboot_labels(self, name, labels, resource_version=None):
+        raise RuntimeError("Kubernetes API not available")
+
+    async def write_heartbeats(self, beiboot, heartbeats):
+        raise RuntimeError("Kubernetes API not available")
+
+    async def read_config_map(self, name, namespace, timeout=None):
+        raise ApiException(status=503, reason="Service Unavailable")
+
+    async def list_config_maps(self, namespace, labels):
+        raise ApiException(status=503, reason="Service Unavailable")
+
+    async def apply_config_map(self, name, namespace, labels, data):
+        raise ApiException(status=503, reason="Service Unavailable")
+
+    async def delete_config_map(self, name, namespace):
+        raise ApiException(status=503, reason="Service Unavailable")
+
+
+class KubernetesBackendTest(TestCase):
+    def test_abstract(self):
+        class IncompleteBackend(KubernetesBackend):
+            async def list_beiboots(self, labels):
+                return []
+
+        # fails with the creation, not with the first call of a missing method
+        with self.assertRaises(TypeError):
+            IncompleteBackend()
+
+    def test_fallback(self):
+        self.assertFalse(get_asyncio_backend().ready)
+        self.assertIsInstance(get_kubernetes_backend(), ExecutorBackend)
+
+    def test_create_error(self):
+        req = BeibootRequest(name="hello")
+
+        self.assertIsInstance(create_error(req=req, status=409, reason="Conflict"), ClusterExistsException)
+        self.assertNotIsInstance(create_error(req=req, status=500, reason="Error"), ClusterExistsException)
+
+    def test_patch_error(self):
+        self.assertIsInstance(patch_error(name="c1", status=409, reason="Conflict"), ClusterConflictException)
+        self.assertNotIsInstance(patch_error(name="c1", status=415, reason="Error"), ClusterConflictException)
+
+
+class FakeResponse:
+    def __init__(self, status: int, data):
+        self.status = status
+        self.reason = "OK"
+        self.data = json.dumps(data).encode()
+
+    def getheader(self, name, default=None):
+        return "application/json" if name.lower() == "content-type" else default
+
+    def getheaders(self):
+        return {"Content-Type": "application/json"}
+
+
+def fake_api_client(responses: dict):
+    # the generated API classes of kubernetes_asyncio on an ApiClient without HTTP: (method, path) -> status, data
+    class FakeApiClient(k8s_asyncio.client.ApiClient):
+        def __init__(self):
+            super().__init__(configuration=k8s_asyncio.client.Configuration(host="https://kubernetes"))
+            self.requests = []
+
+        async def request(self, method, url, query_params=None, headers=None, body=None, **kwargs):
+            path = url.removeprefix(self.configuration.host)
+            self.requests.append((method, path, dict(query_params or []), body, headers))
+            status, data = responses[(method, path)]
+            if status >= 400:
+                e = k8s_asyncio.client.ApiException(status=status, reason=data)
+                e.body = b""
+                raise e
+            return FakeResponse(status, data)
+
+    return FakeApiClient()
+
+
+BEIBOOTS = "/apis/getdeck.dev/v1/namespaces/getdeck/beiboots"
+
+
+@skipIf(k8s_asyncio is None, "kubernetes_asyncio is not installed (extra: asyncio)")
+class AsyncioBackendTest(IsolatedAsyncioTestCase):
+    async def backend(self, responses: dict) -> AsyncioBackend:
+        backend = AsyncioBackend(settings=Settings())
+        backend._api_client = fake_api_client(responses)
+        self.addAsyncCleanup(backend.close)
+        return backend
+
+    async def test_list_beiboots(self):
+        backend = await self.backend(
+            {("GET", BEIBOOTS): (200, {"items": [beiboot_object("c1"), beiboot_object("c2", state="PENDING")]})}
+        )
+
+        beiboots = await backend.list_beiboots(labels={"user": "john", "group": "default"})
+        self.assertEqual(
+            [(bbt.name, bbt.state) for bbt in beiboots], [("c1", BeibootState.READY), ("c2", BeibootState.PENDING)]
+        )
+        self.assertEqual(backend._api_client.requests[0][2], {"labelSelector": "user=john,group=default"})
+
+    async def test_list_beiboots_error(self):
+        backend = await self.backend({("GET", BEIBOOTS): (404, "Not Found")})
+
+        with self.assertRaises(RuntimeError):
+            await backend.list_beiboots(labels={})
+
+    async def test_create_beiboot(self):
+        backend = await self.backend({("POST", BEIBOOTS): (201, beiboot_object("c1", state="REQUESTED"))})
+
+        beiboot = await backend.create_beiboot(BeibootRequest(name="c1", labels={"user": "john"}))
+        self.assertIsInstance(beiboot, StoredBeiboot)
+        self.assertEqual(beiboot.name, "c1")
+        _, _, _, body, _ = backend._api_client.requests[0]
+        self.assertEqual((body["metadata"]["name"], body["metadata"]["labels"]["user"]), ("c1", "john"))
+
+    async def test_create_beiboot_exists(self):
+        backend = await self.backend({("POST", BEIBOOTS): (409, "Conflict")})
+
+        with self.assertRaises(ClusterExistsException):
+            await backend.create_beiboot(BeibootRequest(name="c1"))
+
+    async def test_delete_beiboot(self):
+        backend = await self.backend(
+            {("DELETE", f"{BEIBOOTS}/c1"): (200, {}), ("DELETE", f"{BEIBOOTS}/c2"): (404, "Not Found")}
+        )
+
+        await backend.delete_beiboot(name="c1")
+        self.assertEqual(backend._api_client.requests[0][:2], ("DELETE", f"{BEIBOOTS}/c1"))
+        with self.assertRaises(RuntimeWarning):
+            await backend.delete_beiboot(name="c2")
+
+    async def test_patch_beiboot_labels(self):
+        backend = await self.backend(
+            {("PATCH", f"{BEIBOOTS}/c1"): (200, beiboot_object("c1")), ("PATCH", f"{BEIBOOTS}/c2"): (409, "Conflict")}
+        )
+
+        beiboot = await backend.patch_beiboot_labels(name="c1", labels={"pool": None}, resource_version="1")
+        self.assertEqual(beiboot.name, "c1")
+        _, _, _, body, headers = backend._api_client.requests[0]
+        self.assertEqual(body, {"metadata": {"labels": {"pool": None}, "resourceVersion": "1"}})
+        # custom resources do not support strategic merge patches
+        self.assertEqual(headers["Content-Type"], "application/merge-patch+json")
+
+        with self.assertRaises(ClusterConflictException):
+            await backend.patch_beiboot_labels(name="c2", labels={"pool": None}, resource_version="1")
+
+    async def test_write_heartbeats(self):
+        path = "/api/v1/namespaces/getdeck-bbt-c1/configmaps/beiboot-clients"
+        backend = await self.backend({("PATCH", path): (200, {})})
+        now = datetime.utcnow()
+
+        await backend.write_heartbeats(beiboot=StoredBeiboot(beiboot_object("c1")), heartbeats={"john": now})
+        self.assertEqual(backend._api_client.requests[0][3], {"data": {"john": now.isoformat()}})
+
+    async def test_read_config_map(self):
+        path = "/api/v1/namespaces/getdeck/configmaps"
+        backend = await self.backend(
+            {
+                ("GET", f"{path}/api-config-default"): (
+                    200,
+                    {"metadata": {"name": "api-config-default", "resourceVersion": "7"}, "data": {"NODE_COUNT": "2"}},
+                ),
+                ("GET", f"{path}/api-config-missing"): (404, "Not Found"),
+            }
+        )
+
+        config_map = await backend.read_config_map(name="api-config-default", namespace="getdeck")
+        self.assertEqual((config_map.metadata.resource_version, config_map.data), ("7", {"NODE_COUNT": "2"}))
+        # same error type as the executor backend
+        with self.assertRaises(ApiException) as cm:
+            await backend.read_config_map(name="api-config-missing", namespace="getdeck")
+        self.assertEqual(cm.exception.status, 404)
+
+    async def test_apply_config_map(self):
+        path = "/api/v1/namespaces/getdeck/configmaps"
+        backend = await self.backend(
+            {
+                ("PUT", f"{path}/api-replica-api-0"): (200, {}),
+                ("PUT", f"{path}/api-replica-api-1"): (404, "Not Found"),
+                ("POST", path): (201, {}),
+            }
+        )
+
+        await backend.apply_config_map(name="api-replica-api-0", namespace="getdeck", labels={}, data={"state": "{}"})
+        # created if it does not exist
+        await backend.apply_config_map(name="api-replica-api-1", namespace="getdeck", labels={}, data={"state": "{}"})
+        self.assertEqual(
+            [request[:2] for request in backend._api_client.requests],
+            [("PUT", f"{path}/api-replica-api-0"), ("PUT", f"{path}/api-replica-api-1"), ("POST", path)],
+        )
+        self.assertEqual(backend._api_client.requests[2][3]["data"], {"state": "{}"})
+
+    async def test_list_delete_config_maps(self):
+        path = "/api/v1/namespaces/getdeck/configmaps"
+        backend = await self.backend(
+            {
+                ("GET", path): (200, {"items": [{"metadata": {"name": "api-replica-api-0"}, "data": {"state": "{}"}}]}),
+                ("DELETE", f"{path}/api-replica-api-0"): (200, {}),
+                ("DELETE", f"{path}/api-replica-api-1"): (404, "Not Found"),
+            }
+        )
+
+        config_maps = await backend.list_config_maps(namespace="getdeck", labels={"app": "api-replica"})
+        self.assertEqual([config_map.data for config_map in config_maps], [{"state": "{}"}])
+        self.assertEqual(backend._api_client.requests[0][2], {"labelSelector": "app=api-replica"})
+
+        await backend.delete_config_map(name="api-replica-api-0", namespace="getdeck")
+        with self.assertRaises(ApiException) as cm:
+            await backend.delete_config_map(name="api-replica-api-1", namespace="getdeck")
+        self.assertEqual(cm.exception.status, 404)
@@ -0,0 +1,84 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from coalescer import SingleFlight
+
+
+class SingleFlightTest(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return ["a", "b"]
+
+    async def fail(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("API error")
+
+    async def test_coalesce(self):
+        coalescer = SingleFlight()
+        key = SingleFlight.key(resource="beiboots", labels={"user": "john"})
+
+        results = await asyncio.gather(*[coalescer.do(key=key, func=self.fetch) for _ in range(10)])
+
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == ["a", "b"] for result in results))
+        self.assertEqual(coalescer.stats(), {"hits": 0, "joins": 9, "misses": 1, "in_flight": 0})
+
+    async def test_different_keys(self):
+        coalescer = SingleFlight()
+
+        await asyncio.gather(
+            coalescer.do(key=SingleFlight.key(resource="configmaps", namespace="getdeck", name="a"), func=self.fetch),
+            coalescer.do(key=SingleFlight.key(resource="configmaps", namespace="getdeck", name="b"), func=self.fetch),
+        )
+
+        self.assertEqual(self.calls, 2)
+
+    async def test_window(self):
+        coalescer = SingleFlight(window=60)
+        key = SingleFlight.key(resource="beiboots")
+
+        await coalescer.do(key=key, func=self.fetch)
+        await coalescer.do(key=key, func=self.fetch)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(coalescer.hits, 1)
+
+    async def test_exception(self):
+        coalescer = SingleFlight(window=60)
+        key = SingleFlight.key(resource="beiboots")
+
+        results = await asyncio.gather(
+            *[coalescer.do(key=key, func=self.fail) for _ in range(3)], return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+        # failed fetches are not reused
+        with self.assertRaises(RuntimeError):
+            await coalescer.do(key=key, func=self.fail)
+        self.assertEqual(self.calls, 2)
+
+    async def test_invalidate(self):
+        coalescer = SingleFlight(window=60)
+        key = SingleFlight.key(resource="beiboots", labels={"user": "john"})
+        config_key = SingleFlight.key(resource="configmaps", namespace="getdeck", name="a")
+        await coalescer.do(key=key, func=self.fetch)
+        await coalescer.do(key=config_key, func=self.fetch)
+
+        # in flight during the invalidation: not joined and not reused
+        in_flight = asyncio.ensure_future(coalescer.do(key=SingleFlight.key(resource="beiboots"), func=self.fetch))
+        await asyncio.sleep(0)
+        coalescer.invalidate("beiboots")
+        await coalescer.do(key=SingleFlight.key(resource="beiboots"), func=self.fetch)
+        await in_flight
+        await coalescer.do(key=key, func=self.fetch)
+        await coalescer.do(key=config_key, func=self.fetch)
+
+        self.assertEqual(self.calls, 5)
+        self.assertEqual(coalescer.stats()["in_flight"], 0)
+        await coalescer.do(key=SingleFlight.key(resource="beiboots"), func=self.fetch)
+        self.assertEqual(self.calls, 5)
@@ -0,0 +1,28 @@
+from unittest import TestCase
+
+from etag import etag_matches, make_etag
+from starlette.requests import Request
+
+
+def request(if_none_match: str | None = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "headers": headers})
+
+
+class ETagTest(TestCase):
+    def test_make_etag(self):
+        self.assertEqual(make_etag("a", 1), make_etag("a", 1))
+        self.assertNotEqual(make_etag("a", 1), make_etag("a", 2))
+        self.assertTrue(make_etag("a").startswith('W/"'))
+
+    def test_matches(self):
+        etag = make_etag("a", 1)
+        self.assertTrue(etag_matches(request(etag), etag))
+        self.assertTrue(etag_matches(request(f'"other", {etag}'), etag))
+        self.assertTrue(etag_matches(request(etag.removeprefix("W/")), etag))
+        self.assertTrue(etag_matches(request("*"), etag))
+
+    def test_no_match(self):
+        etag = make_etag("a", 1)
+        self.assertFalse(etag_matches(request(), etag))
+        self.assertFalse(etag_matches(request(make_etag("a", 2)), etag))
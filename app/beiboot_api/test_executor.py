@@ -0,0 +1,39 @@
+import asyncio
+import threading
+from unittest import IsolatedAsyncioTestCase
+
+from exceptions import KubernetesOverloadException, KubernetesTimeoutException
+from executor import KubernetesExecutor
+from settings import Settings
+
+
+class KubernetesExecutorTest(IsolatedAsyncioTestCase):
+    def setUp(self):
+        settings = Settings(k8s_executor_workers=1, k8s_executor_queue_size=1, k8s_executor_timeout_seconds=1)
+        self.executor = KubernetesExecutor(settings=settings)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+
+    async def test_run(self):
+        result = await self.executor.run(lambda a, b: a + b, 1, b=2)
+        self.assertEqual(result, 3)
+        self.assertEqual(self.executor.pending, 0)
+
+    async def test_timeout(self):
+        with self.assertRaises(KubernetesTimeoutException):
+            await self.executor.run(self.release.wait, timeout=0.05)
+        self.assertEqual(self.executor.timeouts, 1)
+
+    async def test_overload(self):
+        tasks = [asyncio.create_task(self.executor.run(self.release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(KubernetesOverloadException):
+            await self.executor.run(self.release.wait)
+        self.assertEqual(self.executor.rejected, 1)
+
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*tasks), [True, True])
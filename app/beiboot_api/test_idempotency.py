@@ -0,0 +1,88 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from exceptions import IdempotencyKeyMismatchException
+from idempotency import IdempotencyCache, fingerprint
+from settings import Settings
+
+
+class IdempotencyCacheTest(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = 0
+        self.cache = IdempotencyCache(settings=Settings(idempotency_cache_size=2))
+
+    async def create(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": self.calls}
+
+    async def fail(self):
+        self.calls += 1
+        raise RuntimeError("API error")
+
+    async def test_join_and_replay(self):
+        results = await asyncio.gather(
+            *[self.cache.do(user="john", key="a", fingerprint=fingerprint("x"), func=self.create) for _ in range(3)]
+        )
+        result, replayed = await self.cache.do(user="john", key="a", fingerprint=fingerprint("x"), func=self.create)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([replayed for _, replayed in results], [False, True, True])
+        self.assertEqual(result, {"id": 1})
+        self.assertTrue(replayed)
+        self.assertEqual(self.cache.stats()["joins"], 2)
+        self.assertEqual(self.cache.stats()["replays"], 1)
+
+    async def test_users(self):
+        await self.cache.do(user="john", key="a", fingerprint=fingerprint("x"), func=self.create)
+        _, replayed = await self.cache.do(user="jane", key="a", fingerprint=fingerprint("x"), func=self.create)
+
+        self.assertFalse(replayed)
+        self.assertEqual(self.calls, 2)
+
+    async def test_mismatch(self):
+        await self.cache.do(user="john", key="a", fingerprint=fingerprint("x"), func=self.create)
+
+        with self.assertRaises(IdempotencyKeyMismatchException):
+            await self.cache.do(user="john", key="a", fingerprint=fingerprint("y"), func=self.create)
+
+    async def test_failed(self):
+        with self.assertRaises(RuntimeError):
+            await self.cache.do(user="john", key="a", fingerprint=fingerprint("x"), func=self.fail)
+        with self.assertRaises(RuntimeError):
+            await self.cache.do(user="john", key="a", fingerprint=fingerprint("x"), func=self.fail)
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.cache.stats()["keys"], 0)
+
+    async def test_bounded(self):
+        for key in ["a", "b", "c"]:
+            await self.cache.do(user="john", key=key, fingerprint=fingerprint("x"), func=self.create)
+        _, replayed = await self.cache.do(user="john", key="a", fingerprint=fingerprint("x"), func=self.create)
+
+        self.assertFalse(replayed)
+        self.assertEqual(self.cache.stats()["keys"], 2)
+
+    async def test_expired(self):
+        self.cache = IdempotencyCache(settings=Settings(idempotency_cache_size=10))
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return {"id": "slow"}
+
+        # started first, still in flight
+        in_flight = asyncio.ensure_future(self.cache.do(user="john", key="a", fingerprint=fingerprint("x"), func=slow))
+        await asyncio.sleep(0)
+        for key in ["b", "c"]:
+            await self.cache.do(user="john", key=key, fingerprint=fingerprint("x"), func=self.create)
+
+        # expired: the call in flight in front of it is skipped, the prune stops at the next completed call
+        self.cache._calls[("john", "b")].expires = 0
+        await self.cache.do(user="john", key="d", fingerprint=fingerprint("x"), func=self.create)
+        self.assertEqual(list(self.cache._calls), [("john", "a"), ("john", "c"), ("john", "d")])
+
+        # kept in the order of completion
+        release.set()
+        await in_flight
+        self.assertEqual(list(self.cache._calls), [("john", "c"), ("john", "d"), ("john", "a")])